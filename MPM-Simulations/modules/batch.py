@@ -0,0 +1,578 @@
+"""
+
+This module solves a batch of cases sharing the same mesh topology
+
+Each case has its own model_setup (time step, simulation time, damping,
+boundary conditions) and material, all cases advance together with a
+leading batch axis in every particle and nodal array. The cases that
+reach their simulation time leave the batch axis, the others go on.
+
+"""
+import copy
+
+import numpy as np
+
+import material
+import shape
+
+class batch_state:
+    """
+    Represent the particle and nodal state of a batch of cases
+
+    Attributes
+    ----------
+    ncase : int
+        number of cases in batch
+
+    mass, position, density, velocity, stress, dstrain, f_ext, size : numpy.ndarray
+        particle quantities, shape (ncase, nparticles)
+
+    support, N, dN : numpy.ndarray
+        support nodes, interpolation functions values and gradients of
+        each particle, shape (ncase, nparticles, width)
+
+    element : numpy.ndarray
+        element index of each particle, -1 outside the mesh, shape (ncase, nparticles)
+
+    nodal_mass, nodal_momentum, nodal_velocity, f_int, f_ext_nodes, f_damp, f_tot : numpy.ndarray
+        nodal quantities, shape (ncase, nnodes)
+
+    E, mu : numpy.ndarray
+        Young's modulus (elastic cases) and viscosity (fluid cases) of each case
+
+    fluid : numpy.ndarray
+        True for cases with newtonian_fluid material
+    """
+
+    # arrays with the case axis
+    CASE_ARRAYS = ('mass','position','density','velocity','stress','dstrain','f_ext','size',
+                   'support','N','dN','element','nodal_mass','nodal_momentum','nodal_velocity',
+                   'f_int','f_ext_nodes','f_damp','f_tot','E','mu','fluid')
+
+    def __init__(self,msh,materials,width=2):
+
+        ps = msh.store
+        ncase = len(materials)
+        nnodes = msh.grid.n
+        self.ncase = ncase
+
+        # material parameters of each case
+        self.E = np.zeros(ncase)
+        self.mu = np.zeros(ncase)
+        self.fluid = np.zeros(ncase,dtype=bool)
+        for ib, imat in enumerate(materials):
+            if isinstance(imat,material.newtonian_fluid):
+                self.mu[ib] = imat.mu
+                self.fluid[ib] = True
+            elif isinstance(imat,material.linear_elastic):
+                self.E[ib] = imat.E
+            else:
+                raise ValueError("batched solution supports linear_elastic and newtonian_fluid materials")
+
+        # particle state, the mass is scaled with the density of each case
+        density = np.array([imat.density for imat in materials],dtype=np.float64)
+        ref_density = np.array([imat.density for imat in ps.materials],dtype=np.float64)[ps.material_id]
+        self.density = np.tile(density[:,None],(1,ps.n))
+        self.mass = ps.mass[None,:]*self.density/ref_density[None,:]
+        for name in ('position','velocity','stress','dstrain','f_ext','size'):
+            setattr(self, name, np.tile(getattr(ps,name),(ncase,1)))
+        self.support = np.zeros((ncase,ps.n,width),dtype=np.int64)
+        self.N = np.zeros((ncase,ps.n,width))
+        self.dN = np.zeros((ncase,ps.n,width))
+        self.element = np.tile(ps.element,(ncase,1))
+
+        # nodal state
+        for name in ('nodal_mass','nodal_momentum','nodal_velocity','f_int','f_ext_nodes','f_damp','f_tot'):
+            setattr(self, name, np.zeros((ncase,nnodes)))
+
+    def take(self,keep):
+        """
+        Returns the state of a subset of the cases
+
+        Arguments
+        ---------
+        keep: numpy.ndarray
+            boolean mask of the cases to keep
+        """
+        bs = copy.copy(self)
+        bs.ncase = int(np.count_nonzero(keep))
+        for name in self.CASE_ARRAYS:
+            setattr(bs, name, getattr(self,name)[keep])
+        return bs
+
+    def put(self,cases,bs,rows):
+        """
+        Copies cases of another state into cases of this state
+
+        Arguments
+        ---------
+        cases: numpy.ndarray
+            indices of the cases of this state
+
+        bs: batch_state
+            state to copy from
+
+        rows: numpy.ndarray
+            indices of the cases of bs
+        """
+        for name in self.CASE_ARRAYS:
+            getattr(self,name)[cases] = getattr(bs,name)[rows]
+
+class batch_boundary:
+    """
+    Represent the boundary conditions of the cases of a batch, compiled
+    for the mesh and applied along the case axis
+
+    The node indices are flat indices of the (ncase, nnodes) nodal arrays,
+    the conditions are applied at the enforcement points of the single
+    case solver (see boundary.boundary_arrays).
+
+    Attributes
+    ----------
+    cases : list
+        boundary_arrays of each case
+
+    constrained_nodes, traction_nodes, periodic_first, periodic_second : numpy.ndarray
+        flat node indices of the conditions of all cases
+
+    velocity_start, velocity_end, traction_force : numpy.ndarray
+        values of the conditions of all cases in the current time step
+
+    periodic_cases : numpy.ndarray
+        indices of the cases with periodic conditions
+
+    period : numpy.ndarray
+        (start, end) positions of the periodic interval of each periodic case
+    """
+
+    def __init__(self,msh,msetups):
+
+        self.nnodes = msh.grid.n
+        self.cases = [msetup.boundary_conditions.compile(msh) for msetup in msetups]
+        self._index()
+
+    def take(self,keep):
+        """
+        Returns the conditions of a subset of the cases
+
+        Arguments
+        ---------
+        keep: numpy.ndarray
+            boolean mask of the cases to keep
+        """
+        bc = copy.copy(self)
+        bc.cases = [case for case, kept in zip(self.cases,keep) if kept]
+        bc._index()
+        return bc
+
+    def _index(self):
+        """
+        Builds the flat node indices of the conditions of every case
+        """
+        nnodes = self.nnodes
+
+        def flat(name):
+            return np.concatenate([np.zeros(0,dtype=np.int64)]+[getattr(bc,name)+ib*nnodes for ib, bc in enumerate(self.cases)])
+
+        self.constrained_nodes = flat('constrained_nodes')
+        self.traction_nodes = flat('traction_nodes')
+        self.periodic_first = flat('periodic_first')
+        self.periodic_second = flat('periodic_second')
+        self._constrained_case = self.constrained_nodes//nnodes
+
+        self.periodic_cases = np.array([ib for ib, bc in enumerate(self.cases) if bc.period is not None],dtype=np.int64)
+        self.period = np.array([self.cases[ib].period for ib in self.periodic_cases],dtype=np.float64).reshape(-1,2)
+
+        self._gather()
+
+    def _gather(self):
+        """
+        Collects the values of the conditions of every case
+        """
+        self.velocity_start = np.concatenate([np.zeros(0)]+[bc.velocity_start for bc in self.cases])
+        self.velocity_end = np.concatenate([np.zeros(0)]+[bc.velocity_end for bc in self.cases])
+        self.traction_force = np.concatenate([np.zeros(0)]+[bc.traction_force for bc in self.cases])
+
+    def update(self,it,dt):
+        """
+        Evaluates the conditions given as functions of time for a time step
+
+        Arguments
+        ---------
+        it: numpy.ndarray
+            time of each case at the start of the step
+
+        dt: numpy.ndarray
+            time step of each case
+        """
+        for ib, bc in enumerate(self.cases):
+            bc.update(it[ib],dt[ib])
+        self._gather()
+
+    def impose_momentum(self,bs):
+        """
+        Impose the conditions on the nodal mass and momentum transferred from the particles
+        """
+        if len(self.periodic_first):
+            self._join(bs,('nodal_mass','nodal_momentum'))
+
+        nodes = self.constrained_nodes
+        bs.nodal_momentum.ravel()[nodes] = bs.nodal_mass.ravel()[nodes]*self.velocity_start
+
+    def impose_forces(self,bs):
+        """
+        Add the tractions to the nodal external forces transferred from the particles
+        """
+        bs.f_ext_nodes.ravel()[self.traction_nodes] += self.traction_force
+
+        if len(self.periodic_first):
+            self._join(bs,('f_int','f_ext_nodes'))
+
+    def impose_total_force(self,bs,dt):
+        """
+        Set the total force of the constrained nodes that brings their
+        momentum to the prescribed velocity at the end of the step
+
+        Arguments
+        ---------
+        dt: numpy.ndarray
+            time step of the momentum update of each case, shape (ncase, 1)
+        """
+        nodes = self.constrained_nodes
+        dt = dt[self._constrained_case,0]
+        change = bs.nodal_mass.ravel()[nodes]*self.velocity_end-bs.nodal_momentum.ravel()[nodes]
+        bs.f_tot.ravel()[nodes] = change/dt
+
+    def impose_velocity(self,bs):
+        """
+        Impose the conditions on the nodal momentum recalculated from the particles
+        """
+        if len(self.periodic_first):
+            self._join(bs,('nodal_momentum',))
+
+        nodes = self.constrained_nodes
+        bs.nodal_velocity.ravel()[nodes] = self.velocity_end
+        bs.nodal_momentum.ravel()[nodes] = bs.nodal_mass.ravel()[nodes]*self.velocity_end
+
+    def wrap_particles(self,bs):
+        """
+        Move the particles leaving the periodic interval of their case into it from the other end
+        """
+        if not len(self.periodic_cases):
+            return
+
+        start = self.period[:,0:1]
+        end = self.period[:,1:2]
+        position = bs.position[self.periodic_cases]
+        outside = (position<start) | (position>=end)
+        wrapped = start+np.mod(position-start,end-start)
+        bs.position[self.periodic_cases] = np.where(outside,wrapped,position)
+
+    def _join(self,bs,quantities):
+        """
+        Adds the values of the periodic node pairs
+        """
+        for name in quantities:
+            values = getattr(bs,name).ravel()
+            joined = values[self.periodic_first]+values[self.periodic_second]
+            values[self.periodic_first] = joined
+            values[self.periodic_second] = joined
+
+def _locate(msh,bs):
+    """
+    Update the element index of every particle in every case
+    """
+    xn = msh.grid.x
+    xp = bs.position
+
+    outside = ~((xp>=xn[0]) & (xp<xn[-1]))
+    xp = np.where(outside,xn[0],xp)
+
+    if msh.uniform:
+        ie = np.floor((xp-xn[0])/msh.element_length[0]).astype(np.int64)
+        np.clip(ie,0,msh.nelem-1,out=ie)
+        ie -= xp<xn[ie]
+        ie += xp>=xn[ie+1]
+    else:
+        ie = np.searchsorted(xn,xp,side='right')-1
+
+    ie[outside] = -1
+    bs.element[:] = ie
+
+def _shape_functions(msh,bs,interpolation_type):
+    """
+    Update the support nodes and the interpolation functions values and gradients of every case
+    """
+    inside = bs.element>=0
+    ie = np.where(inside,bs.element,0)
+
+    if interpolation_type=="linear":
+        conn = msh.connectivity[ie]
+        xn = msh.grid.x[conn]
+        L = msh.element_length[ie][...,None]
+        xp = bs.position[...,None]
+        bs.support[:] = conn
+        bs.N[:] = shape.NiLinear_array(xp,xn,L)
+        bs.dN[:] = shape.dNiLinear_array(xp,xn,L)
+
+    elif interpolation_type=="cpGIMP":
+        bs.support[:], bs.N[:], bs.dN[:] = shape.cpGIMP_table(bs.position,bs.size/2,ie,msh.grid.x,msh.element_length)
+
+    else:
+        raise ValueError("unknown interpolation type '%s'"%interpolation_type)
+
+    bs.N[~inside] = 0
+    bs.dN[~inside] = 0
+
+def _scatter(msh,bs,weights):
+    """
+    Accumulates particle contributions to the support nodes in nodes of every case
+
+    Arguments
+    ---------
+    weights: numpy.ndarray
+        contribution to each support node, shape (ncase, nparticles, width)
+
+    Returns an array of shape (ncase, nnodes)
+    """
+    nnodes = msh.grid.n
+    offset = (np.arange(bs.ncase)*nnodes)[:,None,None]
+
+    # one block of particles per support column, as interpolation.particles_to_nodes
+    bins = np.swapaxes(bs.support+offset,1,2)
+    weights = np.swapaxes(weights,1,2)
+    return np.bincount(bins.ravel(),weights=weights.ravel(),minlength=bs.ncase*nnodes).reshape(bs.ncase,nnodes)
+
+def _gather(bs,nodal):
+    """
+    Returns the nodal values of the support nodes of each particle in every case
+    """
+    rows = np.arange(bs.ncase)[:,None,None]
+    return nodal[rows,bs.support]
+
+def _nodal_velocity(bs):
+    """
+    Calculate nodal velocity in nodes with mass
+    """
+    np.divide(bs.nodal_momentum,bs.nodal_mass,out=bs.nodal_velocity,where=bs.nodal_mass!=0)
+
+def _stress_update(msh,bs,dt):
+    """
+    Nodal velocity, particle strain increment, density and stress of every case
+
+    Arguments
+    ---------
+    dt: numpy.ndarray
+        time step of each case, shape (ncase, 1)
+    """
+    _nodal_velocity(bs)
+
+    bs.dstrain[:] = np.einsum('ijk,ijk->ij',bs.dN,_gather(bs,bs.nodal_velocity))*dt
+    bs.density[:] = bs.density/(1+bs.dstrain)
+
+    # linear elastic cases accumulate stress, fluid cases get the viscous stress
+    bs.stress[:] = np.where(bs.fluid[:,None],bs.mu[:,None]*bs.dstrain/dt,bs.stress+bs.dstrain*bs.E[:,None])
+
+def _critical_time_step(msh,bs,safety_factor,dt_min,dt_max,dt):
+    """
+    Stable time step of every case from the Courant-Friedrichs-Lewy
+    condition, as solver.critical_time_step
+
+    Arguments
+    ---------
+    safety_factor, dt_min, dt_max, dt: numpy.ndarray
+        safety factor, bounds and fixed time step of each case
+
+    Returns
+    -------
+    dt : numpy.ndarray
+        time step of each case, the fixed time step in the cases without
+        moving particles
+    """
+    inside = bs.element>=0
+    c = np.where(bs.fluid[:,None],0.0,np.sqrt(bs.E[:,None]/bs.density))
+    speed = c+np.abs(bs.velocity)
+    h = msh.element_length[np.where(inside,bs.element,0)]
+
+    moving = inside & (speed>0)
+    crossing = np.divide(h,speed,out=np.full_like(h,np.inf),where=moving)
+    dt_cfl = safety_factor*crossing.min(axis=1)
+
+    return np.where(moving.any(axis=1),np.minimum(np.maximum(dt_cfl,dt_min),dt_max),dt)
+
+def explicit_solution_batch(msh,msetups,materials):
+    """
+    Calculates the explicit solution of a batch of cases using the MPM
+
+    The particles distributed in msh define the initial state of every
+    case, the particle mass is scaled by the density of each case material.
+    The boundary conditions of each model_setup are compiled for the mesh
+    and applied to its case. Each case stores its solution in its
+    model_setup.solution_array. The time step of a case is its fixed dt
+    or, with adaptive_dt, the stability condition of its own particles.
+    The batch is a single vectorized implementation, the cases can not
+    select the numba engine or more than one thread.
+
+    Arguments
+    ---------
+
+    msh: mesh
+        a mesh object with particles
+
+    msetups : list
+        a model_setup object for each case, all with the same interpolation
+        type and integration scheme
+
+    materials : list
+        a material object for each case
+
+    Returns
+    -------
+    bs : batch_state
+        final state of the batch
+    """
+    if len(msetups)!=len(materials):
+        raise ValueError("one material is needed for each model_setup")
+
+    interpolation_type = msetups[0].interpolation_type
+    integration_scheme = msetups[0].integration_scheme
+    for msetup in msetups:
+        if msetup.interpolation_type!=interpolation_type or msetup.integration_scheme!=integration_scheme:
+            raise ValueError("all cases must have the same interpolation type and integration scheme")
+        if msetup.engine not in ('python','numpy'):
+            raise ValueError("batched solution has no '%s' engine"%msetup.engine)
+        if msetup.threads!=1:
+            raise ValueError("batched solution runs in one thread")
+
+    # final state of every case
+    result = batch_state(msh,materials,4 if interpolation_type=='cpGIMP' else 2)
+
+    def values(name):
+        return np.array([getattr(msetup,name) for msetup in msetups])
+
+    dt_fixed = values('dt').astype(np.float64)
+    total_time = values('time')
+    alpha = values('damping_local_alpha')
+    solution_particle = values('solution_particle')
+    adaptive = values('adaptive_dt').astype(bool)
+    safety_factor = values('dt_safety_factor')
+    dt_min = values('dt_min')
+    dt_max = values('dt_max')
+
+    # current time and time step of the previous loop of each case
+    it = np.zeros(result.ncase)
+    dt_previous = dt_fixed.copy()
+
+    # state and boundary conditions of the running cases, cases holds
+    # the index of the case of each row
+    cases = np.flatnonzero(it<=total_time)
+    bs = result.take(it<=total_time)
+    bc = batch_boundary(msh,[msetups[ib] for ib in cases])
+
+    # loop counter
+    loop_counter = 1
+
+    # main simulation loop
+    while len(cases):
+
+        # time step, from the stability condition in adaptive mode
+        dt = dt_fixed[cases]
+        if adaptive[cases].any():
+            dt = np.where(adaptive[cases],_critical_time_step(msh,bs,safety_factor[cases],dt_min[cases],
+                                                              dt_max[cases],dt),dt)
+        dt_step = dt[:,None]
+        if loop_counter==1:
+            dt_velocity = dt_step/2.0
+        else:
+            dt_velocity = ((dt_previous[cases]+dt)/2.0)[:,None]
+
+        # boundary conditions of the time step
+        bc.update(it[cases],dt)
+
+        # update the element of each particle and the interpolation functions
+        _locate(msh,bs)
+        _shape_functions(msh,bs,interpolation_type)
+
+        # particle mass and momentum to grid
+        bs.nodal_mass[:] = _scatter(msh,bs,bs.mass[...,None]*bs.N)
+        bs.nodal_momentum[:] = _scatter(msh,bs,(bs.mass*bs.velocity)[...,None]*bs.N)
+
+        # impose essential boundary conditions (in constrained nodes set mv)
+        bc.impose_momentum(bs)
+
+        # Update Stress First Scheme
+        if integration_scheme=='USF':
+            _stress_update(msh,bs,dt_step)
+
+        # particle internal and external forces to grid
+        volume_stress = bs.stress*bs.mass/bs.density
+        bs.f_int[:] = _scatter(msh,bs,-bs.dN*volume_stress[...,None])
+        bs.f_ext_nodes[:] = _scatter(msh,bs,bs.N*bs.f_ext[...,None])
+
+        # impose natural boundary conditions (tractions)
+        bc.impose_forces(bs)
+
+        # local damping force, kept from the previous step in nodes at rest
+        unbalanced = bs.f_int+bs.f_ext_nodes
+        nodal_vel = np.divide(bs.nodal_momentum,bs.nodal_mass,out=np.zeros_like(bs.nodal_mass),where=bs.nodal_mass!=0)
+        case_alpha = alpha[cases][:,None]
+        damped = (case_alpha>0) & (nodal_vel!=0)
+        bs.f_damp[:] = np.where(damped,-case_alpha*np.abs(unbalanced)*np.sign(nodal_vel),bs.f_damp)
+
+        # total nodal force, in constrained nodes the force reaching the prescribed velocity
+        bs.f_tot[:] = unbalanced+bs.f_damp
+        bc.impose_total_force(bs,dt_velocity)
+
+        # integrate the grid nodal momentum equation, exact prescribed
+        # momentum in the constrained nodes
+        bs.nodal_momentum += bs.f_tot*dt_velocity
+        nodes = bc.constrained_nodes
+        bs.nodal_momentum.ravel()[nodes] = bs.nodal_mass.ravel()[nodes]*bc.velocity_end
+
+        # update particle velocity and position
+        has_mass = bs.nodal_mass!=0
+        acceleration = np.divide(bs.f_tot,bs.nodal_mass,out=np.zeros_like(bs.f_tot),where=has_mass)
+        velocity = np.divide(bs.nodal_momentum,bs.nodal_mass,out=np.zeros_like(bs.f_tot),where=has_mass)
+        velocity.ravel()[nodes] = bc.velocity_end
+        bs.velocity += np.einsum('ijk,ijk->ij',_gather(bs,acceleration),bs.N)*dt_velocity
+        bs.position += np.einsum('ijk,ijk->ij',_gather(bs,velocity),bs.N)*dt_step
+        bc.wrap_particles(bs)
+
+        # Modified Update Stress Last Scheme
+        if integration_scheme=='MUSL':
+            bs.nodal_momentum[:] = _scatter(msh,bs,(bs.mass*bs.velocity)[...,None]*bs.N)
+            bc.impose_velocity(bs)
+
+        # Modified Update Stress Last or Update Stress Last Scheme
+        if integration_scheme=='MUSL' or integration_scheme=='USL':
+            _stress_update(msh,bs,dt_step)
+
+        # reset nodal values
+        bs.nodal_velocity[:] = 0
+
+        # store data for plot
+        for row, ib in enumerate(cases):
+            msetup = msetups[ib]
+            msetup.solution_array[0].append(it[ib])
+            if msetup.solution_field=='velocity':
+                msetup.solution_array[1].append(bs.velocity[row,solution_particle[ib]])
+            elif msetup.solution_field=='position':
+                msetup.solution_array[1].append(bs.position[row,solution_particle[ib]])
+
+        # update loop counter
+        loop_counter+=1
+
+        # advance in time
+        it[cases] += dt
+        dt_previous[cases] = dt
+
+        # finished cases leave the batch
+        running = it[cases]<=total_time[cases]
+        if not running.all():
+            finished = ~running
+            result.put(cases[finished],bs,np.flatnonzero(finished))
+            bs = bs.take(running)
+            bc = bc.take(running)
+            cases = cases[running]
+
+    return result
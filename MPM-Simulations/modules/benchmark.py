@@ -0,0 +1,377 @@
+"""
+
+This module measures the performance of the MPM solver components
+
+phase_benchmark times each phase of the solver time step over a matrix of
+mesh sizes, particles per element, interpolation types and integration
+schemes. The results are saved as JSON files and compared between
+versions with compare_results, e.g.
+
+    python benchmark.py --output new.json --compare baseline.json
+
+"""
+import argparse
+import itertools
+import json
+import os
+import platform
+import time
+
+import numpy as np
+
+import material
+import mesh
+import numba_kernels
+import particle
+import profiling
+import setup
+import solver
+
+def default_materials():
+    """
+    Returns the materials compared by material_benchmark
+    """
+    return [material.linear_elastic(100,1),
+            material.newtonian_fluid(1,1),
+            material.elastoplastic(100,1e-3,10,1),
+            material.maxwell_viscoelastic(100,1,1,50)]
+
+def _best_time(function,repeat):
+    """
+    Returns the best time in seconds of repeat calls of a function
+    """
+    best = float('inf')
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best,time.perf_counter()-start)
+    return best
+
+def material_benchmark(materials=None,nparticles=(10**3,10**4,10**5,10**6),
+                       per_particle_limit=10**4,repeat=5,verbose=True):
+    """
+    Times the stress update of materials over arrays of particles
+
+    Each material is timed with its batched update_stress_array and, up to
+    per_particle_limit particles, with the per particle update_stress the
+    solver used before the batched interface.
+
+    Arguments
+    ---------
+    materials: list
+        material objects, defaults to default_materials()
+    nparticles: tuple
+        numbers of particles
+    per_particle_limit: int
+        largest number of particles timed with the per particle update
+    repeat: int
+        repetitions of each measurement, the best time is kept
+    verbose: bool
+        print the results table
+
+    Returns
+    -------
+    results: list
+        one dictionary per material and number of particles with the keys
+        material, nparticles, array_time and particle_time (seconds per
+        update, None when not measured)
+    """
+    if materials is None:
+        materials = default_materials()
+
+    rng = np.random.default_rng(0)
+    dt = 1e-3
+
+    results = []
+    for mat in materials:
+        for n in nparticles:
+
+            # random strain increments, a part of the elasto-plastic particles yield
+            ps = particle.particle_store(n)
+            ps.add_many(np.ones(n),mat,np.arange(n,dtype=float),np.ones(n),-1)
+            ps.dstrain[:] = 1e-5*rng.standard_normal(n)
+            imat = 0
+
+            def array_update():
+                ps.stress[:] = mat.update_stress_array(ps.stress,ps.dstrain,ps.density,dt,ps.state[imat])
+
+            array_time = _best_time(array_update,repeat)
+
+            particle_time = None
+            if n<=per_particle_limit:
+                points = [particle.material_point.view(ps,i) for i in range(n)]
+
+                def particle_update():
+                    for ip in points:
+                        mat.update_stress(ip,dt)
+
+                particle_time = _best_time(particle_update,repeat)
+
+            results.append({'material': type(mat).__name__, 'nparticles': n,
+                            'array_time': array_time, 'particle_time': particle_time})
+
+    if verbose:
+        print("%-22s %10s %14s %14s %14s"%('material','particles','array (s)','particle (s)','ns/particle'))
+        for row in results:
+            particle_time = '-' if row['particle_time'] is None else '%.3e'%row['particle_time']
+            print("%-22s %10d %14.3e %14s %14.2f"%(row['material'],row['nparticles'],row['array_time'],
+                                                  particle_time,1e9*row['array_time']/row['nparticles']))
+
+    return results
+
+# configurations timed by phase_benchmark
+DEFAULT_MATRIX = {
+    'engine': ('python','numpy','numba') if numba_kernels.available else ('python','numpy'),
+    'nelem': (100,1000,10000),
+    'ppelem': (2,4),
+    'interpolation_type': ('linear','cpGIMP'),
+    'integration_scheme': ('USF','USL','MUSL'),
+}
+
+def benchmark_case(nelem,ppelem,interpolation_type='linear',integration_scheme='MUSL',engine='numpy'):
+    """
+    Builds the mesh and model setup of a benchmark case
+
+    A bar of linear elastic material fills the mesh with a sinusoidal
+    initial velocity, the time step is a tenth of the critical time step.
+
+    Arguments
+    ---------
+    nelem: int
+        number of elements
+    ppelem: int
+        particles per element
+    interpolation_type: string
+        interpolation function type
+    integration_scheme: string
+        'USF', 'USL' or 'MUSL'
+    engine: string
+        'python', 'numpy' or 'numba'
+
+    Returns
+    -------
+    msh: mesh
+        a mesh object with particles
+    msetup: model_setup
+        a model_setup object
+    """
+    L = 25.0
+    E = 100.0
+    density = 1.0
+
+    msh = mesh.mesh_1D(L,nelem)
+    msh.put_particles_in_all_mesh_elements(ppelem,material.linear_elastic(E,density))
+    msh.store.velocity[:] = 0.1*np.sin(np.pi*msh.store.position/(2*L))
+
+    msetup = setup.model_setup()
+    msetup.interpolation_type = interpolation_type
+    msetup.integration_scheme = integration_scheme
+    msetup.engine = engine
+    msetup.dt = 0.1*(L/nelem)/np.sqrt(E/density)
+    msetup.time = msetup.dt
+
+    return msh, msetup
+
+def time_phases(msh,msetup,steps=10,warmup=1):
+    """
+    Times the phases of a number of time steps with a phase_profiler
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    msetup: model_setup
+        a model_setup object
+    steps: int
+        number of timed time steps
+    warmup: int
+        number of untimed time steps run before, they create the mesh
+        objects of the python engine and compile the numba kernels
+
+    Returns
+    -------
+    phases: dict
+        phase name to its median time per step in seconds
+    step_time: float
+        median time of a full step in seconds
+    """
+    steppers = {'python': solver.python_step,'numpy': solver.numpy_step,'numba': solver.numba_step}
+    if msetup.engine not in steppers:
+        raise ValueError("unknown engine '%s'"%msetup.engine)
+    if msetup.engine=='numba' and not numba_kernels.available:
+        raise ValueError("numba is not installed")
+    step = steppers[msetup.engine]
+    dt = msetup.dt
+
+    for i in range(warmup):
+        step(msh,msetup,dt,dt)
+
+    profiler = profiling.phase_profiler()
+    for i in range(steps):
+        profiler.start_step()
+        with profiler.phase('step'):
+            step(msh,msetup,dt,dt,profiler)
+
+    times = profiler.step_times()
+    step_time = float(np.median(times.pop('step')))
+    return {name: float(np.median(values)) for name, values in times.items()}, step_time
+
+def phase_benchmark(matrix=None,steps=10,python_limit=10**4,path=None,verbose=True):
+    """
+    Times the phases of the solver time step over a matrix of configurations
+
+    Arguments
+    ---------
+    matrix: dict
+        values of each configuration parameter (keys of DEFAULT_MATRIX),
+        missing parameters take the DEFAULT_MATRIX values
+    steps: int
+        number of timed time steps of each configuration
+    python_limit: int
+        largest number of particles timed with the python engine, the
+        interpolation types of solver.TABLE_INTERPOLATION_TYPES are only
+        timed with the numpy engine
+    path: string
+        JSON file to save the results, see save_results
+    verbose: bool
+        print the results table
+
+    Returns
+    -------
+    results: list
+        one dictionary per configuration with the configuration parameters,
+        nparticles, steps, phases (phase name to seconds per step) and
+        step_time (seconds per step)
+    """
+    values = dict(DEFAULT_MATRIX)
+    values.update(matrix or {})
+    names = list(DEFAULT_MATRIX)
+
+    results = []
+    for combination in itertools.product(*(values[name] for name in names)):
+        config = dict(zip(names,combination))
+        nparticles = config['nelem']*config['ppelem']
+        if config['engine']=='python' and nparticles>python_limit:
+            continue
+
+        # the other engines run these interpolation types with the numpy engine
+        if config['interpolation_type'] in solver.TABLE_INTERPOLATION_TYPES and config['engine']!='numpy':
+            continue
+
+        msh, msetup = benchmark_case(**config)
+        phases, step_time = time_phases(msh,msetup,steps)
+        results.append(dict(config,nparticles=nparticles,steps=steps,phases=phases,step_time=step_time))
+
+        if verbose:
+            print("%-6s %6d elements %2d ppelem %-7s %-4s %10.3e s/step"%(config['engine'],config['nelem'],
+                  config['ppelem'],config['interpolation_type'],config['integration_scheme'],step_time))
+            for name, seconds in sorted(phases.items(),key=lambda item: -item[1]):
+                print("    %-32s %10.3e s %5.1f %%"%(name,seconds,100*seconds/step_time))
+
+    if path is not None:
+        save_results(results,path)
+
+    return results
+
+def save_results(results,path):
+    """
+    Saves benchmark results in a JSON file, with the versions and machine used
+
+    Arguments
+    ---------
+    results: list
+        results of phase_benchmark
+    path: string
+        JSON file path
+    """
+    data = {'metadata': {'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                         'python': platform.python_version(),
+                         'numpy': np.__version__,
+                         'machine': platform.machine(),
+                         'processor': platform.processor(),
+                         'cpu_count': os.cpu_count()},
+            'results': results}
+    with open(path,'w') as f:
+        json.dump(data,f,indent=1)
+
+def load_results(path):
+    """
+    Returns the results saved in a JSON file by save_results
+
+    Arguments
+    ---------
+    path: string
+        JSON file path
+    """
+    with open(path) as f:
+        return json.load(f)['results']
+
+def _config_key(row):
+    """
+    Returns the configuration of a results row as a tuple
+    """
+    return tuple(row[name] for name in DEFAULT_MATRIX)
+
+def compare_results(baseline,current,tolerance=0.1,verbose=True):
+    """
+    Compares the phase times of two benchmark results
+
+    Arguments
+    ---------
+    baseline: list or string
+        reference results, or the JSON file holding them
+    current: list or string
+        new results, or the JSON file holding them
+    tolerance: float
+        relative slowdown above which a phase is a regression
+    verbose: bool
+        print the regressions
+
+    Returns
+    -------
+    regressions: list
+        one dictionary per slower phase (and 'step' for the full step) with
+        the configuration parameters, phase, baseline, current and ratio
+    """
+    if isinstance(baseline,str):
+        baseline = load_results(baseline)
+    if isinstance(current,str):
+        current = load_results(current)
+
+    reference = {_config_key(row): row for row in baseline}
+
+    regressions = []
+    for row in current:
+        old = reference.get(_config_key(row))
+        if old is None:
+            continue
+
+        pairs = [('step',old['step_time'],row['step_time'])]
+        pairs += [(name,old['phases'][name],seconds) for name, seconds in row['phases'].items()
+                  if name in old['phases']]
+        for name, before, after in pairs:
+            if before>0 and after>(1+tolerance)*before:
+                regressions.append(dict(zip(DEFAULT_MATRIX,_config_key(row)),phase=name,
+                                        baseline=before,current=after,ratio=after/before))
+
+    if verbose:
+        for item in regressions:
+            print("%-6s %6d elements %2d ppelem %-7s %-4s %-32s %10.3e -> %10.3e s (x%.2f)"%(
+                  item['engine'],item['nelem'],item['ppelem'],item['interpolation_type'],
+                  item['integration_scheme'],item['phase'],item['baseline'],item['current'],item['ratio']))
+        print("%d regressions"%len(regressions))
+
+    return regressions
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser(description="times the phases of the MPM solver time step")
+    parser.add_argument('--output',default='benchmark.json',help="JSON file to save the results")
+    parser.add_argument('--compare',help="JSON file of reference results")
+    parser.add_argument('--steps',type=int,default=10,help="timed time steps per configuration")
+    parser.add_argument('--tolerance',type=float,default=0.1,help="relative slowdown reported as regression")
+    args = parser.parse_args()
+
+    results = phase_benchmark(steps=args.steps,path=args.output)
+    if args.compare:
+        compare_results(args.compare,results,args.tolerance)
@@ -0,0 +1,398 @@
+"""
+
+This module defines the boundary conditions of the nodes of a mesh
+
+A boundary_conditions object lists the conditions of the model as node
+sets: fixed nodes, nodes with a prescribed velocity, nodes loaded by a
+traction force and pairs of periodic nodes. Before the time loop the
+conditions are compiled for a mesh into index and value arrays
+(boundary_arrays), which the time step applies with vectorized operations
+at each enforcement point:
+
+- impose_momentum, after the particle mass and momentum to grid transfer
+- impose_forces, after the particle forces to grid transfer
+- the total force and momentum of the constrained nodes in the nodal update
+- impose_velocity, after the nodal momentum is recalculated (MUSL)
+- wrap_particles, after the particle positions are updated
+
+Prescribed velocities and tractions can be numbers, arrays with one value
+per node of the set, or functions of time returning them. Functions are
+evaluated once per time step by boundary_arrays.update, they must be
+defined at module level to run with the domain decomposition.
+
+"""
+import numpy as np
+
+class boundary_conditions:
+    """
+    Represent the boundary conditions of a model
+
+    Node indices refer to the nodes of the mesh, negative indices count
+    from the last node. When several velocity conditions (fixed nodes
+    included) are given to a node the last one is used, the tractions of
+    a node are added.
+
+    Attributes
+    ----------
+    constraints : list
+        (nodes, velocity) of the fixed and prescribed velocity conditions, in order
+
+    tractions : list
+        (nodes, force) of the traction conditions
+
+    periodic_pairs : list
+        (first, second) node sets of the periodic conditions
+
+    version : int
+        number of changes, the compiled arrays of an older version are rebuilt
+    """
+
+    def __init__(self):
+
+        self.constraints = []
+        self.tractions = []
+        self.periodic_pairs = []
+        self.version = 0
+
+    def fix(self,nodes):
+        """
+        Fix a set of nodes (zero velocity, momentum and total force)
+
+        Arguments
+        ---------
+        nodes: array_like
+            node indices
+        """
+        self.prescribe_velocity(nodes,0.0)
+
+    def prescribe_velocity(self,nodes,velocity):
+        """
+        Prescribe the velocity of a set of nodes
+
+        Arguments
+        ---------
+        nodes: array_like
+            node indices
+
+        velocity: float, numpy.ndarray or function
+            velocity of the nodes, or function of time returning it
+        """
+        self.constraints.append((_node_set(nodes),velocity))
+        self.version += 1
+
+    def traction(self,nodes,force):
+        """
+        Apply a traction force to a set of nodes, added to the nodal external force
+
+        Arguments
+        ---------
+        nodes: array_like
+            node indices
+
+        force: float, numpy.ndarray or function
+            force in each node, or function of time returning it
+        """
+        self.tractions.append((_node_set(nodes),force))
+        self.version += 1
+
+    def periodic(self,first,second):
+        """
+        Join pairs of nodes in a periodic domain
+
+        The nodal mass, momentum and forces of both nodes of a pair are
+        added, so both move as one node, and particles leaving the
+        interval between the first and second nodes enter it from the
+        other end. Interpolation functions reaching more than one element
+        across the periodic boundary are not supported.
+
+        Arguments
+        ---------
+        first: array_like
+            node indices at the start of the periodic interval
+
+        second: array_like
+            node indices at the end of the periodic interval, paired with first
+        """
+        first = _node_set(first)
+        second = _node_set(second)
+        if len(first)!=len(second):
+            raise ValueError("periodic node sets must have the same length")
+        self.periodic_pairs.append((first,second))
+        self.version += 1
+
+    def compile(self,msh,first_node=0,nnodes=None):
+        """
+        Returns the conditions as index and value arrays of the nodes of a mesh
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+
+        first_node: int
+            index of the first node of msh in the mesh the node indices
+            refer to, for the subdomains of a decomposed mesh
+
+        nnodes: int
+            number of nodes of the mesh the node indices refer to, the
+            nodes of msh by default
+
+        Returns
+        -------
+        bc: boundary_arrays
+            compiled conditions
+        """
+        return boundary_arrays(self,msh,first_node,nnodes)
+
+def _node_set(nodes):
+    """
+    Returns node indices as a one dimensional integer array
+    """
+    return np.atleast_1d(np.asarray(nodes,dtype=np.int64)).ravel()
+
+class boundary_arrays:
+    """
+    Represent the boundary conditions compiled for the nodes of a mesh
+
+    Attributes
+    ----------
+    conditions : boundary_conditions
+        compiled conditions
+
+    version : int
+        version of the compiled conditions
+
+    constrained_nodes : numpy.ndarray
+        increasing indices of the fixed and prescribed velocity nodes
+
+    velocity_start, velocity_end : numpy.ndarray
+        velocity of the constrained nodes at the start and at the end of
+        the time step
+
+    traction_nodes : numpy.ndarray
+        increasing indices of the loaded nodes
+
+    traction_force : numpy.ndarray
+        traction force of the loaded nodes
+
+    periodic_first, periodic_second : numpy.ndarray
+        node pairs of the periodic conditions
+
+    periodic_nodes : numpy.ndarray
+        increasing indices of the periodic nodes, always active
+
+    period : tuple
+        (start, end) positions of the periodic interval, None without periodic conditions
+    """
+
+    def __init__(self,conditions,msh,first_node=0,nnodes=None):
+
+        n = msh.grid.n
+        if nnodes is None:
+            nnodes = n
+
+        self.conditions = conditions
+        self.version = conditions.version
+
+        def local(nodes):
+            # indices in msh of the nodes inside it, and the selection of these nodes
+            nodes = np.where(nodes<0,nodes+nnodes,nodes)
+            if ((nodes<0) | (nodes>=nnodes)).any():
+                raise IndexError("boundary condition node index out of range")
+            nodes = nodes-first_node
+            inside = (nodes>=0) & (nodes<n)
+            return nodes[inside], inside
+
+        # the last velocity condition of each node applies
+        owner = np.full(n,-1,dtype=np.int64)
+        constraints = []
+        for k, (nodes, velocity) in enumerate(conditions.constraints):
+            nodes, inside = local(nodes)
+            owner[nodes] = k
+            constraints.append((nodes,inside,velocity))
+        self.constrained_nodes = np.flatnonzero(owner>=0)
+
+        # (positions in constrained_nodes, selection of the set values, velocity) of each condition
+        self._velocity = []
+        for k, (nodes, inside, velocity) in enumerate(constraints):
+            mine = owner[nodes]==k
+            positions = np.searchsorted(self.constrained_nodes,nodes[mine])
+            self._velocity.append((positions,np.flatnonzero(inside)[mine],velocity))
+
+        # tractions of the nodes inside the mesh, added in increasing node order
+        self._traction = []
+        loaded = []
+        for nodes, force in conditions.tractions:
+            local_nodes, inside = local(nodes)
+            self._traction.append((local_nodes,np.flatnonzero(inside),force))
+            loaded.append(local_nodes)
+        self.traction_nodes = np.unique(np.concatenate(loaded)) if loaded else np.zeros(0,dtype=np.int64)
+
+        # periodic node pairs
+        pairs = [(local(first)[0],local(second)[0]) for first, second in conditions.periodic_pairs]
+        if any(len(first)!=len(second) for first, second in pairs):
+            raise ValueError("periodic node pairs must be in the same mesh")
+        self.periodic_first = np.concatenate([first for first, second in pairs]) if pairs else np.zeros(0,dtype=np.int64)
+        self.periodic_second = np.concatenate([second for first, second in pairs]) if pairs else np.zeros(0,dtype=np.int64)
+        self.periodic_nodes = np.union1d(self.periodic_first,self.periodic_second)
+        self.period = None
+        if len(self.periodic_nodes):
+            self.period = (msh.grid.x[self.periodic_first].min(),msh.grid.x[self.periodic_second].max())
+
+        self.velocity_start = np.zeros(len(self.constrained_nodes))
+        self.velocity_end = np.zeros(len(self.constrained_nodes))
+        self.traction_force = np.zeros(len(self.traction_nodes))
+        self._functions = any(callable(value) for nodes, inside, value in self._velocity+self._traction)
+        self._fill(0.0,0.0)
+
+    def _fill(self,t_start,t_end):
+        """
+        Evaluates the velocities and tractions at the start and end time of a step
+        """
+        for values, t in ((self.velocity_start,t_start),(self.velocity_end,t_end)):
+            for positions, selection, velocity in self._velocity:
+                value = velocity(t) if callable(velocity) else velocity
+                values[positions] = np.asarray(value)[selection] if np.ndim(value) else value
+
+        self.traction_force[:] = 0
+        for nodes, selection, force in self._traction:
+            value = force(t_start) if callable(force) else force
+            if np.ndim(value):
+                value = np.asarray(value)[selection]
+            np.add.at(self.traction_force,np.searchsorted(self.traction_nodes,nodes),value)
+
+    def update(self,t,dt):
+        """
+        Evaluates the conditions given as functions of time for a time step
+
+        Arguments
+        ---------
+        t: float
+            time at the start of the step
+
+        dt: float
+            time step
+        """
+        if self._functions:
+            self._fill(t,t+dt)
+
+    def impose_momentum(self,msh):
+        """
+        Impose the conditions on the nodal mass and momentum transferred from the particles
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        """
+        grid = msh.grid
+
+        if self.period is not None:
+            # the periodic nodes are active so they are reset and updated in every step
+            msh.active_nodes = np.union1d(msh.active_nodes,self.periodic_nodes)
+            self._join(grid,('mass','momentum'))
+
+        nodes = self.constrained_nodes
+        grid.momentum[nodes] = grid.mass[nodes]*self.velocity_start
+
+    def impose_forces(self,msh):
+        """
+        Add the tractions to the nodal external forces transferred from the particles
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        """
+        grid = msh.grid
+        grid.f_ext[self.traction_nodes] += self.traction_force
+
+        if self.period is not None:
+            self._join(grid,('f_int','f_ext'))
+
+    def impose_total_force(self,msh,dt):
+        """
+        Set the total force of the constrained nodes that brings their
+        momentum to the prescribed velocity at the end of the step
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+
+        dt: float
+            time step of the momentum update
+        """
+        grid = msh.grid
+        nodes = self.constrained_nodes
+        grid.f_tot[nodes] = (grid.mass[nodes]*self.velocity_end-grid.momentum[nodes])/dt
+
+    def impose_velocity(self,msh):
+        """
+        Impose the conditions on the nodal momentum recalculated from the particles
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        """
+        grid = msh.grid
+
+        if self.period is not None:
+            self._join(grid,('momentum',))
+
+        nodes = self.constrained_nodes
+        grid.velocity[nodes] = self.velocity_end
+        grid.momentum[nodes] = grid.mass[nodes]*self.velocity_end
+
+    def wrap_particles(self,msh):
+        """
+        Move the particles leaving the periodic interval into it from the other end
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        """
+        if self.period is None:
+            return
+
+        start, end = self.period
+        position = msh.store.position
+        outside = (position<start) | (position>=end)
+        position[outside] = start+np.mod(position[outside]-start,end-start)
+
+    def _join(self,grid,quantities):
+        """
+        Adds the values of the periodic node pairs
+        """
+        for name in quantities:
+            values = getattr(grid,name)
+            joined = values[self.periodic_first]+values[self.periodic_second]
+            values[self.periodic_first] = joined
+            values[self.periodic_second] = joined
+
+def mesh_boundary(msh,msetup):
+    """
+    Returns the boundary conditions of the model compiled for a mesh,
+    compiling them when they are not compiled or have changed
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+
+    msetup: model_setup
+        a model_setup object containing the model options
+
+    Returns
+    -------
+    bc: boundary_arrays
+        compiled conditions, kept in msh.boundary
+    """
+    bc = msh.boundary
+    conditions = msetup.boundary_conditions
+    if bc is None or bc.conditions is not conditions or bc.version!=conditions.version:
+        bc = conditions.compile(msh)
+        msh.boundary = bc
+    return bc
@@ -0,0 +1,372 @@
+"""
+
+This module saves and restores the full state of a simulation
+
+A checkpoint is a single .npz file with the nodal and particle arrays,
+the element data and active sets, the materials (class and constructor
+parameters) and their state variables, the model setup options and
+boundary conditions and the loop state of solver.explicit_solution,
+with the state of the solution recorder and the conservation monitor of
+the run when they are given. Every entry is a plain array, the file is
+read without pickle. Resuming from a checkpoint reproduces the
+uninterrupted run bit for bit.
+
+Boundary conditions given as functions of time are stored by reference
+('module:name') and must be defined at module level to be restored,
+other functions (lambdas, nested functions) are not stored and the
+conditions are then given to load_checkpoint.
+
+"""
+import importlib
+import inspect
+import os
+
+import numpy as np
+
+import boundary
+import mesh
+import setup
+import solver
+
+def _reference(obj):
+    """
+    Returns the 'module:name' reference of a module level class or
+    function, an empty string when it can not be imported by name
+    """
+    module = getattr(obj,'__module__',None)
+    name = getattr(obj,'__qualname__','')
+    if module is None or '<' in name:
+        return ''
+    try:
+        if _resolve(module+':'+name) is obj:
+            return module+':'+name
+    except (ImportError,AttributeError):
+        pass
+    return ''
+
+def _resolve(reference):
+    """
+    Returns the class or function of a 'module:name' reference
+    """
+    module, name = reference.split(':')
+    obj = importlib.import_module(module)
+    for attribute in name.split('.'):
+        obj = getattr(obj,attribute)
+    return obj
+
+def _value(array):
+    """
+    Returns a saved scalar as a Python value, arrays unchanged
+    """
+    return array.item() if array.ndim==0 else array
+
+def _material_data(materials):
+    """
+    Returns the class references and constructor parameters of the materials
+    """
+    data = {'material_classes': np.array([_reference(type(imat)) for imat in materials],dtype=str)}
+    for imat, mat in enumerate(materials):
+        if not data['material_classes'][imat]:
+            raise ValueError("material class %s is not defined at module level"%type(mat).__name__)
+        for name in inspect.signature(type(mat)).parameters:
+            data['material_%d_%s'%(imat,name)] = np.asarray(getattr(mat,name))
+    return data
+
+def _load_materials(data):
+    """
+    Returns the materials saved by _material_data
+    """
+    materials = []
+    for imat, reference in enumerate(data['material_classes']):
+        cls = _resolve(str(reference))
+        params = {name: _value(data['material_%d_%s'%(imat,name)])
+                  for name in inspect.signature(cls).parameters}
+        materials.append(cls(**params))
+    return materials
+
+def _boundary_data(conditions):
+    """
+    Returns the node sets and values of the boundary conditions, functions
+    of time are stored by reference
+    """
+    data = {'bc_constraints': np.int64(len(conditions.constraints)),
+            'bc_tractions': np.int64(len(conditions.tractions)),
+            'bc_periodic': np.int64(len(conditions.periodic_pairs))}
+    for kind, entries in (('constraint',conditions.constraints),('traction',conditions.tractions)):
+        for k, (nodes, value) in enumerate(entries):
+            data['bc_%s_%d_nodes'%(kind,k)] = nodes
+            if callable(value):
+                data['bc_%s_%d_function'%(kind,k)] = np.array(_reference(value))
+            else:
+                data['bc_%s_%d_value'%(kind,k)] = np.asarray(value,dtype=np.float64)
+    for k, (first, second) in enumerate(conditions.periodic_pairs):
+        data['bc_periodic_%d_first'%k] = first
+        data['bc_periodic_%d_second'%k] = second
+    return data
+
+def _load_boundary(data):
+    """
+    Returns the boundary conditions saved by _boundary_data
+    """
+    conditions = boundary.boundary_conditions()
+    for kind, add in (('constraint',conditions.prescribe_velocity),('traction',conditions.traction)):
+        for k in range(int(data['bc_%ss'%kind])):
+            name = 'bc_%s_%d_'%(kind,k)
+            if name+'function' in data:
+                try:
+                    value = _resolve(str(data[name+'function']))
+                except (ValueError,ImportError,AttributeError):
+                    raise ValueError("the checkpoint boundary conditions have functions not defined at "
+                                     "module level, give the boundary conditions to load_checkpoint")
+            else:
+                value = _value(data[name+'value'])
+            add(data[name+'nodes'],value)
+    for k in range(int(data['bc_periodic'])):
+        conditions.periodic(data['bc_periodic_%d_first'%k],data['bc_periodic_%d_second'%k])
+    return conditions
+
+def _setup_data(msetup):
+    """
+    Returns the options and solution of a model setup
+    """
+    data = {}
+    for name in vars(setup.model_setup()):
+        if name not in ('boundary_conditions','solution_array'):
+            data['setup_'+name] = np.asarray(getattr(msetup,name))
+    data['setup_solution_time'] = np.asarray(msetup.solution_array[0],dtype=np.float64)
+    data['setup_solution_value'] = np.asarray(msetup.solution_array[1],dtype=np.float64)
+    return data
+
+def _load_setup(data):
+    """
+    Returns the model setup saved by _setup_data, without boundary conditions
+    """
+    msetup = setup.model_setup()
+    for name in vars(setup.model_setup()):
+        if 'setup_'+name in data:
+            setattr(msetup,name,_value(data['setup_'+name]))
+    msetup.solution_array = [data['setup_solution_time'].tolist(),list(data['setup_solution_value'])]
+    return msetup
+
+def save_checkpoint(path,msh,msetup,it,loop_counter,nlost=0,dt_previous=0.0,recorder=None,monitor=None):
+    """
+    Saves the simulation state in a file
+
+    The file is written under a temporary name and then renamed, so an
+    interruption while saving does not corrupt the previous checkpoint.
+
+    Arguments
+    ---------
+    path: string
+        checkpoint file path (.npz)
+    msh: mesh
+        a mesh object
+    msetup: model_setup
+        a model_setup object
+    it: float
+        time of the next time step
+    loop_counter: int
+        loop counter of the next time step
+    nlost: int
+        number of particles outside the mesh
+    dt_previous: float
+        time step of the last loop
+    recorder: solution_recorder
+        recorder of the run, its state is saved
+    monitor: conservation_monitor
+        monitor of the run, its state is saved
+    """
+    ps = msh.store
+    grid = msh.grid
+
+    data = {
+        'it': np.float64(it),
+        'loop_counter': np.int64(loop_counter),
+        'nlost': np.int64(nlost),
+        'dt_previous': np.float64(dt_previous),
+        'nelem': np.int64(msh.nelem),
+        'ppelem': np.int64(msh.ppelem),
+        'element_length': msh.element_length,
+        'connectivity': msh.connectivity,
+        'active_elements': msh.active_elements,
+        'active_nodes': msh.active_nodes,
+        'particle_element': ps.element,
+        'particle_material_id': ps.material_id,
+    }
+    data.update(_material_data(ps.materials))
+    for imat, state in enumerate(ps.state):
+        for name, value in state.items():
+            data['state_%d_%s'%(imat,name)] = value
+    data.update(_setup_data(msetup))
+    data.update(_boundary_data(msetup.boundary_conditions))
+    for name in grid.fields:
+        data['node_'+name] = getattr(grid,name)
+    for name in ps.fields:
+        data['particle_'+name] = getattr(ps,name)
+    if recorder is not None:
+        for name, value in recorder.get_state().items():
+            data['recorder_'+name] = value
+    if monitor is not None:
+        for name, value in monitor.get_state().items():
+            data['monitor_'+name] = value
+
+    tmp = path+'.tmp'
+    with open(tmp,'wb') as f:
+        np.savez(f,**data)
+    os.replace(tmp,path)
+
+def _prefixed(data,prefix):
+    """
+    Returns the arrays of a checkpoint file with a name prefix, without
+    the prefix, None if there are none
+    """
+    values = {name[len(prefix):]: data[name] for name in data.files if name.startswith(prefix)}
+    return values or None
+
+def load_checkpoint(path,boundary_conditions=None):
+    """
+    Loads a simulation state from a file
+
+    Arguments
+    ---------
+    path: string
+        checkpoint file path (.npz)
+    boundary_conditions: boundary_conditions
+        boundary conditions replacing the saved ones, needed when the saved
+        ones have functions not defined at module level
+
+    Returns
+    -------
+    msh: mesh
+        a mesh object in the saved state
+    msetup: model_setup
+        the saved model_setup object
+    state: dict
+        loop state, with keys 'it', 'loop_counter', 'nlost', 'dt_previous',
+        'recorder' and 'monitor' (saved recorder and monitor states, None
+        when the checkpoint has none)
+    """
+    with np.load(path) as data:
+
+        # mesh topology and nodal state
+        nelem = int(data['nelem'])
+        xn = data['node_x']
+        msh = mesh.mesh_1D(xn[-1]-xn[0],nelem)
+        msh.ppelem = int(data['ppelem'])
+        for name in msh.grid.fields:
+            getattr(msh.grid,name)[:] = data['node_'+name]
+        msh.element_length[:] = data['element_length']
+        msh.connectivity[:] = data['connectivity']
+        msh.uniform = mesh.uniform_lengths(msh.element_length)
+        msh.active_elements = data['active_elements']
+        msh.active_nodes = data['active_nodes']
+
+        # particles
+        materials = _load_materials(data)
+        ps = msh.store
+        if len(data['particle_position']):
+            ps.add_many(0,materials[0],data['particle_position'],0,-1)
+        for name in ps.fields:
+            getattr(ps,name)[:] = data['particle_'+name]
+        ps.element[:] = data['particle_element']
+        ps.material_id[:] = data['particle_material_id']
+        ps.materials = materials
+        ps.state = [{} for imat in materials]
+        for name in data.files:
+            if name.startswith('state_'):
+                imat, field = name[len('state_'):].split('_',1)
+                ps.state[int(imat)][field] = data[name]
+
+        msetup = _load_setup(data)
+        if boundary_conditions is None:
+            boundary_conditions = _load_boundary(data)
+        msetup.boundary_conditions = boundary_conditions
+
+        state = {'it': float(data['it']),
+                 'loop_counter': int(data['loop_counter']),
+                 'nlost': int(data['nlost']),
+                 'dt_previous': float(data['dt_previous']),
+                 'recorder': _prefixed(data,'recorder_'),
+                 'monitor': _prefixed(data,'monitor_')}
+
+    return msh, msetup, state
+
+class checkpointer:
+    """
+    Saves checkpoints of a simulation at a fixed interval of time steps
+
+    Attributes
+    ----------
+    path : string
+        checkpoint file path (.npz), overwritten at each checkpoint
+
+    every : int
+        number of time steps between checkpoints
+    """
+
+    def __init__(self,path,every=1000):
+
+        self.path = path
+        self.every = max(int(every),1)
+
+    def update(self,msh,msetup,it,loop_counter,nlost=0,dt_previous=0.0,recorder=None,monitor=None):
+        """
+        Saves a checkpoint if the interval has elapsed
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        msetup: model_setup
+            a model_setup object
+        it: float
+            time of the next time step
+        loop_counter: int
+            loop counter of the next time step
+        nlost: int
+            number of particles outside the mesh
+        dt_previous: float
+            time step of the last loop
+        recorder: solution_recorder
+            recorder of the run
+        monitor: conservation_monitor
+            monitor of the run
+        """
+        if (loop_counter-1)%self.every==0:
+            save_checkpoint(self.path,msh,msetup,it,loop_counter,nlost,dt_previous,recorder,monitor)
+
+def resume(path,recorder=None,checkpoint=None,profiler=None,monitor=None,boundary_conditions=None):
+    """
+    Resumes a simulation from a checkpoint file and runs it to the end
+
+    A recorder or monitor continues the history saved in the checkpoint,
+    a recorder with a path then overwrites the records written after the
+    checkpoint. Without a saved state they start at the checkpoint.
+
+    Arguments
+    ---------
+    path: string
+        checkpoint file path (.npz)
+    recorder: solution_recorder
+        optional recorder for the remaining time steps, with the fields
+        and capacity of the checkpointed recorder
+    checkpoint: checkpointer
+        optional checkpointer for the remaining time steps
+    profiler: phase_profiler
+        optional profiler of the remaining time steps
+    monitor: conservation_monitor
+        optional monitor of the energy and momentum balance
+    boundary_conditions: boundary_conditions
+        boundary conditions replacing the saved ones (see load_checkpoint)
+
+    Returns
+    -------
+    msh: mesh
+        a mesh object in the final state
+    msetup: model_setup
+        the model_setup object, with the full solution_array
+    """
+    msh, msetup, state = load_checkpoint(path,boundary_conditions)
+    solver.explicit_solution(msh,msetup,recorder=recorder,checkpoint=checkpoint,start=state,
+                             profiler=profiler,monitor=monitor)
+    return msh, msetup
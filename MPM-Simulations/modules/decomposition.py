@@ -0,0 +1,644 @@
+"""
+
+This module solves a 1D model with the mesh split in subdomains, one process per subdomain
+
+The elements of a mesh_1D are split in contiguous ranges holding a similar
+number of particles. Each worker process advances its subdomain with the
+array operations of the numpy engine. The end nodes of a subdomain are
+shared with the neighbour subdomains: after each particle to grid transfer
+the contributions of the particles to these nodes are exchanged through
+shared memory, so both copies of a shared node hold the values of the
+undivided mesh. Particles crossing a subdomain boundary are sent to the
+neighbour subdomain after the particles are located.
+
+"""
+import multiprocessing
+import time
+import traceback
+
+import numpy as np
+
+import integration as integra
+import interpolation as interpola
+import mesh
+import solver
+import update
+
+# quantities exchanged in the shared nodes, 'active' marks the nodes of
+# active elements so shared nodes stay active in both subdomains
+HALO_QUANTITIES = ('active','mass','momentum','f_int','f_ext')
+
+# values per subdomain in the reductions over all subdomains
+REDUCTION_SIZE = 3
+
+def partition_elements(msh,nprocs):
+    """
+    Splits the mesh elements in contiguous ranges with a similar number of particles
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    nprocs: int
+        number of subdomains
+
+    Returns
+    -------
+    bounds: numpy.ndarray
+        first element of each subdomain followed by the number of elements,
+        the subdomain i has the elements bounds[i] to bounds[i+1]-1
+    """
+    if not 1<=nprocs<=msh.nelem:
+        raise ValueError("the number of subdomains must be between 1 and the number of elements")
+
+    # particles per element, plus one so empty elements are also split
+    element = msh.store.element
+    weight = np.cumsum(np.bincount(element[element>=0],minlength=msh.nelem)+1)
+    target = weight[-1]*np.arange(1,nprocs)/nprocs
+
+    bounds = np.zeros(nprocs+1,dtype=np.int64)
+    bounds[1:-1] = np.searchsorted(weight,target)+1
+    bounds[-1] = msh.nelem
+
+    # at least one element per subdomain
+    for i in range(1,nprocs):
+        bounds[i] = min(max(bounds[i],bounds[i-1]+1),msh.nelem-(nprocs-i))
+
+    return bounds
+
+def subdomain_mesh(msh,first,last,ids):
+    """
+    Returns the mesh of a range of elements with a set of particles
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    first: int
+        first element of the subdomain
+    last: int
+        element after the last element of the subdomain
+    ids: numpy.ndarray
+        increasing indices of the particles of the subdomain
+
+    Returns
+    -------
+    sub: mesh
+        a mesh object with local element and node numbering, its particle
+        store has the materials of the mesh in the same order
+    """
+    ps = msh.store
+    xn = msh.grid.x
+
+    sub = mesh.mesh_1D(xn[last]-xn[first],last-first)
+    sub.grid.x[:] = xn[first:last+1]
+    sub.element_length[:] = msh.element_length[first:last]
+    sub.uniform = msh.uniform
+    sub.ppelem = msh.ppelem
+
+    for imat in ps.materials:
+        sub.store.material_index(imat)
+
+    data = ps.select(ids)
+    element = data['element']
+    data['element'] = np.where((element>=first) & (element<last),element-first,-1)
+    sub.store.append(data)
+
+    return sub
+
+class subdomain:
+    """
+    Represent the part of a mesh advanced by a worker process and its
+    links with the neighbour subdomains
+
+    Attributes
+    ----------
+    msh : mesh
+        mesh of the subdomain, with local numbering
+
+    rank : int
+        subdomain index, from left to right
+
+    nprocs : int
+        number of subdomains
+
+    gid : numpy.ndarray
+        index of each particle of the subdomain in the undivided mesh
+
+    first_element : int
+        index of the first element of the subdomain in the undivided mesh
+    """
+
+    def __init__(self,msh,rank,nprocs,gid,first_element,barrier,halo,reduction,left,right):
+
+        self.msh = msh
+        self.rank = rank
+        self.nprocs = nprocs
+        self.gid = gid
+        self.first_element = first_element
+
+        # synchronization and shared memory, two alternating slots so a
+        # subdomain can write the next values while a slower neighbour
+        # still reads the previous ones
+        self._barrier = barrier
+        self._halo = np.frombuffer(halo).reshape(2,nprocs,2,len(HALO_QUANTITIES))
+        self._reduction = np.frombuffer(reduction).reshape(2,nprocs,REDUCTION_SIZE)
+        self._nhalo = 0
+        self._nreduction = 0
+
+        # pipes to the neighbour subdomains
+        self._left = left
+        self._right = right
+
+    def exchange(self,quantities):
+        """
+        Adds the neighbour contributions to the values of the shared nodes
+
+        Arguments
+        ---------
+        quantities: tuple
+            names of HALO_QUANTITIES to exchange
+        """
+        grid = self.msh.grid
+        ends = (0,grid.n-1)
+
+        slot = self._halo[self._nhalo%2]
+        self._nhalo += 1
+
+        active = np.zeros(grid.n)
+        active[self.msh.active_nodes] = 1
+        columns = [HALO_QUANTITIES.index(name) for name in quantities]
+        for iq, name in zip(columns,quantities):
+            values = active if name=='active' else getattr(grid,name)
+            slot[self.rank,:,iq] = values[list(ends)]
+
+        self._barrier.wait()
+
+        # the left neighbour sends its right end node, the right neighbour its left end node
+        for node, neighbour, side in ((ends[0],self.rank-1,1),(ends[1],self.rank+1,0)):
+            if not 0<=neighbour<self.nprocs:
+                continue
+            for iq, name in zip(columns,quantities):
+                if name=='active':
+                    if slot[neighbour,side,iq] and not active[node]:
+                        self.msh.active_nodes = np.union1d(self.msh.active_nodes,[node])
+                else:
+                    getattr(grid,name)[node] += slot[neighbour,side,iq]
+
+    def gather(self,values):
+        """
+        Returns the values of all subdomains
+
+        Arguments
+        ---------
+        values: list
+            at most REDUCTION_SIZE values of this subdomain
+
+        Returns
+        -------
+        values: numpy.ndarray
+            values of each subdomain, shape (nprocs, len(values))
+        """
+        slot = self._reduction[self._nreduction%2]
+        self._nreduction += 1
+
+        slot[self.rank,:len(values)] = values
+        self._barrier.wait()
+        return slot[:,:len(values)].copy()
+
+    def migrate(self):
+        """
+        Sends the particles beyond the subdomain ends to the neighbour
+        subdomains and receives the particles entering the subdomain
+
+        Returns
+        -------
+        changed: bool
+            True if particles were sent or received
+        nlost: int
+            number of particles outside the undivided mesh
+        """
+        ps = self.msh.store
+        xn = self.msh.grid.x
+
+        # particles entering the neighbour subdomains
+        to_left = ps.position<xn[0] if self.rank>0 else np.zeros(ps.n,dtype=bool)
+        to_right = ps.position>=xn[-1] if self.rank<self.nprocs-1 else np.zeros(ps.n,dtype=bool)
+        lost = np.count_nonzero(ps.element<0)-np.count_nonzero(to_left)-np.count_nonzero(to_right)
+
+        counts = self.gather([np.count_nonzero(to_left),np.count_nonzero(to_right),lost])
+        nlost = int(counts[:,2].sum())
+
+        leaving = np.flatnonzero(to_left | to_right)
+        sent = {}
+        received = []
+
+        if len(leaving):
+            for name, selected in (('left',to_left),('right',to_right)):
+                if selected.any():
+                    sent[name] = ps.select(np.flatnonzero(selected))
+                    sent[name]['gid'] = self.gid[selected]
+            ps.remove(leaving)
+            self.gid = np.delete(self.gid,leaving)
+
+        # send to the right and receive from the left, then the opposite,
+        # the last (first) subdomain only receives so the sends complete
+        if counts[self.rank,1]:
+            self._right.send(sent['right'])
+        if self.rank>0 and counts[self.rank-1,1]:
+            received.append(self._left.recv())
+
+        if counts[self.rank,0]:
+            self._left.send(sent['left'])
+        if self.rank<self.nprocs-1 and counts[self.rank+1,0]:
+            received.append(self._right.recv())
+
+        for data in received:
+            ps.append(data)
+            self.gid = np.concatenate((self.gid,data['gid']))
+
+        return bool(len(leaving) or received), nlost
+
+    def abort(self):
+        """
+        Releases the other subdomains waiting for this one
+        """
+        self._barrier.abort()
+
+def subdomain_step(sd,msetup,dt,dt_velocity):
+    """
+    Advance a subdomain one time step, as solver.numpy_step advances the
+    undivided mesh
+
+    Arguments
+    ---------
+    sd: subdomain
+        a subdomain object
+
+    msetup : model_setup
+        a model_setup object containing the model options
+
+    dt : float
+        time step
+
+    dt_velocity : float
+        time step of the momentum and velocity update
+
+    Returns
+    -------
+    nlost : int
+        number of particles outside the undivided mesh
+    """
+    msh = sd.msh
+    bc = msh.boundary
+
+    # reset all nodal values
+    update.reset_nodal_vaues(msh)
+
+    # update the element of each particle and move particles between subdomains
+    update.locate_particles(msh)
+    changed, nlost = sd.migrate()
+    if changed:
+        update.locate_particles(msh)
+
+    # update interpolation functions values
+    update.interpolation_functions_values(msh,msetup.interpolation_type)
+
+    # Update Stress First Scheme
+    if msetup.integration_scheme=='USF':
+
+        # particle mass and momentum to grid
+        interpola.particles_to_nodes(msh,('mass','momentum'),msetup.threads)
+        sd.exchange(('active','mass','momentum'))
+
+        # impose essential boundary conditions (in constrained nodes set mv)
+        bc.impose_momentum(msh)
+
+        # calculate the grid nodal velocity
+        update.nodal_velocity(msh)
+
+        # calculate particle strain increment
+        update.particle_strain_increment_array(msh,dt)
+
+        # update particle density
+        update.particle_density(msh,dt)
+
+        # update particle stress
+        update.particle_stress(msh,dt)
+
+        # particle internal and external forces to grid
+        interpola.particles_to_nodes(msh,('f_int','f_ext'),msetup.threads)
+        sd.exchange(('f_int','f_ext'))
+
+    else:
+
+        # all particle quantities to grid
+        interpola.particles_to_nodes(msh,threads=msetup.threads)
+        sd.exchange(('active',)+interpola.P2G_QUANTITIES)
+
+        # impose essential boundary conditions (in constrained nodes set mv)
+        bc.impose_momentum(msh)
+
+    # impose natural boundary conditions (tractions), after the exchange so
+    # both copies of a shared node are loaded once
+    bc.impose_forces(msh)
+
+    # calculate total force in node, impose essential boundary conditions
+    # (in constrained nodes set f=m*a) and integrate the grid nodal momentum equation
+    integra.nodal_update(msh,msetup,dt_velocity,bc)
+
+    # update particle velocity and position
+    update.nodes_to_particles(msh,dt_velocity,dt)
+
+    # Modified Update Stress Last Scheme
+    if(msetup.integration_scheme=='MUSL'):
+
+        # recalculate the grid nodal momentum
+        update.nodal_momentum_array(msh,msetup.threads)
+        sd.exchange(('momentum',))
+
+        # impose essential boundary conditions (in constrained nodes set v and mv)
+        bc.impose_velocity(msh)
+
+    # Modified Update Stress Last or Update Stress Last Scheme
+    if(msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL'):
+
+        # calculate the grid nodal velocity (up to date in the USL scheme)
+        if msetup.integration_scheme=='MUSL':
+            update.nodal_velocity(msh)
+
+        # calculate particle strain increment
+        update.particle_strain_increment_array(msh,dt)
+
+        # update particle density
+        update.particle_density(msh,dt)
+
+        # update particle stress
+        update.particle_stress(msh,dt)
+
+    return nlost
+
+def _run_subdomain(sd,msetup):
+    """
+    Runs the time loop of solver.explicit_solution over a subdomain
+
+    Returns
+    -------
+    times: list
+        time of each step
+    values: dict
+        step number to the solution field value, for the steps in which
+        the solution particle is in the subdomain
+    """
+    ps = sd.msh.store
+
+    loop_counter = 1
+    it = 0
+    nlost = 0
+    dt_previous = msetup.dt
+    times = []
+    values = {}
+
+    while it<=msetup.time:
+
+        # time step, the smallest stable time step of all subdomains in adaptive mode
+        if msetup.adaptive_dt:
+            dt = sd.gather([solver.cfl_time_step(sd.msh,msetup)])[:,0].min()
+            dt = msetup.dt if dt==np.inf else float(min(max(dt,msetup.dt_min),msetup.dt_max))
+        else:
+            dt = msetup.dt
+
+        dt_velocity = dt/2.0 if loop_counter==1 else (dt_previous+dt)/2.0
+
+        # boundary conditions of the time step
+        sd.msh.boundary.update(it,dt)
+
+        # advance the subdomain one time step
+        lost = subdomain_step(sd,msetup,dt,dt_velocity)
+
+        # report particles leaving the mesh
+        if lost>nlost and sd.rank==0:
+            print("warning: %d particles outside the mesh at time %g"%(lost,it))
+        nlost = lost
+
+        # store data for plot
+        times.append(it)
+        i = np.flatnonzero(sd.gid==msetup.solution_particle)
+        if len(i):
+            field = ps.velocity if msetup.solution_field=='velocity' else ps.position
+            values[loop_counter-1] = field[i[0]]
+
+        loop_counter+=1
+        it+=dt
+        dt_previous=dt
+
+    return times, values
+
+def _worker(sub,rank,nprocs,gid,first_element,msetup,barrier,halo,reduction,left,right,result):
+    """
+    Solves a subdomain in a worker process and sends its final state through the result pipe
+    """
+    try:
+        sd = subdomain(sub,rank,nprocs,gid,first_element,barrier,halo,reduction,left,right)
+
+        start = time.perf_counter()
+        times, values = _run_subdomain(sd,msetup)
+        loop_time = time.perf_counter()-start
+
+        # final state with the numbering of the undivided mesh, each
+        # subdomain returns its nodes but the right end node, which
+        # belongs to the right neighbour
+        ps = sub.store
+        grid = sub.grid
+        data = ps.select(np.arange(ps.n))
+        data['element'] = np.where(data['element']>=0,data['element']+first_element,-1)
+        nnodes = grid.n if rank==nprocs-1 else grid.n-1
+        nodes = {name: getattr(grid,name)[:nnodes].copy() for name in grid.fields}
+
+        result.send(('ok',{'gid': sd.gid,'particles': data,'nodes': nodes,
+                           'times': times,'values': values,'loop_time': loop_time}))
+
+    except Exception:
+        barrier.abort()
+        result.send(('error',traceback.format_exc()))
+
+    finally:
+        result.close()
+
+def explicit_solution_decomposed(msh,msetup,nprocs=2):
+    """
+    Calculates the explicit solution of the motion equation with the mesh
+    split in subdomains solved by parallel processes
+
+    The subdomains are advanced with the array operations of the numpy
+    engine and reproduce its solution up to the round-off of the sums in
+    the shared nodes. On return the mesh and msetup.solution_array hold
+    the final state, as after solver.explicit_solution.
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+
+    msetup : model_setup
+        a model_setup object containing the model options, the
+        interpolation type must be 'linear' (the subdomains share one
+        node, wider interpolation functions reach beyond it)
+
+    nprocs : int
+        number of subdomains and worker processes
+
+    Returns
+    -------
+    report : dict
+        'nprocs', 'bounds' (partition_elements), 'steps', 'time' (time
+        loop duration of the slowest subdomain) and 'wall_time' (including
+        the start of the processes and the transfer of the state)
+    """
+    if msetup.interpolation_type!='linear':
+        raise ValueError("domain decomposition supports the 'linear' interpolation type")
+    if msetup.boundary_conditions.periodic_pairs and nprocs>1:
+        raise ValueError("domain decomposition does not support periodic boundary conditions")
+
+    wall_start = time.perf_counter()
+
+    ps = msh.store
+    grid = msh.grid
+    bounds = partition_elements(msh,nprocs)
+
+    # subdomain of each particle from its position, particles outside
+    # the mesh start in the first or last subdomain
+    rank_of = np.searchsorted(grid.x[bounds[1:-1]],ps.position,side='right')
+
+    # workers are spawned, as in sweep, so they start without the threads of the parent
+    ctx = multiprocessing.get_context('spawn')
+    barrier = ctx.Barrier(nprocs)
+    halo = ctx.RawArray('d',2*nprocs*2*len(HALO_QUANTITIES))
+    reduction = ctx.RawArray('d',2*nprocs*REDUCTION_SIZE)
+    links = [ctx.Pipe() for i in range(nprocs-1)]
+
+    processes = []
+    results = []
+    for rank in range(nprocs):
+        ids = np.flatnonzero(rank_of==rank)
+        sub = subdomain_mesh(msh,bounds[rank],bounds[rank+1],ids)
+        sub.boundary = msetup.boundary_conditions.compile(sub,bounds[rank],grid.n)
+        left = links[rank-1][1] if rank>0 else None
+        right = links[rank][0] if rank<nprocs-1 else None
+        receiver, sender = ctx.Pipe(duplex=False)
+
+        process = ctx.Process(target=_worker,args=(sub,rank,nprocs,ids,bounds[rank],msetup,
+                                                   barrier,halo,reduction,left,right,sender))
+        process.start()
+        sender.close()
+        processes.append(process)
+        results.append(receiver)
+
+    # only the workers keep the neighbour pipes open
+    for left, right in links:
+        left.close()
+        right.close()
+
+    outcomes = []
+    for receiver in results:
+        try:
+            outcomes.append(receiver.recv())
+        except EOFError:
+            outcomes.append(('error',"worker process exited without result"))
+    for process in processes:
+        process.join()
+
+    errors = [message for status, message in outcomes if status=='error']
+    if errors:
+        # the first failing worker, the others stop at the broken barrier
+        errors.sort(key=lambda message: 'BrokenBarrierError' in message)
+        raise RuntimeError("subdomain worker failed:\n"+errors[0])
+
+    # final state in the undivided mesh
+    outcomes = [outcome for status, outcome in outcomes]
+    for rank, outcome in enumerate(outcomes):
+        gid = outcome['gid']
+        data = outcome['particles']
+        for name in ps.fields+('element','material_id'):
+            getattr(ps,name)[gid] = data[name]
+
+        first_node = bounds[rank]
+        for name, values in outcome['nodes'].items():
+            getattr(grid,name)[first_node:first_node+len(values)] = values
+
+    # state variables in particle order of each material
+    for imat, state in enumerate(ps.state):
+        gid = np.concatenate([outcome['gid'][outcome['particles']['material_id']==imat] for outcome in outcomes])
+        order = np.argsort(gid)
+        for name in state:
+            state[name] = np.concatenate([outcome['particles']['state'][imat][name] for outcome in outcomes])[order]
+
+    msh.update_active_set()
+
+    # solution of the tracked particle
+    times = outcomes[0]['times']
+    values = {}
+    for outcome in outcomes:
+        values.update(outcome['values'])
+    for step, it in enumerate(times):
+        msetup.solution_array[0].append(it)
+        msetup.solution_array[1].append(values.get(step,np.nan))
+
+    return {'nprocs': nprocs,
+            'bounds': bounds,
+            'steps': len(times),
+            'time': max(outcome['loop_time'] for outcome in outcomes),
+            'wall_time': time.perf_counter()-wall_start}
+
+def parallel_efficiency(builder,nprocs=(2,4),verbose=True):
+    """
+    Compares the decomposed solution with the single process numpy engine
+
+    The speedup is the time loop duration of the single process solver
+    divided by the one of the decomposed solver, the parallel efficiency
+    is the speedup divided by the number of processes.
+
+    Arguments
+    ---------
+    builder: function
+        function without arguments returning a new (mesh, model_setup) pair
+    nprocs: tuple
+        numbers of processes to compare
+    verbose: bool
+        print the results table
+
+    Returns
+    -------
+    rows: list
+        one dictionary per number of processes with the keys nprocs, time,
+        wall_time, speedup, efficiency and max_position_difference (with
+        the single process solution)
+    """
+    msh, msetup = builder()
+    msetup.engine = 'numpy'
+    start = time.perf_counter()
+    solver.explicit_solution(msh,msetup)
+    serial_time = time.perf_counter()-start
+
+    rows = [{'nprocs': 1,'time': serial_time,'wall_time': serial_time,
+             'speedup': 1.0,'efficiency': 1.0,'max_position_difference': 0.0}]
+
+    for n in nprocs:
+        sub, sub_setup = builder()
+        report = explicit_solution_decomposed(sub,sub_setup,n)
+        speedup = serial_time/report['time']
+        rows.append({'nprocs': n,
+                     'time': report['time'],
+                     'wall_time': report['wall_time'],
+                     'speedup': speedup,
+                     'efficiency': speedup/n,
+                     'max_position_difference': float(np.max(np.abs(sub.store.position-msh.store.position)))})
+
+    if verbose:
+        print('nprocs\ttime\twall\tspeedup\tefficiency\tmax diff')
+        for row in rows:
+            print('%d\t%.3f\t%.3f\t%.2f\t%.2f\t\t%.1e'%(row['nprocs'],row['time'],row['wall_time'],
+                                                       row['speedup'],row['efficiency'],
+                                                       row['max_position_difference']))
+
+    return rows
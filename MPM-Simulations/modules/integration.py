@@ -3,10 +3,11 @@
 This module defines integration nodal functions
 
 """
+import numpy as np
 
 def total_force_in_nodes(msh, msetup):
     """
-    Calculate total forces in nodes
+    Calculate total forces in the active nodes
     
     Arguments
     ---------
@@ -14,20 +15,26 @@ def total_force_in_nodes(msh, msetup):
         a mesh object
     """
 
+    grid = msh.grid
+
     # add damping force if needed
     if msetup.damping_local_alpha>0:
+
+        # damping factor
+        alpha = msetup.damping_local_alpha
         
         # add damping force in nodes
-        for node in msh.nodes:
-            
-            # damping factor
-            alpha = msetup.damping_local_alpha
+        for inode in msh.active_nodes:
+
+            # nodes without mass have no velocity
+            if grid.mass[inode]==0:
+                continue
 
             # unbalanced nodal force magnitude
-            unbalanced_force_mag = abs(node.f_int + node.f_ext)
+            unbalanced_force_mag = abs(grid.f_int[inode] + grid.f_ext[inode])
 
             # nodal velocity
-            nodal_vel = node.momentum/node.mass
+            nodal_vel = grid.momentum[inode]/grid.mass[inode]
 
             if abs(nodal_vel)!=0:
 
@@ -35,23 +42,85 @@ def total_force_in_nodes(msh, msetup):
                 vel_direction = nodal_vel/abs(nodal_vel)
                 
                 # damping force proportional to unbalanced forces and opposite to the nodal velocity
-                node.f_damp = - alpha * unbalanced_force_mag * vel_direction
+                grid.f_damp[inode] = - alpha * unbalanced_force_mag * vel_direction
 
     # total nodal force
-    for node in msh.nodes:
-        node.f_tot = node.f_int + node.f_ext + node.f_damp
+    for inode in msh.active_nodes:
+        grid.f_tot[inode] = grid.f_int[inode] + grid.f_ext[inode] + grid.f_damp[inode]
                   
 def momentum_in_nodes(msh,dt):
     """
-    Calculate momentum in nodes
+    Calculate momentum in the active nodes
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+
+    dt: float
+        time step
+    """
+    grid = msh.grid
+    for inode in msh.active_nodes:
+        grid.momentum[inode] += grid.f_tot[inode]*dt
+
+def nodal_update(msh,msetup,dt,bc=None):
+    """
+    Calculate the damping and total forces, integrate the momentum and
+    update the velocity of the active nodes in one pass over the nodal arrays
+
+    The nodal values are computed as total_force_in_nodes, the
+    constrained node conditions (boundary_arrays.impose_total_force) and
+    momentum_in_nodes followed by update.nodal_velocity. Nodes without
+    mass get no damping force and zero velocity.
 
     Arguments
     ---------
     msh: mesh
         a mesh object
 
+    msetup: model_setup
+        a model_setup object containing the model options
+
     dt: float
         time step
+
+    bc: boundary_arrays
+        compiled boundary conditions, the constrained nodes reach their
+        prescribed velocity at the end of the step
     """
-    for inode in msh.nodes:
-        inode.momentum += inode.f_tot*dt
\ No newline at end of file
+    grid = msh.grid
+    nodes = msh.active_nodes
+
+    mass = grid.mass[nodes]
+    momentum = grid.momentum[nodes]
+    has_mass = mass!=0
+
+    # unbalanced nodal force
+    f_tot = grid.f_int[nodes]+grid.f_ext[nodes]
+
+    # damping force proportional to unbalanced forces and opposite to the nodal velocity
+    f_damp = grid.f_damp[nodes]
+    if msetup.damping_local_alpha>0:
+        velocity = np.divide(momentum,mass,out=np.zeros(len(nodes)),where=has_mass)
+        moving = velocity!=0
+        f_damp[moving] = -msetup.damping_local_alpha*np.abs(f_tot[moving])*np.sign(velocity[moving])
+        grid.f_damp[nodes] = f_damp
+
+    # total nodal force, in the constrained nodes the force reaching the prescribed velocity
+    f_tot += f_damp
+    grid.f_tot[nodes] = f_tot
+    if bc is not None:
+        bc.impose_total_force(msh,dt)
+        f_tot = grid.f_tot[nodes]
+
+    # momentum integration and nodal velocity
+    momentum += f_tot*dt
+    grid.momentum[nodes] = momentum
+    grid.velocity[nodes] = np.divide(momentum,mass,out=np.zeros(len(nodes)),where=has_mass)
+
+    # exact prescribed momentum and velocity in the constrained nodes
+    if bc is not None:
+        constrained = bc.constrained_nodes
+        grid.momentum[constrained] = grid.mass[constrained]*bc.velocity_end
+        grid.velocity[constrained] = bc.velocity_end
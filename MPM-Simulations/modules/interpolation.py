@@ -13,6 +13,19 @@ $$f_p$$: is a particle quantity, and
 $$N_I(x_p)$$: is the weight or interpolation function of the node *I* evaluated at particle position $$x_p$$
 
 """
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# quantities transferred by particles_to_nodes, in the order they are scattered
+P2G_QUANTITIES = ('mass','momentum','f_int','f_ext')
+
+# smallest number of particles per thread in particles_to_nodes
+MIN_CHUNK = 10000
+
+# thread pools of particles_to_nodes, by number of threads
+_pools = {}
 	
 def mass_to_nodes(msh):
 	"""
@@ -74,4 +87,120 @@ def external_force_to_nodes(msh):
 		for ip in ie.particles:
 		
 			ie.n1.f_ext+=ip.N1*ip.f_ext
-			ie.n2.f_ext+=ip.N2*ip.f_ext
\ No newline at end of file
+			ie.n2.f_ext+=ip.N2*ip.f_ext
+
+def particles_to_nodes(msh,quantities=P2G_QUANTITIES,threads=1):
+	"""
+	Interpolate particle quantities to the nodal arrays of the mesh.
+
+	The particle weights of all requested quantities are computed in one
+	pass over the interpolation tables of the particles (ps.support, ps.N
+	and ps.dN), each quantity is scattered with one weighted bincount and
+	accumulated into the arrays of msh.grid.
+
+	With several threads the particles are split in contiguous chunks,
+	each thread scatters one chunk into its own nodal buffer and the
+	buffers are added at the end, so threads never write the same node.
+	The thread pool of each number of threads is created on first use and
+	kept for the life of the process, close_pools shuts the pools down
+	(also called at exit).
+
+	Arguments
+	---------
+	msh: mesh
+		a mesh object
+
+	quantities: tuple
+		nodal quantities to accumulate, any of 'mass', 'momentum', 'f_int' and 'f_ext'
+
+	threads: int
+		number of threads
+	"""
+	ps = msh.store
+	grid = msh.grid
+
+	if threads>1 and ps.n>=threads*MIN_CHUNK:
+		bounds = np.linspace(0,ps.n,threads+1).astype(np.int64)
+		chunks = [slice(bounds[i],bounds[i+1]) for i in range(threads)]
+		buffers = list(_thread_pool(threads).map(lambda chunk: _scatter(msh,quantities,chunk),chunks))
+		nodal = buffers[0]
+		for buf in buffers[1:]:
+			nodal += buf
+	else:
+		nodal = _scatter(msh,quantities,slice(0,ps.n))
+
+	for iq, name in enumerate(quantities):
+		getattr(grid,name)[:] += nodal[:,iq]
+
+def _thread_pool(threads):
+	"""
+	Returns a thread pool with the given number of threads, created on first use
+	"""
+	if threads not in _pools:
+		_pools[threads] = ThreadPoolExecutor(max_workers=threads)
+	return _pools[threads]
+
+def close_pools():
+	"""
+	Shuts down the thread pools of particles_to_nodes, they are created
+	again when needed
+	"""
+	while _pools:
+		_, pool = _pools.popitem()
+		pool.shutdown(wait=True)
+
+atexit.register(close_pools)
+
+def _scatter(msh,quantities,chunk):
+	"""
+	Returns the nodal values of the quantities accumulated from a chunk of
+	particles, shape (nnodes, len(quantities))
+
+	Arguments
+	---------
+	msh: mesh
+		a mesh object
+
+	quantities: tuple
+		nodal quantities to accumulate
+
+	chunk: slice
+		particles to scatter
+	"""
+	ps = msh.store
+	nq = len(quantities)
+
+	# support nodes and functions, one row per node of the support (particles
+	# outside the mesh have zero functions and do not contribute)
+	support = ps.support[chunk].T
+	N = ps.N[chunk].T
+	dN = ps.dN[chunk].T
+	mass = ps.mass[chunk]
+
+	# particle contributions to the support nodes, one block per quantity
+	weights = np.empty((nq,)+N.shape)
+	for iq, name in enumerate(quantities):
+
+		if name=='mass':
+			np.multiply(mass,N,out=weights[iq])
+
+		elif name=='momentum':
+			np.multiply(mass*ps.velocity[chunk],N,out=weights[iq])
+
+		elif name=='f_int':
+			np.multiply(-ps.stress[chunk]*mass/ps.density[chunk],dN,out=weights[iq])
+
+		elif name=='f_ext':
+			np.multiply(ps.f_ext[chunk],N,out=weights[iq])
+
+		else:
+			raise ValueError("unknown nodal quantity '%s'"%name)
+
+	# one bincount per quantity, scattering the quantities separately keeps
+	# the bins in cache and is faster than a single (node, quantity) bincount
+	bins = support.ravel()
+	nnodes = msh.grid.n
+	nodal = np.empty((nnodes,nq))
+	for iq in range(nq):
+		nodal[:,iq] = np.bincount(bins,weights=weights[iq].ravel(),minlength=nnodes)
+	return nodal
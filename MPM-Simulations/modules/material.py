@@ -2,7 +2,15 @@
 
 This module defines classes representing materials
 
+A material updates the stress of one particle with update_stress, and of
+all its particles at once with update_stress_array. State variables of a
+material are kept per particle in the arrays returned by new_state.
+Materials with update_stress_2D_array can be used in the 2D solver
+(mpm2d), their stress and strain are in Voigt notation (xx, yy, xy) with
+the engineering shear strain.
+
 """
+import numpy as np
 
 class linear_elastic:
     """ 
@@ -14,11 +22,14 @@ class linear_elastic:
     	Young's modulus
     density : float
     	density
+    nu : float
+    	Poisson's ratio, used in 2D (plane strain)
     """
-    def __init__(self,E,density):
+    def __init__(self,E,density,nu=0):
         
         self.E=E # Young's modulus
         self.density=density # density
+        self.nu=nu # Poisson's ratio
 
     def update_stress(self,particle,dt):
         
@@ -33,6 +44,101 @@ class linear_elastic:
         
         particle.stress+=particle.dstrain*self.E
 
+    def new_state(self,n):
+        
+        """
+        Returns the initial state variables of n particles, a linear elastic
+        material has none
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+
+        return {}
+
+    def update_stress_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated stress of the particles of the material
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress
+        dstrain: numpy.ndarray
+            particles strain increment
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        return stress+dstrain*self.E
+
+    def elastic_matrix_2D(self):
+        
+        """
+        Returns the plane strain elastic matrix in Voigt notation
+        """
+
+        E=self.E
+        nu=self.nu
+        c=E/((1+nu)*(1-2*nu))
+        return c*np.array([[1-nu, nu, 0],
+                           [nu, 1-nu, 0],
+                           [0, 0, (1-2*nu)/2]])
+
+    def update_stress_2D_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated plane strain stress of the particles of the material
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress (xx, yy, xy), shape (n, 3)
+        dstrain: numpy.ndarray
+            particles strain increment (xx, yy, engineering xy), shape (n, 3)
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        return stress+dstrain@self.elastic_matrix_2D().T
+
+    def wave_speed(self,density):
+        
+        """
+        Returns the elastic wave speed
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.sqrt(self.E/density)
+
+    def wave_speed_2D(self,density):
+        
+        """
+        Returns the plane strain compressional wave speed
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.sqrt(self.elastic_matrix_2D()[0,0]/density)
+
 class newtonian_fluid:
     """ 
     Represents a Newtonian fluid material
@@ -65,3 +171,288 @@ class newtonian_fluid:
         """
         
         particle.stress=self.mu*particle.dstrain/dt
+
+    def new_state(self,n):
+        
+        """
+        Returns the initial state variables of n particles, a Newtonian
+        fluid has none
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+
+        return {}
+
+    def update_stress_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated stress of the particles of the material
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress
+        dstrain: numpy.ndarray
+            particles strain increment
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        return self.mu*dstrain/dt
+
+    def update_stress_2D_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated viscous stress 2*mu*strain_rate of the particles
+        of the material
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress (xx, yy, xy), shape (n, 3)
+        dstrain: numpy.ndarray
+            particles strain increment (xx, yy, engineering xy), shape (n, 3)
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        return self.mu*dstrain*np.array([2,2,1])/dt
+
+    def wave_speed(self,density):
+        
+        """
+        Returns the wave speed, a Newtonian fluid has no elastic waves
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.zeros_like(density)
+
+    def wave_speed_2D(self,density):
+        
+        """
+        Returns the wave speed in 2D, a Newtonian fluid has no elastic waves
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.zeros_like(density)
+
+class elastoplastic:
+    """ 
+    Represents an elasto-plastic material with linear isotropic hardening
+
+    The stress is updated with a return mapping, the yield stress grows
+    with the equivalent plastic strain as sigma_y+H*alpha.
+
+    Arguments
+    ---------
+    E : float
+        Young's modulus
+    sigma_y : float
+        initial yield stress
+    H : float
+        hardening modulus
+    density : float
+        density
+    """
+    def __init__(self,E,sigma_y,H,density):
+        
+        self.E=E # Young's modulus
+        self.sigma_y=sigma_y # initial yield stress
+        self.H=H # hardening modulus
+        self.density=density # density
+
+    def update_stress(self,particle,dt):
+        
+        """
+        Update particle stress using the elasto-plastic constitutive model
+
+        Arguments
+        ---------
+        particle: particle
+            a particle object
+        """
+        
+        particle.stress=self.update_stress_array(np.array([particle.stress]),np.array([particle.dstrain]),
+                                                 np.array([particle.density]),dt,particle.state)[0]
+
+    def new_state(self,n):
+        
+        """
+        Returns the initial state variables of n particles: the equivalent
+        plastic strain alpha and the plastic strain
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+
+        return {'alpha': np.zeros(n), 'plastic_strain': np.zeros(n)}
+
+    def update_stress_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated stress of the particles of the material, the
+        state variables are updated in place
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress
+        dstrain: numpy.ndarray
+            particles strain increment
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        alpha = state['alpha']
+
+        # elastic trial stress and yield function
+        trial = stress+self.E*dstrain
+        f = np.abs(trial)-(self.sigma_y+self.H*alpha)
+
+        # plastic multiplier, zero in elastic particles
+        dgamma = np.maximum(f,0)/(self.E+self.H)
+        direction = np.sign(trial)
+
+        alpha += dgamma
+        state['plastic_strain'] += dgamma*direction
+
+        return trial-self.E*dgamma*direction
+
+    def wave_speed(self,density):
+        
+        """
+        Returns the elastic wave speed
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.sqrt(self.E/density)
+
+class maxwell_viscoelastic:
+    """ 
+    Represents a viscoelastic material, a Maxwell branch (spring E and
+    dashpot eta) in parallel with an equilibrium spring E_inf
+
+    The branch stress q is integrated exactly over each time step
+    assuming a constant strain rate, with relaxation time tau=eta/E.
+
+    Arguments
+    ---------
+    E : float
+        Maxwell branch Young's modulus
+    eta : float
+        Maxwell branch viscosity
+    density : float
+        density
+    E_inf : float
+        equilibrium Young's modulus, 0 for a pure Maxwell fluid
+    """
+    def __init__(self,E,eta,density,E_inf=0):
+        
+        self.E=E # Maxwell branch Young's modulus
+        self.eta=eta # Maxwell branch viscosity
+        self.density=density # density
+        self.E_inf=E_inf # equilibrium Young's modulus
+
+    def update_stress(self,particle,dt):
+        
+        """
+        Update particle stress using the viscoelastic constitutive model
+
+        Arguments
+        ---------
+        particle: particle
+            a particle object
+        """
+        
+        particle.stress=self.update_stress_array(np.array([particle.stress]),np.array([particle.dstrain]),
+                                                 np.array([particle.density]),dt,particle.state)[0]
+
+    def new_state(self,n):
+        
+        """
+        Returns the initial state variables of n particles: the Maxwell
+        branch stress q
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+
+        return {'q': np.zeros(n)}
+
+    def update_stress_array(self,stress,dstrain,density,dt,state):
+        
+        """
+        Returns the updated stress of the particles of the material, the
+        state variables are updated in place
+
+        Arguments
+        ---------
+        stress: numpy.ndarray
+            particles stress
+        dstrain: numpy.ndarray
+            particles strain increment
+        density: numpy.ndarray
+            particles density
+        dt: float
+            time step
+        state: dict
+            particles state variables
+        """
+
+        q = state['q']
+        q_old = q.copy()
+
+        # exact branch stress for a constant strain rate during dt
+        if dt>0:
+            tau = self.eta/self.E
+            relaxed = -np.expm1(-dt/tau)
+            q *= 1-relaxed
+            q += self.E*dstrain*relaxed*tau/dt
+        else:
+            q += self.E*dstrain
+
+        return stress+self.E_inf*dstrain+(q-q_old)
+
+    def wave_speed(self,density):
+        
+        """
+        Returns the elastic wave speed of the instantaneous stiffness E_inf+E
+
+        Arguments
+        ---------
+        density: float or numpy.ndarray
+            current density
+        """
+
+        return np.sqrt((self.E_inf+self.E)/density)
@@ -4,10 +4,23 @@ This module defines classes representing a finite element mesh
 
 """
 
+import numpy as np
+
 import element
 import node
 import particle
 
+def uniform_lengths(element_length):
+    """
+    Returns True if all elements have the same length up to round-off
+
+    Arguments
+    ---------
+    element_length: numpy.ndarray
+        length of each element
+    """
+    return bool(np.allclose(element_length,element_length[0],rtol=1e-12,atol=0))
+
 class mesh_1D: 
     """
     A class to represent a 1D Eulerian mesh containing elements,
@@ -16,13 +29,40 @@ class mesh_1D:
     Attributes
     ----------
     elements : list
-        elements forming the mesh
+        elements forming the mesh (created on first access)
         
     particles : list
-        particles in mesh
+        particles in mesh (created on first access)
         
     nodes : list
-        nodes in mesh
+        nodes in mesh (created on first access)
+
+    store : particle_store
+        array storage of the particles state
+
+    grid : node_store
+        array storage of the nodal state
+
+    connectivity : numpy.ndarray
+        node indices (n1, n2) of each element, shape (nelem, 2)
+
+    element_length : numpy.ndarray
+        length of each element
+
+    uniform : bool
+        True if all elements have the same length, the particles are then
+        located from their position instead of a search over the nodes.
+        It is set from element_length, call update_geometry after changing
+        the nodal positions
+
+    active_elements : numpy.ndarray
+        indices of the elements containing particles
+
+    active_nodes : numpy.ndarray
+        indices of the nodes of the active elements
+
+    boundary : boundary_arrays
+        boundary conditions compiled for the mesh nodes (see boundary.mesh_boundary)
         
     nelem : int
         number of elements in mesh
@@ -33,43 +73,144 @@ class mesh_1D:
     
     def __init__(self,L,nelem):
         
-        self.elements=[]    # mesh elements
-        self.particles=[]   # particles in mesh
-        self.nodes=[]       # nodes in mesh
+        self.store=particle.particle_store() # particles state arrays
+        self.grid=node.node_store(nelem+1)   # nodal state arrays
         self.nelem=nelem    # elements in mesh
         self.ppelem=0       # particles per element
+
+        # element, node and particle objects are created on first access
+        self._elements=None
+        self._nodes=None
+        self._particles=[]
+
+        # nodal positions
+        le = L/nelem
+        self.grid.x[:nelem]=np.arange(nelem)*le
+        self.grid.x[nelem]=(nelem-1)*le+le
+
+        # element connectivity and lengths
+        self.connectivity=np.column_stack((np.arange(nelem),np.arange(1,nelem+1))).astype(np.int64)
+        self.element_length=np.full(nelem,le)
+        self.uniform=uniform_lengths(self.element_length)
+
+        # all elements and nodes are active until particles are located
+        self.active_elements=np.arange(nelem)
+        self.active_nodes=np.arange(self.grid.n)
+
+        # boundary conditions are compiled by the solver
+        self.boundary=None
+
+    def update_geometry(self):
+        """
+        Update the element lengths and the uniform flag from the nodal
+        positions, after grid.x is changed
+        """
+        x = self.grid.x
+        self.element_length = x[self.connectivity[:,1]]-x[self.connectivity[:,0]]
+        self.uniform = uniform_lengths(self.element_length)
+        if self._elements is not None:
+            for ielem in self._elements:
+                ielem.L = self.element_length[ielem.id]
+
+    @property
+    def nodes(self):
+        """
+        nodes in mesh, created on first access
+        """
+        if self._nodes is None:
+            self._build_objects()
+        return self._nodes
+
+    @property
+    def elements(self):
+        """
+        elements forming the mesh, created on first access
+        """
+        if self._elements is None:
+            self._build_objects()
+        return self._elements
+
+    @property
+    def particles(self):
+        """
+        particles in mesh, created on first access
+        """
+        if self._elements is None:
+            self._build_objects()
+        if len(self._particles)<self.store.n:
+            self._particles.extend(particle.material_point.view(self.store,i)
+                                   for i in range(len(self._particles),self.store.n))
+        return self._particles
+
+    def _build_objects(self):
+        """
+        Creates the node and element objects from the mesh arrays
+        """
+        self._nodes=[]
+        for i in range(self.grid.n):
+            inode = node.node_1D(self.grid,i)
+            inode.id=i
+            self._nodes.append(inode)
+
+        self._elements=[]
+        for i in range(self.nelem):
+            ielem = element.bar_1D()
+            ielem.id=i
+            ielem.n1=self._nodes[self.connectivity[i,0]]
+            ielem.n2=self._nodes[self.connectivity[i,1]]
+            ielem.L=self.element_length[i]
+            self._elements.append(ielem)
+
+        # elements referenced by the particles in store
+        self.store.elements=self._elements
+
+        # particles in each element
+        for ip in self.particles:
+            if ip.element is not None:
+                ip.element.particles.append(ip)
+
+    def _put_particles(self,ppelem,material,elements):
+        """
+        Distributes particles in a set of elements
         
-        for i in range(nelem):
-            
-            if i==0: 
-                
-                ielem = element.bar_1D()
-                ielem.id=i 
-                
-                ielem.n1=node.node_1D()
-                ielem.n1.id=len(self.nodes)
-                self.nodes.append(ielem.n1)
-                
-                ielem.n2=node.node_1D()
-                ielem.n2.id=len(self.nodes)
-                self.nodes.append(ielem.n2)
-                
-            else:
-                ielem = element.bar_1D()
-                ielem.id=i
-                ielem.n1=self.elements[i-1].n2
-                
-                ielem.n2=node.node_1D()
-                ielem.n2.id=len(self.nodes)
-                self.nodes.append(ielem.n2)
-            
-            le = L/nelem
-            ielem.L=le
-            ielem.n1.x=i*le
-            ielem.n2.x=ielem.n1.x+le
-            
-            self.elements.append(ielem)
-            
+        Arguments
+        ---------
+        ppelem: int
+            number of particles per element
+
+        material: material
+            a material object
+
+        elements: numpy.ndarray
+            indices of the elements to distribute particles
+        """
+        self.ppelem=ppelem
+
+        # element of each new particle and its position in the element
+        ie = np.repeat(elements,ppelem)
+        k = np.tile(np.arange(ppelem),len(elements))
+
+        le = self.element_length[ie]
+        x1 = self.grid.x[self.connectivity[ie,0]]
+        x2 = self.grid.x[self.connectivity[ie,1]]
+
+        # particle position
+        xp = np.where(k==0, x1+le/(2*ppelem),
+             np.where(k==ppelem-1, x2-le/(2*ppelem),
+                      x1+le/(2*ppelem)+k*(le/ppelem)))
+
+        # particle mass and size
+        pmass = le*material.density/ppelem
+        size = le/ppelem
+
+        first = self.store.n
+        self.store.add_many(pmass,material,xp,size,ie)
+
+        # keep the element lists if the objects already exist
+        if self._elements is not None:
+            for ip in self.particles[first:]:
+                ip.element.particles.append(ip)
+
     def put_particles_in_all_mesh_elements(self,ppelem,material):
         """
         Distributes particles in elements mesh
@@ -83,41 +224,7 @@ class mesh_1D:
             a material object
 
         """
-        self.ppelem=ppelem
-            
-        for ie in range(self.nelem):
-            
-            ie = self.elements[ie]
-            le = ie.L
-         
-            for i in range(ppelem):
-                
-                # particle mass
-                pmass = le*material.density/ppelem
-                
-                # particle position
-                if(len(ie.particles)==0):
-                    xp=ie.n1.x+le/(2*ppelem)
-                    
-                elif(len(ie.particles)==(ppelem-1)):
-                    xp=ie.n2.x-le/(2*ppelem)   
-                
-                else:
-                    xp=ie.n1.x+le/(2*ppelem)+len(ie.particles)*(le/ppelem)
-                    
-                # create particle
-                ip = particle.material_point(pmass,material,xp)
-                ip.id=len(self.particles)
-                ip.size = ie.L/ppelem
-                
-                # set the element in the particle
-                ip.element=ie
-
-                # append in elements
-                ie.particles.append(ip)                
-                                
-                # append in mesh
-                self.particles.append(ip)
+        self._put_particles(ppelem,material,np.arange(self.nelem))
         
     def put_particles_in_mesh_by_elements_id(self,ppelem,material,elem_i,elem_f):
         """
@@ -138,44 +245,26 @@ class mesh_1D:
             final element id to distribute particles
 
         """
-        self.ppelem=ppelem
+        elements = np.arange(self.nelem)
+        self._put_particles(ppelem,material,elements[(elements>=elem_i) & (elements<=elem_f)])
 
-        for ie in range(self.nelem):
-            
-            ie = self.elements[ie]
-            le = ie.L
-            
-            # verify if the element is allow to get particles
-            if ie.id<elem_i or ie.id>elem_f:
-                continue 
+    def update_active_set(self):
+        """
+        Update the active elements (containing particles) and active nodes
+        (nodes of the active elements) from the particles element index
+        """
+        element = self.store.element
+        counts = np.bincount(element[element>=0],minlength=self.nelem)
+        self.active_elements = np.flatnonzero(counts)
+        active = np.zeros(self.grid.n,dtype=bool)
+        active[self.connectivity[self.active_elements]] = True
+        self.active_nodes = np.flatnonzero(active)
 
-            for i in range(ppelem):
-                
-                # particle mass
-                pmass = le*material.density/ppelem
-                
-                # particle position
-                if(len(ie.particles)==0):
-                    xp=ie.n1.x+le/(2*ppelem)
-                    
-                elif(len(ie.particles)==(ppelem-1)):
-                    xp=ie.n2.x-le/(2*ppelem)   
-                
-                else:
-                    xp=ie.n1.x+le/(2*ppelem)+len(ie.particles)*(le/ppelem)
-                    
-                # create particle
-                ip = particle.material_point(pmass,material,xp)
-                ip.id=len(self.particles)
-                
-                # set the element in the particle
-                ip.element=ie
-
-                # append in elements
-                ie.particles.append(ip)                
-                                
-                # append in mesh
-                self.particles.append(ip)
+    def get_active_nodes(self):
+        """
+        Returns the list of active node objects
+        """
+        return [self.nodes[i] for i in self.active_nodes]
 
     def print_mesh(self,print_labels=True):
         """
@@ -0,0 +1,225 @@
+r"""
+
+This module defines a monitor of the energy and momentum balance of a simulation
+
+The work of the stresses, of the external forces (nodal external forces,
+tractions and the reactions of the constrained nodes) and of the damping
+forces is accumulated in every time step with a few reductions over the
+particle and nodal arrays. Every *every* steps the monitor computes the
+kinetic energy and the momentum of the particles and the energy drift
+
+.. math::
+	\frac{K+W_{int}-K_0-W_{ext}-W_{damp}}{E_{ref}}
+
+where $$K$$ is the kinetic energy, $$W_{int}$$ the strain energy (work
+of the stresses on the strain increments), $$W_{ext}$$ and $$W_{damp}$$
+the external and damping work since the start, and $$E_{ref}$$ the
+largest of the initial energy, the current energy and the absolute
+external and damping work. A stable run keeps the drift at the order of
+the time integration error, unstable time steps or meshes make it grow
+quickly. The momentum of the particles changes by the impulse of the
+external, reaction and damping forces.
+
+"""
+import numpy as np
+
+# monitored values, in order
+FIELDS = ('kinetic_energy','strain_energy','external_work','damping_work',
+          'momentum','impulse','energy_drift')
+
+class conservation_monitor:
+    """
+    Monitors the energy and momentum balance of a simulation
+
+    Attributes
+    ----------
+    every : int
+        evaluate the balance one of every *every* time steps
+
+    tolerance : float
+        largest absolute energy drift, None to never stop the simulation
+
+    values : dict
+        last evaluated values of FIELDS, the work and impulse are
+        accumulated since the start
+
+    times : list
+        time of each evaluation
+
+    nevaluations : int
+        number of evaluations
+    """
+
+    def __init__(self,every=1,tolerance=None):
+
+        self.every = max(int(every),1)
+        self.tolerance = tolerance
+        self.values = {name: 0.0 for name in FIELDS}
+        self.times = []
+        self.nevaluations = 0
+
+        self._history = {name: [] for name in FIELDS}
+        self._stress = np.zeros(0)
+        self._kinetic_start = 0.0
+        self._work = 0.0
+        self._external = 0.0
+        self._damping = 0.0
+        self._impulse = 0.0
+
+    def start(self,msh,state=None):
+        """
+        Takes the current state as the reference of the balance
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        state: dict
+            monitor state to resume from, as returned by get_state, None
+            to take the current state as the reference
+        """
+        if state is not None:
+            self._resume(state)
+            return
+
+        ps = msh.store
+        self._stress = ps.stress.copy()
+        self._kinetic_start = 0.5*np.dot(ps.mass,ps.velocity**2)
+        self._work = 0.0
+        self._external = 0.0
+        self._damping = 0.0
+        self._impulse = 0.0
+        self.values = {name: 0.0 for name in FIELDS}
+        self.times = []
+        self._history = {name: [] for name in FIELDS}
+        self.nevaluations = 0
+
+    def get_state(self):
+        """
+        Returns the accumulated work, impulse and history of the monitor,
+        to resume it from a checkpoint
+
+        Returns
+        -------
+        state: dict
+            arrays and numbers of the monitor state
+        """
+        state = {'stress': self._stress.copy(),
+                 'kinetic_start': np.float64(self._kinetic_start),
+                 'work': np.float64(self._work),
+                 'external': np.float64(self._external),
+                 'damping': np.float64(self._damping),
+                 'impulse': np.float64(self._impulse),
+                 'values': np.array([self.values[name] for name in FIELDS]),
+                 'times': np.array(self.times,dtype=np.float64)}
+        for name in FIELDS:
+            state['history_'+name] = np.array(self._history[name],dtype=np.float64)
+        return state
+
+    def _resume(self,state):
+        """
+        Restores a saved monitor state
+        """
+        self._stress = np.array(state['stress'],dtype=np.float64)
+        self._kinetic_start = float(state['kinetic_start'])
+        self._work = float(state['work'])
+        self._external = float(state['external'])
+        self._damping = float(state['damping'])
+        self._impulse = float(state['impulse'])
+        self.values = {name: float(value) for name, value in zip(FIELDS,state['values'])}
+        self.times = [float(t) for t in state['times']]
+        self._history = {name: [float(value) for value in state['history_'+name]] for name in FIELDS}
+        self.nevaluations = len(self.times)
+
+    def update(self,msh,it,step,dt,dt_velocity=None):
+        """
+        Accumulates the work of a time step and evaluates the balance if
+        the step is an evaluation step
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object, after the time step
+        it: float
+            current time
+        step: int
+            time step number, starting at 0
+        dt: float
+            time step
+        dt_velocity: float
+            time step of the momentum and velocity update, dt by default
+
+        Returns
+        -------
+        conserved: bool
+            False if the energy drift exceeds the tolerance
+        """
+        ps = msh.store
+        grid = msh.grid
+
+        # strain energy increment, stresses averaged over the step
+        stress = self._stress
+        stress += ps.stress
+        stress *= ps.dstrain
+        self._work += 0.5*np.dot(ps.mass/ps.density,stress)
+        stress[:] = ps.stress
+
+        # total force minus internal, external and damping forces in the
+        # constrained nodes with mass (reactions of the boundary conditions)
+        nodes = msh.boundary.constrained_nodes if msh.boundary is not None else np.zeros(0,dtype=np.int64)
+        reaction = grid.f_tot[nodes]-grid.f_int[nodes]-grid.f_ext[nodes]-grid.f_damp[nodes]
+        reaction[grid.mass[nodes]==0] = 0
+
+        # work of the external and damping forces, the nodes without
+        # particles have zero velocity, forces and total force
+        self._external += dt*(np.dot(grid.f_ext,grid.velocity)+np.dot(reaction,grid.velocity[nodes]))
+        self._damping += dt*np.dot(grid.f_damp,grid.velocity)
+
+        # impulse of the external, reaction and damping forces (the internal
+        # forces add to zero) over the momentum update of the step
+        if dt_velocity is None:
+            dt_velocity = dt
+        self._impulse += dt_velocity*(grid.f_tot.sum()-grid.f_int.sum())
+
+        if step%self.every!=0:
+            return True
+
+        kinetic = 0.5*np.dot(ps.mass,ps.velocity**2)
+        energy = kinetic+self._work
+        reference = max(self._kinetic_start,abs(energy),abs(self._external)+abs(self._damping))
+        drift = energy-self._kinetic_start-self._external-self._damping
+        drift = drift/reference if reference>0 else 0.0
+
+        self.values = {'kinetic_energy': float(kinetic),
+                       'strain_energy': float(self._work),
+                       'external_work': float(self._external),
+                       'damping_work': float(self._damping),
+                       'momentum': float(np.dot(ps.mass,ps.velocity)),
+                       'impulse': float(self._impulse),
+                       'energy_drift': float(drift)}
+        self.times.append(it)
+        for name in FIELDS:
+            self._history[name].append(self.values[name])
+        self.nevaluations += 1
+
+        return self.tolerance is None or abs(drift)<=self.tolerance
+
+    def history(self,name):
+        """
+        Returns the evaluated values of a monitored field
+
+        Arguments
+        ---------
+        name: string
+            'time' or one of FIELDS
+
+        Returns
+        -------
+        values: numpy.ndarray
+            one value per evaluation
+        """
+        if name=='time':
+            return np.array(self.times)
+        if name not in self._history:
+            raise KeyError("'%s' is not monitored"%name)
+        return np.array(self._history[name])
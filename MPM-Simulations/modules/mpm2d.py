@@ -0,0 +1,756 @@
+r"""
+
+This module solves the motion equation with the MPM in two dimensions
+
+.. math::
+	\frac{\partial \sigma_{ij}}{\partial x_j} + \rho b_i = \rho \ddot{u}_i
+
+The mesh is a structured grid of rectangular cells, the node (i, j) of
+the grid has the index i+j*(nx+1) and the cell (i, j) the index i+j*nx.
+Particles and nodes are stored as arrays from the start: vectors have
+shape (n, 2) and stresses and strain increments shape (n, 3) in Voigt
+notation (xx, yy, xy), with the engineering shear strain. The problem is
+solved in plane strain with unit thickness.
+
+The interpolation functions are the tensor products of the 1D functions
+of shape.py: 'linear' (bilinear, 4 nodes per particle) and 'cpGIMP'
+(GIMP, 9 nodes per particle). They are stored as fixed width tables like
+the 1D numpy engine.
+
+"""
+import numpy as np
+
+import shape
+
+class particle_store_2D:
+    """
+    Represent the state of a set of 2D material points as contiguous arrays
+
+    Attributes
+    ----------
+
+    n : int
+        number of particles in store
+
+    mass, density : numpy.ndarray
+        particle mass and density, shape (n,)
+
+    position, velocity, f_ext, size : numpy.ndarray
+        particle position, velocity, external force and size, shape (n, 2)
+
+    stress, dstrain : numpy.ndarray
+        particle stress and strain increment (xx, yy, xy), shape (n, 3)
+
+    element : numpy.ndarray
+        index of the cell containing the particle, -1 if it has none
+
+    material_id : numpy.ndarray
+        index of the particle material in the materials list
+
+    materials : list
+        distinct materials referenced by the particles
+
+    state : list
+        state variables of each material, a dictionary of arrays with one
+        entry per particle of the material, in particle order
+
+    support : numpy.ndarray
+        indices of the nodes reached by each particle, shape (n, k)
+
+    N, dNdx, dNdy : numpy.ndarray
+        interpolation function values and gradients of the support nodes,
+        shape (n, k)
+    """
+
+    # floating point fields stored per particle and their shape per particle
+    fields = {'mass': (), 'density': (), 'position': (2,), 'velocity': (2,),
+              'f_ext': (2,), 'size': (2,), 'stress': (3,), 'dstrain': (3,)}
+
+    def __init__(self,capacity=16):
+
+        self.n = 0
+        self.materials = []
+        self.state = []
+
+        self._capacity = max(int(capacity),1)
+        self._buffers = {}
+        for name, shape_p in self.fields.items():
+            self._buffers[name] = np.zeros((self._capacity,)+shape_p)
+        self._buffers['element'] = np.full(self._capacity,-1,dtype=np.int64)
+        self._buffers['material_id'] = np.zeros(self._capacity,dtype=np.int64)
+
+        # interpolation tables, computed with the interpolation functions
+        self.support = np.zeros((0,4),dtype=np.int64)
+        self.N = np.zeros((0,4))
+        self.dNdx = np.zeros((0,4))
+        self.dNdy = np.zeros((0,4))
+
+        self._set_size(0)
+
+    def _set_size(self,n):
+        """
+        Set the number of particles and refresh the public array views
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+        self.n = n
+        for name, buf in self._buffers.items():
+            setattr(self, name, buf[:n])
+
+    def _reserve(self,capacity):
+        """
+        Grow the internal buffers to hold at least capacity particles
+
+        Arguments
+        ---------
+        capacity: int
+            required number of particles
+        """
+        if capacity<=self._capacity:
+            return
+
+        new_capacity = max(capacity,2*self._capacity)
+        for name, buf in self._buffers.items():
+            new_buf = np.zeros((new_capacity,)+buf.shape[1:],dtype=buf.dtype)
+            if name=='element':
+                new_buf[:] = -1
+            new_buf[:self.n] = buf[:self.n]
+            self._buffers[name] = new_buf
+        self._capacity = new_capacity
+
+    def material_index(self,material):
+        """
+        Returns the index of a material in the materials list, registering it if needed
+
+        Arguments
+        ---------
+        material: material
+            a material object with update_stress_2D_array
+        """
+        for i, imat in enumerate(self.materials):
+            if imat is material:
+                return i
+
+        if not hasattr(material,'update_stress_2D_array'):
+            raise ValueError("material %s has no 2D stress update"%type(material).__name__)
+
+        self.materials.append(material)
+        self.state.append(material.new_state(0))
+        return len(self.materials)-1
+
+    def add_many(self,mass,material,x,size):
+        """
+        Add particles of one material to the store
+
+        Arguments
+        ---------
+        mass: numpy.ndarray
+            particles mass
+
+        material: material
+            a material object
+
+        x: numpy.ndarray
+            particles position, shape (n, 2)
+
+        size: numpy.ndarray
+            particles size, shape (n, 2)
+        """
+        first = self.n
+        last = first+len(x)
+        self._reserve(last)
+
+        for name in self.fields:
+            self._buffers[name][first:last] = 0
+        self._buffers['mass'][first:last] = mass
+        self._buffers['position'][first:last] = x
+        self._buffers['size'][first:last] = size
+        self._buffers['density'][first:last] = material.density
+        self._buffers['element'][first:last] = -1
+        imat = self.material_index(material)
+        self._buffers['material_id'][first:last] = imat
+
+        self._set_size(last)
+
+        state = self.state[imat]
+        for name, values in material.new_state(last-first).items():
+            state[name] = np.concatenate((state[name],values))
+
+    def material_groups(self):
+        """
+        Returns the particles of each material
+
+        Returns
+        -------
+        groups: list
+            (material index, particle indices) pairs, the indices are a
+            slice when all particles share one material
+        """
+        if len(self.materials)==1:
+            return [(0,slice(0,self.n))]
+        return [(imat,np.flatnonzero(self.material_id==imat)) for imat in range(len(self.materials))]
+
+class mesh_2D:
+    """
+    A class to represent a 2D structured Eulerian mesh of rectangular cells
+
+    Attributes
+    ----------
+    nx, ny : int
+        number of cells in x and y
+
+    hx, hy : float
+        cell size in x and y
+
+    xs, ys : numpy.ndarray
+        grid line coordinates in x and y
+
+    x : numpy.ndarray
+        nodal positions, shape (nnodes, 2)
+
+    connectivity : numpy.ndarray
+        node indices of each cell, counterclockwise from the lower left
+        node, shape (nelem, 4)
+
+    mass : numpy.ndarray
+        nodal mass, shape (nnodes,)
+
+    momentum, velocity, f_int, f_ext, f_damp, f_tot : numpy.ndarray
+        nodal vectors, shape (nnodes, 2)
+
+    fixed : numpy.ndarray
+        True for the fixed directions of each node, shape (nnodes, 2)
+
+    store : particle_store_2D
+        array storage of the particles state
+    """
+
+    def __init__(self,Lx,Ly,nx,ny):
+
+        self.nx = nx
+        self.ny = ny
+        self.nelem = nx*ny
+        self.nnodes = (nx+1)*(ny+1)
+        self.hx = Lx/nx
+        self.hy = Ly/ny
+
+        # grid lines and nodal positions
+        self.xs = np.arange(nx+1)*self.hx
+        self.ys = np.arange(ny+1)*self.hy
+        self.x = np.column_stack((np.tile(self.xs,ny+1),np.repeat(self.ys,nx+1)))
+
+        # cell connectivity
+        i, j = np.meshgrid(np.arange(nx),np.arange(ny))
+        first = (i+j*(nx+1)).ravel()
+        self.connectivity = np.column_stack((first,first+1,first+nx+2,first+nx+1)).astype(np.int64)
+
+        # nodal state
+        self.mass = np.zeros(self.nnodes)
+        for name in ('momentum','velocity','f_int','f_ext','f_damp','f_tot'):
+            setattr(self, name, np.zeros((self.nnodes,2)))
+        self.fixed = np.zeros((self.nnodes,2),dtype=bool)
+
+        self.store = particle_store_2D()
+
+    def boundary_nodes(self,side):
+        """
+        Returns the indices of the nodes of one side of the mesh
+
+        Arguments
+        ---------
+        side: string
+            'left', 'right', 'bottom' or 'top'
+        """
+        i = np.arange(self.nnodes)%(self.nx+1)
+        j = np.arange(self.nnodes)//(self.nx+1)
+
+        if side=='left':
+            return np.flatnonzero(i==0)
+        if side=='right':
+            return np.flatnonzero(i==self.nx)
+        if side=='bottom':
+            return np.flatnonzero(j==0)
+        if side=='top':
+            return np.flatnonzero(j==self.ny)
+
+        raise ValueError("unknown side '%s'"%side)
+
+    def fix_nodes(self,nodes,directions=(0,1)):
+        """
+        Fix the motion of nodes
+
+        Arguments
+        ---------
+        nodes: numpy.ndarray
+            node indices
+        directions: tuple
+            fixed directions, 0 for x and 1 for y
+        """
+        self.fixed[np.ix_(np.asarray(nodes),np.asarray(directions))] = True
+
+    def put_particles_in_mesh_by_elements_id(self,ppelem,material,elements):
+        """
+        Distributes particles in cells of the mesh
+
+        Arguments
+        ---------
+        ppelem: int
+            number of particles per cell in each direction
+
+        material: material
+            a material object
+
+        elements: numpy.ndarray
+            cell indices
+        """
+        elements = np.asarray(elements,dtype=np.int64)
+
+        # particle positions in the reference cell, ppelem x ppelem regular points
+        offset = (np.arange(ppelem)+0.5)/ppelem
+        ox, oy = np.meshgrid(offset,offset)
+
+        ex = (elements%self.nx)[:,None]
+        ey = (elements//self.nx)[:,None]
+        x = np.column_stack((((ex+ox.ravel())*self.hx).ravel(),((ey+oy.ravel())*self.hy).ravel()))
+
+        n = len(x)
+        mass = np.full(n,material.density*self.hx*self.hy/ppelem**2)
+        size = np.tile([self.hx/ppelem,self.hy/ppelem],(n,1))
+        self.store.add_many(mass,material,x,size)
+
+    def put_particles_in_all_mesh_elements(self,ppelem,material):
+        """
+        Distributes particles in all cells of the mesh
+
+        Arguments
+        ---------
+        ppelem: int
+            number of particles per cell in each direction
+
+        material: material
+            a material object
+        """
+        self.put_particles_in_mesh_by_elements_id(ppelem,material,np.arange(self.nelem))
+
+    def print_mesh_info(self):
+        """
+        Print the mesh information
+        """
+        print("cells: %d x %d, nodes: %d, particles: %d"%(self.nx,self.ny,self.nnodes,self.store.n))
+
+def locate_particles(msh):
+    """
+    Update the cell index of every particle, -1 for particles outside the mesh
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+
+    Returns
+    -------
+    lost: numpy.ndarray
+        ids of the particles outside the mesh
+    """
+    ps = msh.store
+    cells = []
+    outside = np.zeros(ps.n,dtype=bool)
+
+    for axis, (lines, h, n) in enumerate(((msh.xs,msh.hx,msh.nx),(msh.ys,msh.hy,msh.ny))):
+        xp = ps.position[:,axis]
+        out = ~((xp>=lines[0]) & (xp<lines[-1]))
+        xp = np.where(out,lines[0],xp)
+
+        # cell index from position with round-off correction
+        ic = np.floor((xp-lines[0])/h).astype(np.int64)
+        np.clip(ic,0,n-1,out=ic)
+        ic -= xp<lines[ic]
+        ic += xp>=lines[ic+1]
+
+        cells.append(ic)
+        outside |= out
+
+    ps.element[:] = np.where(outside,-1,cells[0]+cells[1]*msh.nx)
+    return np.flatnonzero(outside)
+
+def interpolation_functions_values(msh,interpolation_type):
+    """
+    Update the interpolation function tables of every particle
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    interpolation_type: string
+        'linear' (bilinear) or 'cpGIMP'
+    """
+    ps = msh.store
+    inside = ps.element>=0
+    ie = np.where(inside,ps.element,0)
+    cell = (ie%msh.nx,ie//msh.nx)
+
+    tables = []
+    for axis, (lines, h) in enumerate(((msh.xs,msh.hx),(msh.ys,msh.hy))):
+        xp = np.where(inside,ps.position[:,axis],lines[0])[:,None]
+
+        if interpolation_type=='linear':
+            nodes = cell[axis][:,None]+np.arange(2)
+            N = shape.NiLinear_array(xp,lines[nodes],h)
+            dN = shape.dNiLinear_array(xp,lines[nodes],h)
+
+        elif interpolation_type=='cpGIMP':
+
+            # nodes around the nearest node, the functions of nodes
+            # beyond the grid are zero
+            nearest = np.rint((xp[:,0]-lines[0])/h).astype(np.int64)
+            nodes = nearest[:,None]+np.arange(-1,2)
+            valid = (nodes>=0) & (nodes<len(lines))
+            np.clip(nodes,0,len(lines)-1,out=nodes)
+            lp = ps.size[:,axis][:,None]/2
+            N = shape.NicpGIMP_array(h,lp,xp,lines[nodes])*valid
+            dN = shape.dNicpGIMP_array(h,lp,xp,lines[nodes])*valid
+
+        else:
+            raise ValueError("unknown interpolation type '%s'"%interpolation_type)
+
+        # particles outside the mesh do not interact with the nodes
+        N[~inside] = 0
+        dN[~inside] = 0
+        tables.append((nodes,N,dN))
+
+    # tensor product of the x and y functions
+    (ix,Nx,dNx), (iy,Ny,dNy) = tables
+    n = ps.n
+    ps.support = (ix[:,:,None]+iy[:,None,:]*(msh.nx+1)).reshape(n,-1)
+    ps.N = (Nx[:,:,None]*Ny[:,None,:]).reshape(n,-1)
+    ps.dNdx = (dNx[:,:,None]*Ny[:,None,:]).reshape(n,-1)
+    ps.dNdy = (Nx[:,:,None]*dNy[:,None,:]).reshape(n,-1)
+
+def reset_nodal_values(msh):
+    """
+    Reset the nodal values for the next step calculation
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    """
+    for name in ('mass','momentum','velocity','f_int','f_ext','f_tot'):
+        getattr(msh,name)[:] = 0
+
+# nodal quantities transferred by particles_to_nodes and their components
+P2G_QUANTITIES = {'mass': 1, 'momentum': 2, 'f_int': 2, 'f_ext': 2}
+
+def particles_to_nodes(msh,quantities=tuple(P2G_QUANTITIES)):
+    """
+    Interpolate particle quantities to the nodal arrays
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    quantities: tuple
+        nodal quantities to accumulate, any of 'mass', 'momentum', 'f_int' and 'f_ext'
+    """
+    ps = msh.store
+    N = ps.N
+    dNdx = ps.dNdx
+    dNdy = ps.dNdy
+
+    # particle contributions to the support nodes, one table per component
+    rows = []
+    for name in quantities:
+
+        if name=='mass':
+            rows.append(ps.mass[:,None]*N)
+
+        elif name=='momentum':
+            mv = ps.mass[:,None]*ps.velocity
+            rows += [mv[:,0,None]*N, mv[:,1,None]*N]
+
+        elif name=='f_int':
+            volume_stress = (ps.mass/ps.density)[:,None]*ps.stress
+            sxx = volume_stress[:,0,None]
+            syy = volume_stress[:,1,None]
+            sxy = volume_stress[:,2,None]
+            rows += [-(sxx*dNdx+sxy*dNdy), -(sxy*dNdx+syy*dNdy)]
+
+        elif name=='f_ext':
+            rows += [ps.f_ext[:,0,None]*N, ps.f_ext[:,1,None]*N]
+
+        else:
+            raise ValueError("unknown nodal quantity '%s'"%name)
+
+    # one bincount per component over the support nodes, the components
+    # are scattered separately to keep the bins in cache
+    support = ps.support.ravel()
+    nodal = [np.bincount(support,weights=w.ravel(),minlength=msh.nnodes) for w in rows]
+
+    ic = 0
+    for name in quantities:
+        nodal_values = getattr(msh,name)
+        if P2G_QUANTITIES[name]==1:
+            nodal_values += nodal[ic]
+        else:
+            nodal_values[:,0] += nodal[ic]
+            nodal_values[:,1] += nodal[ic+1]
+        ic += P2G_QUANTITIES[name]
+
+def nodal_velocity(msh):
+    """
+    Calculate nodal velocity in nodes with mass
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    """
+    has_mass = msh.mass!=0
+    msh.velocity[has_mass] = msh.momentum[has_mass]/msh.mass[has_mass,None]
+
+def total_force_in_nodes(msh,msetup):
+    """
+    Calculate the local damping force and the total force in nodes
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    msetup: model_setup
+        a model_setup object
+    """
+    unbalanced = msh.f_int+msh.f_ext
+
+    # damping force opposite to the nodal velocity, kept in nodes at rest
+    alpha = msetup.damping_local_alpha
+    if alpha>0:
+        velocity = np.divide(msh.momentum,msh.mass[:,None],out=np.zeros_like(msh.momentum),
+                             where=msh.mass[:,None]!=0)
+        msh.f_damp[:] = np.where(velocity!=0,-alpha*np.abs(unbalanced)*np.sign(velocity),msh.f_damp)
+
+    msh.f_tot[:] = unbalanced+msh.f_damp
+
+def nodes_to_particles(msh,dt_velocity,dt_position):
+    """
+    Update particle velocity and position from the nodal arrays
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    dt_velocity: float
+        time step of the velocity update
+    dt_position: float
+        time step of the position update
+    """
+    ps = msh.store
+
+    # nodal acceleration and velocity, zero in nodes without mass
+    has_mass = (msh.mass!=0)[:,None]
+    mass = msh.mass[:,None]
+    acceleration = np.divide(msh.f_tot,mass,out=np.zeros_like(msh.f_tot),where=has_mass)
+    velocity = np.divide(msh.momentum,mass,out=np.zeros_like(msh.momentum),where=has_mass)
+
+    for c in range(2):
+        ps.velocity[:,c] += np.einsum('pk,pk->p',ps.N,acceleration[:,c][ps.support])*dt_velocity
+        ps.position[:,c] += np.einsum('pk,pk->p',ps.N,velocity[:,c][ps.support])*dt_position
+
+def particle_stress_update(msh,dt):
+    """
+    Nodal velocity, particle strain increment, density and stress
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    dt: float
+        time step
+    """
+    ps = msh.store
+    nodal_velocity(msh)
+
+    # strain increment (xx, yy, engineering xy) from the support nodes velocity
+    vx = msh.velocity[:,0][ps.support]
+    vy = msh.velocity[:,1][ps.support]
+    ps.dstrain[:,0] = np.einsum('pk,pk->p',ps.dNdx,vx)*dt
+    ps.dstrain[:,1] = np.einsum('pk,pk->p',ps.dNdy,vy)*dt
+    ps.dstrain[:,2] = (np.einsum('pk,pk->p',ps.dNdy,vx)+np.einsum('pk,pk->p',ps.dNdx,vy))*dt
+
+    # density from the volumetric strain increment
+    ps.density[:] = ps.density/(1+ps.dstrain[:,0]+ps.dstrain[:,1])
+
+    # stress, one call per material
+    for imat, ids in ps.material_groups():
+        mat = ps.materials[imat]
+        ps.stress[ids] = mat.update_stress_2D_array(ps.stress[ids],ps.dstrain[ids],ps.density[ids],dt,ps.state[imat])
+
+def critical_time_step(msh,msetup):
+    """
+    Calculates the stable time step from the CFL condition with the
+    smallest cell size, bounded by msetup.dt_min and msetup.dt_max
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    msetup: model_setup
+        a model_setup object containing the model options
+    """
+    ps = msh.store
+
+    c = np.zeros(ps.n)
+    for imat, ids in ps.material_groups():
+        c[ids] = ps.materials[imat].wave_speed_2D(ps.density[ids])
+
+    speed = (c+np.linalg.norm(ps.velocity,axis=1))[ps.element>=0]
+    moving = speed>0
+    if not moving.any():
+        return msetup.dt
+
+    dt = msetup.dt_safety_factor*min(msh.hx,msh.hy)/np.max(speed[moving])
+    return float(min(max(dt,msetup.dt_min),msetup.dt_max))
+
+def step(msh,msetup,dt,dt_velocity):
+    """
+    Advance the model one time step
+
+    Arguments
+    ---------
+    msh: mesh_2D
+        a mesh object
+    msetup: model_setup
+        a model_setup object containing the model options
+    dt: float
+        time step
+    dt_velocity: float
+        time step of the momentum and velocity update
+
+    Returns
+    -------
+    lost : numpy.ndarray
+        ids of the particles outside the mesh
+    """
+    fixed = msh.fixed
+
+    # reset all nodal values
+    reset_nodal_values(msh)
+
+    # update the cell of each particle and the interpolation functions
+    lost = locate_particles(msh)
+    interpolation_functions_values(msh,msetup.interpolation_type)
+
+    # Update Stress First Scheme
+    if msetup.integration_scheme=='USF':
+        particles_to_nodes(msh,('mass','momentum'))
+        msh.momentum[fixed] = 0
+        particle_stress_update(msh,dt)
+        particles_to_nodes(msh,('f_int','f_ext'))
+
+    else:
+        particles_to_nodes(msh)
+        msh.momentum[fixed] = 0
+
+    # total nodal force, in fixed directions f=m*a=0
+    total_force_in_nodes(msh,msetup)
+    msh.f_tot[fixed] = 0
+
+    # integrate the grid nodal momentum equation
+    msh.momentum += msh.f_tot*dt_velocity
+
+    # update particle velocity and position
+    nodes_to_particles(msh,dt_velocity,dt)
+
+    # Modified Update Stress Last Scheme
+    if msetup.integration_scheme=='MUSL':
+        msh.momentum[:] = 0
+        particles_to_nodes(msh,('momentum',))
+        msh.velocity[fixed] = 0
+        msh.momentum[fixed] = 0
+
+    # Modified Update Stress Last or Update Stress Last Scheme
+    if msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL':
+        particle_stress_update(msh,dt)
+
+    return lost
+
+def _check_boundary_conditions(conditions):
+    """
+    Raises ValueError for boundary conditions other than the default of
+    model_setup (first node fixed) or no conditions
+
+    Arguments
+    ---------
+    conditions: boundary_conditions
+        boundary conditions of the model setup
+    """
+    constraints = conditions.constraints
+    default = (len(constraints)==1 and np.array_equal(constraints[0][0],[0])
+               and not callable(constraints[0][1]) and np.all(np.asarray(constraints[0][1])==0))
+
+    if conditions.tractions or conditions.periodic_pairs or (constraints and not default):
+        raise ValueError("model_setup.boundary_conditions are not applied to 2D meshes, "
+                         "fix the 2D mesh nodes with mesh_2D.fix_nodes")
+
+def explicit_solution_2D(msh,msetup):
+    """
+    Calculates the explicit solution of the motion equation using the MPM in 2D
+
+    The time loop follows solver.explicit_solution, with the interpolation
+    type, integration scheme, damping and time step options of msetup.
+    The solution_array stores the (x, y) position or velocity of
+    msetup.solution_particle. The boundary conditions are the fixed
+    directions of the mesh nodes (mesh_2D.fix_nodes), the node sets of
+    msetup.boundary_conditions refer to 1D meshes and must be left at
+    their default.
+
+    Arguments
+    ---------
+
+    msh: mesh_2D
+        a mesh object
+
+    msetup : model_setup
+        a model_setup object containing the model options
+    """
+    if msetup.integration_scheme not in ('USF','USL','MUSL'):
+        raise ValueError("unknown integration scheme '%s'"%msetup.integration_scheme)
+    _check_boundary_conditions(msetup.boundary_conditions)
+
+    loop_counter = 1
+    it = 0
+    nlost = 0
+    dt_previous = msetup.dt
+
+    # main simulation loop
+    while it<=msetup.time:
+
+        # time step, from the stability condition in adaptive mode
+        if msetup.adaptive_dt:
+            locate_particles(msh)
+            dt = critical_time_step(msh,msetup)
+        else:
+            dt = msetup.dt
+        dt_velocity = dt/2.0 if loop_counter==1 else (dt_previous+dt)/2.0
+
+        lost = step(msh,msetup,dt,dt_velocity)
+
+        # report particles leaving the mesh
+        if len(lost)>nlost:
+            print("warning: %d particles outside the mesh at time %g"%(len(lost),it))
+        nlost = len(lost)
+
+        # store data for plot
+        msetup.solution_array[0].append(it)
+
+        if msetup.solution_field=='velocity':
+            msetup.solution_array[1].append(msh.store.velocity[msetup.solution_particle].copy())
+
+        elif msetup.solution_field=='position':
+            msetup.solution_array[1].append(msh.store.position[msetup.solution_particle].copy())
+
+        loop_counter+=1
+        it+=dt
+        dt_previous=dt
@@ -3,11 +3,54 @@
 This module defines classes representing a node in a finite element mesh
 
 """
+import numpy as np
+
+class node_store:
+    """
+    Represent the state of a set of nodes as contiguous arrays, one entry per node
+
+    Attributes
+    ---------
+    n : int
+        number of nodes in store
+
+    x, velocity, mass, momentum, f_int, f_ext, f_tot, f_damp : numpy.ndarray
+        nodal quantities (see node_1D)
+    """
+
+    # floating point fields stored per node
+    fields = ('x','velocity','mass','momentum','f_int','f_ext','f_tot','f_damp')
+
+    def __init__(self,n):
+
+        self.n = n
+        for name in self.fields:
+            setattr(self, name, np.zeros(n))
+
+def _store_field(name):
+    """
+    Creates a property reading and writing a node_store field
+
+    Arguments
+    ---------
+    name: string
+        field name in the node_store
+    """
+    def fget(self):
+        return getattr(self._store,name)[self._index]
+
+    def fset(self,value):
+        getattr(self._store,name)[self._index] = value
+
+    return property(fget,fset)
 
 class node_1D:
     """
     Represent a 1D node
-    
+
+    The nodal state lives in a node_store, this class is a view
+    of one entry of the store.
+
     Attributes
     ---------
     id : int
@@ -30,21 +73,29 @@ class node_1D:
 
     f_ext : float
         nodal external force
-        
+
     f_tot  : float
         total force
 
     f_damp  : float
         damping force
     """
-    def __init__(self):
-        
+    def __init__(self,store=None,index=0):
+
+        # a standalone node owns a store of its own
+        if store is None:
+            store = node_store(1)
+            index = 0
+
+        self._store = store
+        self._index = index
         self.id = 0
-        self.x = 0  
-        self.velocity = 0  
-        self.mass = 0  
-        self.momentum = 0  
-        self.f_int = 0
-        self.f_ext = 0
-        self.f_tot = 0
-        self.f_damp = 0
\ No newline at end of file
+
+    x = _store_field('x')
+    velocity = _store_field('velocity')
+    mass = _store_field('mass')
+    momentum = _store_field('momentum')
+    f_int = _store_field('f_int')
+    f_ext = _store_field('f_ext')
+    f_tot = _store_field('f_tot')
+    f_damp = _store_field('f_damp')
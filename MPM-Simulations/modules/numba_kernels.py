@@ -0,0 +1,423 @@
+"""
+
+This module defines Numba compiled kernels operating on the mesh arrays
+
+Numba is optional, when it is not installed the kernels are plain Python
+functions and available is False.
+
+"""
+import numpy as np
+
+import material
+
+try:
+    import numba
+    from numba import njit, prange
+    available = True
+
+except ImportError:
+    available = False
+    prange = range
+
+    def njit(*args,**kwargs):
+        """
+        Replacement of numba.njit returning the function unchanged
+        """
+        if len(args)==1 and callable(args[0]):
+            return args[0]
+        return lambda function: function
+
+def set_threads(threads):
+    """
+    Set the number of threads of the parallel kernels, bounded by the
+    threads available to Numba
+
+    Arguments
+    ---------
+    threads: int
+        number of threads
+    """
+    if available:
+        numba.set_num_threads(max(1,min(threads,numba.config.NUMBA_NUM_THREADS)))
+
+# material codes understood by stress_kernel
+MATERIAL_UNKNOWN = -1
+MATERIAL_LINEAR_ELASTIC = 0
+MATERIAL_NEWTONIAN_FLUID = 1
+
+def material_codes(materials):
+    """
+    Returns the material codes and parameters of a list of materials
+
+    Arguments
+    ---------
+    materials: list
+        material objects
+
+    Returns
+    -------
+    codes: numpy.ndarray
+        material code of each material
+    params: numpy.ndarray
+        material parameter (Young's modulus or viscosity) of each material
+    """
+    codes = np.full(len(materials),MATERIAL_UNKNOWN,dtype=np.int64)
+    params = np.zeros(len(materials))
+    for i, imat in enumerate(materials):
+        if type(imat) is material.linear_elastic:
+            codes[i] = MATERIAL_LINEAR_ELASTIC
+            params[i] = imat.E
+        elif type(imat) is material.newtonian_fluid:
+            codes[i] = MATERIAL_NEWTONIAN_FLUID
+            params[i] = imat.mu
+    return codes, params
+
+@njit(cache=True,error_model='numpy')
+def locate_kernel(position,xn,L,uniform,element):
+    """
+    Update the element index of every particle, -1 for particles outside the mesh
+
+    Arguments
+    ---------
+    position: numpy.ndarray
+        particle positions
+    xn: numpy.ndarray
+        nodal positions (sorted)
+    L: float
+        element length of uniform meshes
+    uniform: bool
+        True if all elements have length L
+    element: numpy.ndarray
+        particle element index (output)
+    """
+    nelem = len(xn)-1
+    for ip in range(len(position)):
+        xp = position[ip]
+
+        if not (xp>=xn[0] and xp<xn[nelem]):
+            element[ip] = -1
+            continue
+
+        if uniform:
+
+            # cell index from position with round-off correction
+            ie = int(np.floor((xp-xn[0])/L))
+            ie = min(max(ie,0),nelem-1)
+            if xp<xn[ie]:
+                ie -= 1
+            elif xp>=xn[ie+1]:
+                ie += 1
+
+        else:
+
+            # bisection search over the nodal coordinates
+            lo = 0
+            hi = nelem
+            while hi-lo>1:
+                mid = (lo+hi)//2
+                if xn[mid]<=xp:
+                    lo = mid
+                else:
+                    hi = mid
+            ie = lo
+
+        element[ip] = ie
+
+@njit(cache=True,error_model='numpy')
+def active_set_kernel(element,conn,nelem,nnodes):
+    """
+    Returns the indices of the elements containing particles and of their nodes
+
+    Arguments
+    ---------
+    element: numpy.ndarray
+        particle element index, -1 for particles outside the mesh
+    conn: numpy.ndarray
+        element connectivity
+    nelem: int
+        number of elements
+    nnodes: int
+        number of nodes
+    """
+    active_element = np.zeros(nelem,dtype=np.bool_)
+    active_node = np.zeros(nnodes,dtype=np.bool_)
+    for ip in range(len(element)):
+        ie = element[ip]
+        if ie>=0:
+            active_element[ie] = True
+            active_node[conn[ie,0]] = True
+            active_node[conn[ie,1]] = True
+    return np.nonzero(active_element)[0], np.nonzero(active_node)[0]
+
+@njit(cache=True,error_model='numpy')
+def _linear(s,L):
+    """
+    Linear interpolation function and gradient at distance s from the node
+    """
+    if abs(s)>=L:
+        return 0.0, 0.0
+    if s<=0:
+        return 1+s/L, 1/L
+    return 1-s/L, -1/L
+
+@njit(cache=True,error_model='numpy')
+def shape_kernel(position,element,conn,xn,elem_L,N1,N2,dN1,dN2):
+    """
+    Update the linear interpolation functions values and gradients of every particle
+    """
+    for ip in range(len(position)):
+        ie = element[ip]
+
+        if ie<0:
+            N1[ip] = 0.0
+            N2[ip] = 0.0
+            dN1[ip] = 0.0
+            dN2[ip] = 0.0
+            continue
+
+        L = elem_L[ie]
+        s1 = position[ip]-xn[conn[ie,0]]
+        s2 = position[ip]-xn[conn[ie,1]]
+
+        N1[ip], dN1[ip] = _linear(s1,L)
+        N2[ip], dN2[ip] = _linear(s2,L)
+
+@njit(cache=True,error_model='numpy')
+def p2g_kernel(element,conn,N1,N2,dN1,dN2,mass,velocity,stress,density,f_ext,
+               gmass,gmomentum,gf_int,gf_ext,mass_momentum,forces):
+    """
+    Interpolate particle quantities to the nodal arrays
+
+    Arguments
+    ---------
+    mass_momentum: bool
+        accumulate mass and momentum
+    forces: bool
+        accumulate internal and external forces
+    """
+    for ip in range(len(element)):
+        ie = element[ip]
+        if ie<0:
+            continue
+        n1 = conn[ie,0]
+        n2 = conn[ie,1]
+
+        if mass_momentum:
+            gmass[n1] += mass[ip]*N1[ip]
+            gmass[n2] += mass[ip]*N2[ip]
+            gmomentum[n1] += mass[ip]*velocity[ip]*N1[ip]
+            gmomentum[n2] += mass[ip]*velocity[ip]*N2[ip]
+
+        if forces:
+            gf_int[n1] -= dN1[ip]*stress[ip]*mass[ip]/density[ip]
+            gf_int[n2] -= dN2[ip]*stress[ip]*mass[ip]/density[ip]
+            gf_ext[n1] += N1[ip]*f_ext[ip]
+            gf_ext[n2] += N2[ip]*f_ext[ip]
+
+@njit(cache=True,error_model='numpy')
+def element_order_kernel(element,nelem):
+    """
+    Returns the particles sorted by element with a counting sort
+
+    Particles outside the mesh are left out.
+
+    Arguments
+    ---------
+    element: numpy.ndarray
+        particle element index, -1 for particles outside the mesh
+    nelem: int
+        number of elements
+
+    Returns
+    -------
+    order: numpy.ndarray
+        particle indices sorted by element
+    offsets: numpy.ndarray
+        the particles of element ie are order[offsets[ie]:offsets[ie+1]]
+    """
+    offsets = np.zeros(nelem+1,dtype=np.int64)
+    for ip in range(len(element)):
+        if element[ip]>=0:
+            offsets[element[ip]+1] += 1
+    for ie in range(nelem):
+        offsets[ie+1] += offsets[ie]
+
+    order = np.empty(offsets[nelem],dtype=np.int64)
+    fill = offsets[:-1].copy()
+    for ip in range(len(element)):
+        ie = element[ip]
+        if ie>=0:
+            order[fill[ie]] = ip
+            fill[ie] += 1
+    return order, offsets
+
+@njit(parallel=True,cache=True,error_model='numpy')
+def p2g_colored_kernel(order,offsets,conn,N1,N2,dN1,dN2,mass,velocity,stress,density,f_ext,
+                       gmass,gmomentum,gf_int,gf_ext,mass_momentum,forces):
+    """
+    Interpolate particle quantities to the nodal arrays in parallel
+
+    The elements are split in two colors, even and odd elements. Elements
+    of one color share no nodes, so the elements of a color are scattered
+    in parallel without write conflicts, one color after the other. In
+    higher dimensions the same scheme needs 2**dim colors.
+
+    Arguments
+    ---------
+    order: numpy.ndarray
+        particle indices sorted by element, from element_order_kernel
+    offsets: numpy.ndarray
+        element offsets in order, from element_order_kernel
+    mass_momentum: bool
+        accumulate mass and momentum
+    forces: bool
+        accumulate internal and external forces
+    """
+    nelem = len(offsets)-1
+    for color in range(2):
+        for k in prange((nelem-color+1)//2):
+            ie = 2*k+color
+            n1 = conn[ie,0]
+            n2 = conn[ie,1]
+
+            # element contributions accumulated before writing the nodes
+            m1 = 0.0
+            m2 = 0.0
+            p1 = 0.0
+            p2 = 0.0
+            fi1 = 0.0
+            fi2 = 0.0
+            fe1 = 0.0
+            fe2 = 0.0
+            for j in range(offsets[ie],offsets[ie+1]):
+                ip = order[j]
+
+                if mass_momentum:
+                    m1 += mass[ip]*N1[ip]
+                    m2 += mass[ip]*N2[ip]
+                    p1 += mass[ip]*velocity[ip]*N1[ip]
+                    p2 += mass[ip]*velocity[ip]*N2[ip]
+
+                if forces:
+                    fi1 -= dN1[ip]*stress[ip]*mass[ip]/density[ip]
+                    fi2 -= dN2[ip]*stress[ip]*mass[ip]/density[ip]
+                    fe1 += N1[ip]*f_ext[ip]
+                    fe2 += N2[ip]*f_ext[ip]
+
+            if mass_momentum:
+                gmass[n1] += m1
+                gmass[n2] += m2
+                gmomentum[n1] += p1
+                gmomentum[n2] += p2
+
+            if forces:
+                gf_int[n1] += fi1
+                gf_int[n2] += fi2
+                gf_ext[n1] += fe1
+                gf_ext[n2] += fe2
+
+@njit(cache=True,error_model='numpy')
+def nodal_update_kernel(nodes,constrained,velocity_end,alpha,dt,gmass,gmomentum,gf_int,gf_ext,gf_damp,gf_tot,gvelocity):
+    """
+    Calculate the damping and total forces, integrate the momentum and
+    update the velocity of the active nodes
+
+    Arguments
+    ---------
+    nodes: numpy.ndarray
+        indices of the active nodes
+    constrained: numpy.ndarray
+        indices of the constrained nodes (boundary_arrays.constrained_nodes)
+    velocity_end: numpy.ndarray
+        prescribed velocity of the constrained nodes at the end of the step
+    alpha: float
+        local damping factor
+    dt: float
+        time step
+    """
+    for i in nodes:
+
+        if alpha>0 and gmass[i]!=0:
+            nodal_vel = gmomentum[i]/gmass[i]
+            if nodal_vel!=0:
+                gf_damp[i] = - alpha * abs(gf_int[i]+gf_ext[i]) * nodal_vel/abs(nodal_vel)
+
+        gf_tot[i] = gf_int[i] + gf_ext[i] + gf_damp[i]
+
+    for k in range(len(constrained)):
+        i = constrained[k]
+        gf_tot[i] = (gmass[i]*velocity_end[k]-gmomentum[i])/dt
+
+    for i in nodes:
+        gmomentum[i] += gf_tot[i]*dt
+        gvelocity[i] = gmomentum[i]/gmass[i] if gmass[i]!=0 else 0.0
+
+    for k in range(len(constrained)):
+        i = constrained[k]
+        gmomentum[i] = gmass[i]*velocity_end[k]
+        gvelocity[i] = velocity_end[k]
+
+@njit(cache=True,error_model='numpy')
+def g2p_kernel(element,conn,N1,N2,gmass,gf_tot,gmomentum,velocity,position,dt_velocity,dt_position):
+    """
+    Update particle velocity and position from the nodal arrays
+    """
+    for ip in range(len(element)):
+        ie = element[ip]
+        if ie<0:
+            continue
+        n1 = conn[ie,0]
+        n2 = conn[ie,1]
+
+        a = 0.0
+        v = 0.0
+        if gmass[n1]!=0:
+            a += gf_tot[n1]/gmass[n1]*N1[ip]
+            v += gmomentum[n1]/gmass[n1]*N1[ip]
+        if gmass[n2]!=0:
+            a += gf_tot[n2]/gmass[n2]*N2[ip]
+            v += gmomentum[n2]/gmass[n2]*N2[ip]
+
+        velocity[ip] += a*dt_velocity
+        position[ip] += v*dt_position
+
+@njit(cache=True,error_model='numpy')
+def nodal_velocity_kernel(nodes,gmass,gmomentum,gvelocity):
+    """
+    Calculate nodal velocity in the active nodes with mass
+    """
+    for i in nodes:
+        if gmass[i]!=0:
+            gvelocity[i] = gmomentum[i]/gmass[i]
+
+@njit(cache=True,error_model='numpy')
+def strain_density_kernel(element,conn,dN1,dN2,gvelocity,dt,dstrain,density):
+    """
+    Calculate particle strain increment and update particle density
+    """
+    for ip in range(len(element)):
+        ie = element[ip]
+        if ie<0:
+            dstrain[ip] = 0.0
+        else:
+            dstrain[ip] = (dN1[ip]*gvelocity[conn[ie,0]]+dN2[ip]*gvelocity[conn[ie,1]])*dt
+        density[ip] = density[ip]/(1+dstrain[ip])
+
+@njit(cache=True,error_model='numpy')
+def stress_kernel(codes,params,material_id,dstrain,dt,stress):
+    """
+    Update the stress of particles with known material codes
+
+    Arguments
+    ---------
+    codes: numpy.ndarray
+        material code of each material
+    params: numpy.ndarray
+        material parameter of each material
+    """
+    for ip in range(len(stress)):
+        imat = material_id[ip]
+        if codes[imat]==MATERIAL_LINEAR_ELASTIC:
+            stress[ip] += dstrain[ip]*params[imat]
+        elif codes[imat]==MATERIAL_NEWTONIAN_FLUID:
+            stress[ip] = params[imat]*dstrain[ip]/dt
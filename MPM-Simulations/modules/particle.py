@@ -3,79 +3,503 @@
 This module defines classes representing a material point (or particle)
 
 """
+import numpy as np
+
+class particle_store:
+    """
+    Represent the state of a set of material points as contiguous arrays
+    (structure of arrays), one entry per particle.
+
+    Attributes
+    ----------
+
+    n : int
+        number of particles in store
+
+    mass, position, density, velocity, stress, dstrain, momentum, f_ext : numpy.ndarray
+        particle quantities (see material_point)
+
+    N1, N2, dN1, dN2 : numpy.ndarray
+        interpolation function values and gradients of the element nodes
+
+    size : numpy.ndarray
+        particle size
+
+    support : numpy.ndarray
+        indices of the nodes reached by each particle, shape (n, k)
+
+    N, dN : numpy.ndarray
+        interpolation function values and gradients of the support nodes,
+        shape (n, k)
+
+    element : numpy.ndarray
+        index of the element containing the particle, -1 if it has none
+
+    material_id : numpy.ndarray
+        index of the particle material in the materials list
+
+    materials : list
+        distinct materials referenced by the particles
+
+    state : list
+        state variables of each material, a dictionary of arrays with one
+        entry per particle of the material, in particle order
+
+    elements : list
+        mesh elements, used to resolve the element index of the particles
+    """
+
+    # floating point fields stored per particle
+    fields = ('mass','position','density','velocity','stress','dstrain',
+              'momentum','f_ext','N1','N2','dN1','dN2','size')
+
+    def __init__(self,capacity=16):
+
+        self.n = 0
+        self.materials = []
+        self.state = []
+        self.elements = []
+
+        self._capacity = max(int(capacity),1)
+        self._buffers = {}
+        for name in self.fields:
+            self._buffers[name] = np.zeros(self._capacity)
+        self._buffers['element'] = np.full(self._capacity,-1,dtype=np.int64)
+        self._buffers['material_id'] = np.zeros(self._capacity,dtype=np.int64)
+
+        # interpolation tables, computed with the interpolation functions
+        self.support = np.zeros((0,2),dtype=np.int64)
+        self.N = np.zeros((0,2))
+        self.dN = np.zeros((0,2))
+
+        self._set_size(0)
+
+    def __getstate__(self):
+        # the public arrays are views of the buffers, rebuilt when unpickled
+        state = self.__dict__.copy()
+        for name in self._buffers:
+            del state[name]
+        return state
+
+    def __setstate__(self,state):
+        self.__dict__.update(state)
+        self._set_size(self.n)
+
+    def _set_size(self,n):
+        """
+        Set the number of particles and refresh the public array views
+
+        Arguments
+        ---------
+        n: int
+            number of particles
+        """
+        self.n = n
+        for name, buf in self._buffers.items():
+            setattr(self, name, buf[:n])
+
+    def _reserve(self,capacity):
+        """
+        Grow the internal buffers to hold at least capacity particles
+
+        Arguments
+        ---------
+        capacity: int
+            required number of particles
+        """
+        if capacity<=self._capacity:
+            return
+
+        new_capacity = max(capacity,2*self._capacity)
+        for name, buf in self._buffers.items():
+            new_buf = np.zeros(new_capacity,dtype=buf.dtype)
+            if name=='element':
+                new_buf[:] = -1
+            new_buf[:self.n] = buf[:self.n]
+            self._buffers[name] = new_buf
+        self._capacity = new_capacity
+
+    def material_index(self,material):
+        """
+        Returns the index of a material in the materials list, registering it if needed
+
+        Arguments
+        ---------
+        material: material
+            a material object
+        """
+        for i, imat in enumerate(self.materials):
+            if imat is material:
+                return i
+        self.materials.append(material)
+        self.state.append(_new_state(material,0))
+        return len(self.materials)-1
+
+    def _extend_state(self,imat,n):
+        """
+        Append the initial state of n new particles to the state of a material
+
+        Arguments
+        ---------
+        imat: int
+            material index
+        n: int
+            number of new particles
+        """
+        new = _new_state(self.materials[imat],n)
+        state = self.state[imat]
+        for name, values in new.items():
+            state[name] = np.concatenate((state[name],values))
+
+    def set_material(self,index,material):
+        """
+        Change the material of one particle, its state restarts from the initial state
+
+        Arguments
+        ---------
+        index: int
+            particle index
+        material: material
+            a material object
+        """
+        old = self.material_id[index]
+        new = self.material_index(material)
+        if new==old:
+            return
+
+        # position of the particle in the state arrays of each material
+        state = self.state[old]
+        i = np.count_nonzero(self.material_id[:index]==old)
+        for name in state:
+            state[name] = np.delete(state[name],i)
+
+        self.material_id[index] = new
+        state = self.state[new]
+        i = np.count_nonzero(self.material_id[:index]==new)
+        for name, values in _new_state(material,1).items():
+            state[name] = np.insert(state[name],i,values)
+
+    def material_groups(self):
+        """
+        Returns the particles of each material
+
+        Returns
+        -------
+        groups: list
+            (material index, particle indices) pairs, the indices are a
+            slice when all particles share one material
+        """
+        if len(self.materials)==1:
+            return [(0,slice(0,self.n))]
+        return [(imat,np.flatnonzero(self.material_id==imat)) for imat in range(len(self.materials))]
+
+    def add(self,mass,material,x):
+        """
+        Add one particle to the store and returns its index
+
+        Arguments
+        ---------
+        mass: float
+            particle mass
+
+        material: material
+            a material object
+
+        x: float
+            particle position
+        """
+        index = self.n
+        self._reserve(index+1)
+
+        for name in self.fields:
+            self._buffers[name][index] = 0
+        self._buffers['mass'][index] = mass
+        self._buffers['position'][index] = x
+        self._buffers['density'][index] = material.density
+        self._buffers['element'][index] = -1
+        imat = self.material_index(material)
+        self._buffers['material_id'][index] = imat
+
+        self._set_size(index+1)
+        self._extend_state(imat,1)
+        return index
+
+    def add_many(self,mass,material,x,size,element):
+        """
+        Add particles of one material to the store
+
+        Arguments
+        ---------
+        mass: numpy.ndarray
+            particles mass
+
+        material: material
+            a material object
+
+        x: numpy.ndarray
+            particles position
+
+        size: numpy.ndarray
+            particles size
+
+        element: numpy.ndarray
+            index of the element containing each particle
+        """
+        first = self.n
+        last = first+len(x)
+        self._reserve(last)
+
+        for name in self.fields:
+            self._buffers[name][first:last] = 0
+        self._buffers['mass'][first:last] = mass
+        self._buffers['position'][first:last] = x
+        self._buffers['size'][first:last] = size
+        self._buffers['density'][first:last] = material.density
+        self._buffers['element'][first:last] = element
+        imat = self.material_index(material)
+        self._buffers['material_id'][first:last] = imat
+
+        self._set_size(last)
+        self._extend_state(imat,last-first)
+
+    def select(self,ids):
+        """
+        Returns a copy of the data of a set of particles
+
+        Arguments
+        ---------
+        ids: numpy.ndarray
+            increasing indices of the particles
+
+        Returns
+        -------
+        data: dict
+            particle fields, 'element', 'material_id' and 'state' (state
+            variables of each material, in particle order)
+        """
+        data = {name: getattr(self,name)[ids].copy() for name in self.fields+('element','material_id')}
+
+        selected = np.zeros(self.n,dtype=bool)
+        selected[ids] = True
+        data['state'] = []
+        for imat, state in enumerate(self.state):
+            rows = selected[self.material_id==imat]
+            data['state'].append({name: values[rows] for name, values in state.items()})
+        return data
+
+    def remove(self,ids):
+        """
+        Remove a set of particles, the remaining particles keep their order
+
+        Arguments
+        ---------
+        ids: numpy.ndarray
+            indices of the particles
+        """
+        keep = np.ones(self.n,dtype=bool)
+        keep[ids] = False
+
+        for imat, state in enumerate(self.state):
+            rows = keep[self.material_id==imat]
+            for name in state:
+                state[name] = state[name][rows]
+
+        n = np.count_nonzero(keep)
+        for name, buf in self._buffers.items():
+            buf[:n] = buf[:self.n][keep]
+        self._buffers['element'][n:self.n] = -1
+        self._set_size(n)
+
+    def append(self,data):
+        """
+        Add the particles returned by select, from a store with the same materials list
+
+        Arguments
+        ---------
+        data: dict
+            particle data, as returned by select
+        """
+        first = self.n
+        last = first+len(data['position'])
+        self._reserve(last)
+
+        for name in self.fields+('element','material_id'):
+            self._buffers[name][first:last] = data[name]
+
+        for state, new in zip(self.state,data['state']):
+            for name, values in new.items():
+                state[name] = np.concatenate((state[name],values))
+
+        self._set_size(last)
+
+def _new_state(material,n):
+    """
+    Returns the initial state of n particles of a material
+
+    Materials without state variables, or without new_state, have an
+    empty state.
+
+    Arguments
+    ---------
+    material: material
+        a material object
+    n: int
+        number of particles
+    """
+    if hasattr(material,'new_state'):
+        return material.new_state(n)
+    return {}
+
+def _store_field(name):
+    """
+    Creates a property reading and writing a particle_store field
+
+    Arguments
+    ---------
+    name: string
+        field name in the particle_store
+    """
+    def fget(self):
+        return getattr(self._store,name)[self._index]
+
+    def fset(self,value):
+        getattr(self._store,name)[self._index] = value
+
+    return property(fget,fset)
 
 class material_point:
     """
     Represent a material point.
 
+    The particle state lives in a particle_store, this class is a view
+    of one entry of the store.
+
     Attributes
     ----------
-    
+
     mass : float
         particle mass
-    
+
     position  : float
         particle position
-    
+
     material : material type
         material
-    
+
     density : float
         particle density
-    
+
     velocity : float
         particle velocity
-    
+
     stress : float
         particle stress
-    
+
     dstrain : float
         particle strain increment
-    
+
     momentum : float
         particle momentum (mass*velocity)
-    
+
     id : int
         particle identification
-    
+
     f_ext : float
         external force in particle
-    
+
     element : element type
-        element containing the particle
-    
+        element containing the particle, None if the particle is outside the mesh
+
     N1 : float
         value of the interpolation function of node 1
-    
+
     N2 : float
         value of the interpolation function of node 2
-    
+
     dN1 : float
         value of the interpolation function gradient of node 1
-    
+
     dN2 : float
         value of the interpolation function gradient of node 2
 
     size: float
         particle size
 
+    state : dict
+        state variables of the particle material
+
     """
-    def __init__(self, mass, material,x):
-        
-        self.mass = mass
-        self.position  = x 
-        self.material = material 
-        self.density = material.density 
-
-        self.velocity  = 0    
-        self.stress    = 0    
-        self.dstrain   = 0    
-        self.momentum  = 0    
-        self.id = 0          
-        self.f_ext = 0        
-        self.element = 0      
-        self.N1 = 0           
-        self.N2 = 0           
-        self.dN1 = 0          
-        self.dN1 = 0
-        self.size = 0          
\ No newline at end of file
+    def __init__(self, mass, material,x,store=None):
+
+        # a standalone particle owns a store of its own
+        if store is None:
+            store = particle_store(capacity=1)
+
+        self._store = store
+        self._index = store.add(mass,material,x)
+        self.id = 0
+
+    @classmethod
+    def view(cls,store,index):
+        """
+        Returns a material point viewing an existing entry of a store
+
+        Arguments
+        ---------
+        store: particle_store
+            a particle store
+
+        index: int
+            index of the particle in the store
+        """
+        ip = cls.__new__(cls)
+        ip._store = store
+        ip._index = index
+        ip.id = index
+        return ip
+
+    mass = _store_field('mass')
+    position = _store_field('position')
+    density = _store_field('density')
+    velocity = _store_field('velocity')
+    stress = _store_field('stress')
+    dstrain = _store_field('dstrain')
+    momentum = _store_field('momentum')
+    f_ext = _store_field('f_ext')
+    N1 = _store_field('N1')
+    N2 = _store_field('N2')
+    dN1 = _store_field('dN1')
+    dN2 = _store_field('dN2')
+    size = _store_field('size')
+
+    @property
+    def material(self):
+        return self._store.materials[self._store.material_id[self._index]]
+
+    @material.setter
+    def material(self,material):
+        self._store.set_material(self._index,material)
+
+    @property
+    def state(self):
+        """
+        state variables of the particle, one element views of the material state arrays
+        """
+        store = self._store
+        imat = store.material_id[self._index]
+        if len(store.materials)==1:
+            i = self._index
+        else:
+            i = np.count_nonzero(store.material_id[:self._index]==imat)
+        return {name: values[i:i+1] for name, values in store.state[imat].items()}
+
+    @property
+    def element(self):
+        ie = self._store.element[self._index]
+        if ie<0:
+            return None
+        return self._store.elements[ie]
+
+    @element.setter
+    def element(self,ie):
+        self._store.element[self._index] = ie.id if ie else -1
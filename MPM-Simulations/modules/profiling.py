@@ -0,0 +1,249 @@
+"""
+
+This module defines a profiler recording the wall time of the solver phases
+
+The solver runs each phase inside profiler.phase(name). A disabled
+profiler returns a shared context that does nothing, so profiling costs
+one method call and an empty with block per phase when it is off (under
+a microsecond, against milliseconds for the phases of large meshes). An
+enabled profiler reads time.perf_counter_ns before and after each phase
+and accumulates the time and the number of calls of each phase in each
+time step.
+
+"""
+import json
+import time
+
+import numpy as np
+
+class _null_phase:
+    """
+    Context of the phases of a disabled profiler
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self,*args):
+        return False
+
+NULL_PHASE = _null_phase()
+
+class _phase:
+    """
+    Context timing one call of a phase
+    """
+    __slots__ = ('profiler','column','start')
+
+    def __init__(self,profiler,column):
+        self.profiler = profiler
+        self.column = column
+        self.start = 0
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+
+    def __exit__(self,*args):
+        self.profiler._add(self.column,self.start,time.perf_counter_ns())
+        return False
+
+class phase_profiler:
+    """
+    Records the wall time and the number of calls of the solver phases in each time step
+
+    Attributes
+    ----------
+    enabled : bool
+        record the phases, a disabled profiler records nothing
+
+    trace : bool
+        keep every phase call for the Chrome trace export
+
+    names : list
+        phase names, in order of first call
+
+    nsteps : int
+        number of recorded time steps
+
+    events : list
+        (phase name, step, start, duration) of every phase call, in
+        nanoseconds, when trace is True
+    """
+
+    def __init__(self,enabled=True,trace=False):
+
+        self.enabled = enabled
+        self.trace = trace
+        self.names = []
+        self.nsteps = 0
+        self.events = []
+
+        self._columns = {}
+        self._phases = []
+        self._time = np.zeros((64,16),dtype=np.int64)
+        self._calls = np.zeros((64,16),dtype=np.int64)
+        self._origin = time.perf_counter_ns()
+
+        # time and calls of the current step, kept in lists because
+        # updating array items is slower
+        self._step_time = []
+        self._step_calls = []
+
+    def phase(self,name):
+        """
+        Returns the context timing a phase, e.g. with profiler.phase('particles_to_nodes'):
+
+        Arguments
+        ---------
+        name: string
+            phase name
+        """
+        if not self.enabled:
+            return NULL_PHASE
+
+        column = self._columns.get(name)
+        if column is None:
+            column = self._register(name)
+        return self._phases[column]
+
+    def start_step(self):
+        """
+        Starts recording a new time step
+        """
+        if not self.enabled:
+            return
+
+        self._flush()
+        if self.nsteps==len(self._time):
+            self._time = np.concatenate((self._time,np.zeros_like(self._time)))
+            self._calls = np.concatenate((self._calls,np.zeros_like(self._calls)))
+        self.nsteps += 1
+
+        for column in range(len(self.names)):
+            self._step_time[column] = 0
+            self._step_calls[column] = 0
+
+    def _flush(self):
+        """
+        Copies the time and calls of the current step to the recorded arrays
+        """
+        # phases timed before the first step are recorded in a first step
+        if self.nsteps==0:
+            if not any(self._step_calls):
+                return
+            self.nsteps = 1
+
+        row = self.nsteps-1
+        ncolumns = len(self.names)
+        self._time[row,:ncolumns] = self._step_time
+        self._calls[row,:ncolumns] = self._step_calls
+
+    def _register(self,name):
+        """
+        Adds a phase and returns its column in the recorded arrays
+        """
+        column = len(self.names)
+        if column==self._time.shape[1]:
+            self._time = np.concatenate((self._time,np.zeros_like(self._time)),axis=1)
+            self._calls = np.concatenate((self._calls,np.zeros_like(self._calls)),axis=1)
+
+        self.names.append(name)
+        self._columns[name] = column
+        self._phases.append(_phase(self,column))
+        self._step_time.append(0)
+        self._step_calls.append(0)
+        return column
+
+    def _add(self,column,start,end):
+        """
+        Records one call of a phase
+        """
+        self._step_time[column] += end-start
+        self._step_calls[column] += 1
+        if self.trace:
+            self.events.append((self.names[column],max(self.nsteps-1,0),start-self._origin,end-start))
+
+    def step_times(self):
+        """
+        Returns the wall time of each phase in each time step
+
+        Returns
+        -------
+        times: dict
+            phase name to an array of seconds, one entry per time step
+        """
+        self._flush()
+        return {name: 1e-9*self._time[:self.nsteps,column] for name, column in self._columns.items()}
+
+    def step_calls(self):
+        """
+        Returns the number of calls of each phase in each time step
+
+        Returns
+        -------
+        calls: dict
+            phase name to an array of calls, one entry per time step
+        """
+        self._flush()
+        return {name: self._calls[:self.nsteps,column].copy() for name, column in self._columns.items()}
+
+    def summary(self):
+        """
+        Returns the total time and calls of each phase
+
+        Returns
+        -------
+        rows: list
+            one dictionary per phase, slowest first, with the keys name,
+            calls, time (seconds), time_per_step (seconds) and fraction
+            (of the 'step' phase time, when recorded)
+        """
+        self._flush()
+        time_total = self._time[:self.nsteps].sum(axis=0)
+        calls_total = self._calls[:self.nsteps].sum(axis=0)
+        step = self._columns.get('step')
+        reference = time_total[step] if step is not None else 0
+
+        rows = []
+        for name, column in self._columns.items():
+            rows.append({'name': name,
+                         'calls': int(calls_total[column]),
+                         'time': 1e-9*time_total[column],
+                         'time_per_step': 1e-9*time_total[column]/max(self.nsteps,1),
+                         'fraction': time_total[column]/reference if reference else None})
+        rows.sort(key=lambda row: -row['time'])
+        return rows
+
+    def print_summary(self):
+        """
+        Prints the summary table
+        """
+        print("%d time steps"%self.nsteps)
+        print("%-32s %10s %12s %14s %8s"%('phase','calls','time (s)','per step (s)','%'))
+        for row in self.summary():
+            fraction = '-' if row['fraction'] is None else '%.1f'%(100*row['fraction'])
+            print("%-32s %10d %12.4e %14.4e %8s"%(row['name'],row['calls'],row['time'],
+                                                 row['time_per_step'],fraction))
+
+    def chrome_trace(self,path):
+        """
+        Writes the recorded phase calls in the Chrome trace event format,
+        to open with chrome://tracing or Perfetto
+
+        Arguments
+        ---------
+        path: string
+            JSON file path
+        """
+        if not self.trace:
+            raise ValueError("the profiler was created with trace=False")
+
+        events = [{'name': name,'ph': 'X','ts': 1e-3*start,'dur': 1e-3*duration,
+                   'pid': 0,'tid': 0,'args': {'step': step}}
+                  for name, step, start, duration in self.events]
+        with open(path,'w') as f:
+            json.dump({'traceEvents': events,'displayTimeUnit': 'ms'},f)
+
+# profiler used by the solver when none is given
+DISABLED = phase_profiler(enabled=False)
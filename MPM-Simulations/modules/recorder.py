@@ -0,0 +1,293 @@
+"""
+
+This module defines a recorder storing the history of particle and nodal fields
+
+Values are written in preallocated buffers, when a buffer is full its
+content is written to disk as a chunk (.npy files or an HDF5 file) so the
+memory used by a recorder does not grow with the simulation length.
+
+The state of a recorder (number of records and chunks and the buffered
+records) is saved in the checkpoints of a simulation. A recorder started
+from this state continues the chunk numbering of the checkpointed run and
+removes the chunks written after the checkpoint.
+
+"""
+import os
+
+import numpy as np
+
+class solution_recorder:
+    """
+    Records particle and nodal fields during a simulation
+
+    Attributes
+    ----------
+    particle_fields : tuple
+        particle_store fields to record, e.g. ('position','velocity')
+
+    node_fields : tuple
+        node_store fields to record, e.g. ('velocity','f_tot')
+
+    scalar_fields : tuple
+        scalar values given to record, e.g. monitor.FIELDS
+
+    particles : numpy.ndarray
+        indices of the recorded particles, None for all particles
+
+    nodes : numpy.ndarray
+        indices of the recorded nodes, None for all nodes
+
+    every : int
+        record one of every *every* time steps
+
+    capacity : int
+        number of records held in memory before writing a chunk
+
+    path : string
+        directory (npy format) or file (hdf5 format) to write chunks,
+        None keeps all chunks in memory
+
+    file_format : string
+        chunk format, can be 'npy' or 'hdf5'
+
+    nrecords : int
+        number of records taken
+    """
+
+    def __init__(self,particle_fields=(),node_fields=(),particles=None,nodes=None,
+                 every=1,capacity=1024,path=None,file_format='npy',scalar_fields=()):
+
+        if file_format not in ('npy','hdf5'):
+            raise ValueError("unknown file format '%s'"%file_format)
+        if 'time' in scalar_fields:
+            raise ValueError("'time' is always recorded")
+
+        self.particle_fields = tuple(particle_fields)
+        self.node_fields = tuple(node_fields)
+        self.scalar_fields = tuple(scalar_fields)
+        self.particles = None if particles is None else np.asarray(particles)
+        self.nodes = None if nodes is None else np.asarray(nodes)
+        self.every = max(int(every),1)
+        self.capacity = max(int(capacity),1)
+        self.path = path
+        self.file_format = file_format
+        self.nrecords = 0
+
+        self._buffers = {}
+        self._fill = 0
+        self._chunks = []
+        self._memory_chunks = {}
+
+    def _names(self):
+        """
+        Returns the names of the recorded series
+        """
+        return (['time']+['particle_'+name for name in self.particle_fields]
+                +['node_'+name for name in self.node_fields]+list(self.scalar_fields))
+
+    def start(self,msh,state=None):
+        """
+        Allocates the buffers for a mesh
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        state: dict
+            recorder state to resume from, as returned by get_state, None
+            to start a new history
+        """
+        held = self._memory_chunks
+        nparticles = msh.store.n if self.particles is None else len(self.particles)
+        nnodes = msh.grid.n if self.nodes is None else len(self.nodes)
+
+        self._buffers = {'time': np.zeros(self.capacity)}
+        for name in self.particle_fields:
+            self._buffers['particle_'+name] = np.zeros((self.capacity,nparticles))
+        for name in self.node_fields:
+            self._buffers['node_'+name] = np.zeros((self.capacity,nnodes))
+        for name in self.scalar_fields:
+            self._buffers[name] = np.zeros(self.capacity)
+
+        self._fill = 0
+        self._chunks = []
+        self._memory_chunks = {name: [] for name in self._names()}
+        self.nrecords = 0
+
+        if self.path is not None and self.file_format=='npy':
+            os.makedirs(self.path,exist_ok=True)
+
+        if state is not None:
+            self._resume(state,held)
+
+    def get_state(self):
+        """
+        Returns the state of the recorder, to resume it from a checkpoint
+
+        Returns
+        -------
+        state: dict
+            number of records 'nrecords', size of each written chunk
+            'chunks', 'capacity' and the buffered records of each series
+            'buffer_<name>'
+        """
+        state = {'nrecords': np.int64(self.nrecords),
+                 'chunks': np.array(self._chunks,dtype=np.int64),
+                 'capacity': np.int64(self.capacity)}
+        for name, buf in self._buffers.items():
+            state['buffer_'+name] = buf[:self._fill].copy()
+        return state
+
+    def _resume(self,state,held):
+        """
+        Restores the records of a saved state and removes the chunks
+        written after it, held are the chunks of an in-memory recorder
+        before it was started
+        """
+        names = {name[len('buffer_'):] for name in state if name.startswith('buffer_')}
+        if names!=set(self._buffers) or int(state['capacity'])!=self.capacity:
+            raise ValueError("the recorder fields or capacity differ from the checkpointed recorder")
+
+        chunks = [int(n) for n in state['chunks']]
+
+        if self.path is None:
+            if any(len(held.get(name,()))<len(chunks) for name in names):
+                raise ValueError("an in-memory recorder can only resume with the chunks of the checkpointed run")
+            self._memory_chunks = {name: held[name][:len(chunks)] for name in names}
+
+        elif self.file_format=='npy':
+            ichunk = len(chunks)
+            while True:
+                files = [os.path.join(self.path,'%s_%06d.npy'%(name,ichunk)) for name in names]
+                files = [file for file in files if os.path.exists(file)]
+                if not files:
+                    break
+                for file in files:
+                    os.remove(file)
+                ichunk += 1
+
+        else:
+            import h5py
+            if chunks:
+                with h5py.File(self.path,'a') as f:
+                    for name in names:
+                        f[name].resize(sum(chunks),axis=0)
+
+        self._chunks = chunks
+        self.nrecords = int(state['nrecords'])
+        self._fill = len(state['buffer_time'])
+        for name in names:
+            self._buffers[name][:self._fill] = state['buffer_'+name]
+
+    def record(self,msh,it,step,scalars=None):
+        """
+        Records the current values if the step is a recording step
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object
+        it: float
+            current time
+        step: int
+            time step number, starting at 0
+        scalars: dict
+            values of the scalar fields, missing values are recorded as nan
+        """
+        if step%self.every!=0:
+            return
+
+        i = self._fill
+        self._buffers['time'][i] = it
+
+        ps = msh.store
+        for name in self.particle_fields:
+            values = getattr(ps,name)
+            self._buffers['particle_'+name][i] = values if self.particles is None else values[self.particles]
+
+        grid = msh.grid
+        for name in self.node_fields:
+            values = getattr(grid,name)
+            self._buffers['node_'+name][i] = values if self.nodes is None else values[self.nodes]
+
+        for name in self.scalar_fields:
+            self._buffers[name][i] = scalars.get(name,np.nan) if scalars is not None else np.nan
+
+        self._fill += 1
+        self.nrecords += 1
+
+        if self._fill==self.capacity:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records as a new chunk
+        """
+        n = self._fill
+        if n==0:
+            return
+
+        if self.path is None:
+            for name, buf in self._buffers.items():
+                self._memory_chunks[name].append(buf[:n].copy())
+
+        elif self.file_format=='npy':
+            ichunk = len(self._chunks)
+            for name, buf in self._buffers.items():
+                np.save(os.path.join(self.path,'%s_%06d.npy'%(name,ichunk)),buf[:n])
+
+        else:
+            import h5py
+            with h5py.File(self.path,'a' if self._chunks else 'w') as f:
+                for name, buf in self._buffers.items():
+                    if name not in f:
+                        f.create_dataset(name,data=buf[:n],maxshape=(None,)+buf.shape[1:],
+                                         chunks=(self.capacity,)+buf.shape[1:])
+                    else:
+                        dataset = f[name]
+                        start = dataset.shape[0]
+                        dataset.resize(start+n,axis=0)
+                        dataset[start:] = buf[:n]
+
+        self._chunks.append(n)
+        self._fill = 0
+
+    def finish(self):
+        """
+        Writes the remaining buffered records
+        """
+        self.flush()
+
+    def history(self,name):
+        """
+        Returns the full recorded history of a series
+
+        Arguments
+        ---------
+        name: string
+            'time', 'particle_<field>', 'node_<field>' or a scalar field
+
+        Returns
+        -------
+        values: numpy.ndarray
+            recorded values, one row per record
+        """
+        if name not in self._buffers:
+            raise KeyError("'%s' is not recorded"%name)
+
+        if self.path is None:
+            parts = list(self._memory_chunks[name])
+
+        elif self.file_format=='npy':
+            parts = [np.load(os.path.join(self.path,'%s_%06d.npy'%(name,ichunk)))
+                     for ichunk in range(len(self._chunks))]
+
+        else:
+            import h5py
+            parts = []
+            if self._chunks:
+                with h5py.File(self.path,'r') as f:
+                    parts.append(f[name][:])
+
+        parts.append(self._buffers[name][:self._fill])
+        return np.concatenate(parts)
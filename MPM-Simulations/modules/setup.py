@@ -3,6 +3,7 @@
 This module defines a class representing the configuration of the problem
 
 """
+import boundary
 
 class model_setup:
 
@@ -12,7 +13,8 @@ class model_setup:
     Attributes
     ----------
     interpolation_type : string
-        interpolation function type, can be 'linear' or 'cpGIMP'
+        interpolation function type, can be 'linear', 'cpGIMP',
+        'quadratic_bspline' or 'cubic_bspline' (numpy engine only)
     
     integration_scheme : string
         material point method integration scheme, can be 'USL', 'USF' or 'MUSL'
@@ -34,6 +36,32 @@ class model_setup:
 
     damping_local_alpha : float
         local damping factor proportional to the total nodal force
+
+    engine : string
+        time step implementation, can be 'python' (loops over particle and
+        node objects), 'numpy' (vectorized operations over the mesh arrays)
+        or 'numba' (compiled kernels over the mesh arrays)
+
+    adaptive_dt : bool
+        compute the time step of each loop from the CFL stability condition,
+        when False the fixed time step dt is used
+
+    dt_safety_factor : float
+        fraction of the critical time step used in adaptive mode
+
+    dt_min : float
+        minimum time step in adaptive mode
+
+    dt_max : float
+        maximum time step in adaptive mode
+
+    threads : int
+        threads of the particle to grid transfer in the numpy and numba
+        engines
+
+    boundary_conditions : boundary_conditions
+        boundary conditions of the mesh nodes, the first node is fixed by
+        default
         
     """
     def __init__(self):
@@ -45,4 +73,12 @@ class model_setup:
         self.solution_particle=0
         self.solution_field="position"
         self.solution_array=[[],[]]
-        self.damping_local_alpha=0
\ No newline at end of file
+        self.damping_local_alpha=0
+        self.engine="python"
+        self.adaptive_dt=False
+        self.dt_safety_factor=0.5
+        self.dt_min=0
+        self.dt_max=float('inf')
+        self.threads=1
+        self.boundary_conditions=boundary.boundary_conditions()
+        self.boundary_conditions.fix(0)
\ No newline at end of file
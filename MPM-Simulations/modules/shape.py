@@ -3,6 +3,7 @@
 This module defines nodal shape functions and its derivative
 
 """
+import numpy as np
 
 def NiLinear(x,xI,L):
 	"""
@@ -139,6 +140,242 @@ def dNicpGIMP(L,lp,xp,xi):
 	if (L-lp)<s and s<=(L+lp):
 		return -(L+lp-s)/(2*L*lp)
 
+def NiLinear_array(x,xI,L):
+	"""
+	Calculates the values of the linear interpolation function for arrays of points
+
+	Arguments
+	---------
+	x: numpy.ndarray
+		points to calculate the function
+	xI: numpy.ndarray
+		nodal point positions
+	L: numpy.ndarray
+		grid cell spacings
+	"""
+	s = x-xI
+	return np.where(np.abs(s)>=L, 0.0, np.where(s<=0, 1+s/L, 1-s/L))
+
+def dNiLinear_array(x,xI,L):
+	"""
+	Calculates the values of the linear interpolation function gradient for arrays of points
+
+	Arguments
+	---------
+	x: numpy.ndarray
+		points to calculate the function
+	xI: numpy.ndarray
+		nodal point positions
+	L: numpy.ndarray
+		grid cell spacings
+	"""
+	s = x-xI
+	return np.where(np.abs(s)>=L, 0.0, np.where(s<=0, 1/L, -1/L))
+
+def NicpGIMP_array(L,lp,xp,xi):
+	"""
+	Calculates contiguous GIMP shape function values for arrays of particles
+
+	Arguments
+	---------
+
+	L : numpy.ndarray
+		cell spacings
+	lp : numpy.ndarray
+		half of current particle sizes
+	xp : numpy.ndarray
+		particle positions
+	xi : numpy.ndarray
+		node positions
+	"""
+	s = xp-xi
+
+	regions = [np.abs(s)>=(L+lp),
+			   s<=(-L+lp),
+			   s<=(-lp),
+			   s<=lp,
+			   s<=(L-lp)]
+
+	values = [0.0,
+			  ((L+lp+s)**2)/(4*L*lp),
+			  1 + (s/L),
+			  1 - (s**2 + lp**2)/(2*L*lp),
+			  1 - (s/L)]
+
+	return np.select(regions, values, ((L+lp-s)**2)/(4*L*lp))
+
+def dNicpGIMP_array(L,lp,xp,xi):
+	"""
+	Calculates the gradient of the contiguous particle GIMP shape functions for arrays of particles
+
+	Arguments
+	---------
+
+	L : numpy.ndarray
+		cell spacings
+	lp : numpy.ndarray
+		half of current particle sizes
+	xp : numpy.ndarray
+		particle positions
+	xi : numpy.ndarray
+		node positions
+	"""
+	s = xp-xi
+
+	regions = [np.abs(s)>=(L+lp),
+			   s<=(-L+lp),
+			   s<=(-lp),
+			   s<=lp,
+			   s<=(L-lp)]
+
+	values = [0.0,
+			  (L+lp+s)/(2*L*lp),
+			  1/L,
+			  -s/(L*lp),
+			  -1/L]
+
+	return np.select(regions, values, -(L+lp-s)/(2*L*lp))
+
+def cpGIMP_table(xp,lp,element,xn,L):
+	"""
+	Calculates the contiguous particle GIMP interpolation functions as fixed width tables
+
+	The particle domain reaches the nodes of its element and the nearest
+	node of each neighbour element, the support of a particle in element
+	e has the nodes e-1 to e+2. The functions of nodes beyond the grid ends
+	are added to the end nodes, as in bspline_table.
+
+	Arguments
+	---------
+	xp: numpy.ndarray
+		particle positions
+	lp: numpy.ndarray
+		half of current particle sizes
+	element: numpy.ndarray
+		element index of each particle, inside the mesh
+	xn: numpy.ndarray
+		node positions
+	L: numpy.ndarray
+		element lengths
+
+	Returns
+	-------
+	nodes: numpy.ndarray
+		node indices, shape xp.shape+(4,)
+	N: numpy.ndarray
+		interpolation functions values, shape xp.shape+(4,)
+	dN: numpy.ndarray
+		interpolation functions gradients, shape xp.shape+(4,)
+	"""
+	nelem = len(L)
+	nodes = element[...,None]+np.arange(-1,3)
+
+	# cell spacing of each node function, the length of the element
+	# between the node and the particle
+	cells = np.clip(element[...,None]+np.array([-1,0,0,1]),0,nelem-1)
+	Lc = L[cells]
+
+	# node positions, extended beyond the grid ends
+	np.clip(nodes,0,nelem,out=nodes)
+	xi = xn[nodes]
+	xi[...,0] = np.where(element>0,xi[...,0],xi[...,1]-Lc[...,0])
+	xi[...,3] = np.where(element<nelem-1,xi[...,3],xi[...,2]+Lc[...,3])
+
+	xp = xp[...,None]
+	lp = lp[...,None]
+	return nodes, NicpGIMP_array(Lc,lp,xp,xi), dNicpGIMP_array(Lc,lp,xp,xi)
+
+# B-spline interpolation types and their polynomial degree
+BSPLINE_DEGREE = {'quadratic_bspline': 2, 'cubic_bspline': 3}
+
+def NiBspline_array(s,degree):
+	"""
+	Calculates the values of the uniform B-spline interpolation function for arrays of points
+
+	Arguments
+	---------
+	s: numpy.ndarray
+		distances from the points to the node, in cell spacings
+	degree: int
+		B-spline degree, can be 2 or 3
+	"""
+	a = np.abs(s)
+
+	if degree==2:
+		return np.select([a<0.5, a<1.5], [0.75-a**2, 0.5*(1.5-a)**2], 0.0)
+
+	if degree==3:
+		return np.select([a<1, a<2], [2/3-a**2+a**3/2, (2-a)**3/6], 0.0)
+
+	raise ValueError("unsupported B-spline degree %d"%degree)
+
+def dNiBspline_array(s,degree,L):
+	"""
+	Calculates the values of the uniform B-spline interpolation function gradient for arrays of points
+
+	Arguments
+	---------
+	s: numpy.ndarray
+		distances from the points to the node, in cell spacings
+	degree: int
+		B-spline degree, can be 2 or 3
+	L: float
+		grid cell spacing
+	"""
+	a = np.abs(s)
+	sign = np.sign(s)
+
+	if degree==2:
+		return np.select([a<0.5, a<1.5], [-2*s, -sign*(1.5-a)], 0.0)/L
+
+	if degree==3:
+		return np.select([a<1, a<2], [-2*s+1.5*s*a, -sign*(2-a)**2/2], 0.0)/L
+
+	raise ValueError("unsupported B-spline degree %d"%degree)
+
+def bspline_table(xp,x0,L,nnodes,degree):
+	"""
+	Calculates the B-spline interpolation functions of a uniform grid as fixed width tables
+
+	Each particle reaches degree+1 nodes. The functions of nodes beyond
+	the grid ends are added to the end nodes, which keeps the partition
+	of unity in the boundary cells.
+
+	Arguments
+	---------
+	xp: numpy.ndarray
+		particle positions
+	x0: float
+		position of the first node
+	L: float
+		grid cell spacing
+	nnodes: int
+		number of nodes
+	degree: int
+		B-spline degree, can be 2 or 3
+
+	Returns
+	-------
+	nodes: numpy.ndarray
+		node indices, shape (particles, degree+1)
+	N: numpy.ndarray
+		interpolation functions values, shape (particles, degree+1)
+	dN: numpy.ndarray
+		interpolation functions gradients, shape (particles, degree+1)
+	"""
+	xi = (xp-x0)/L
+
+	# first node of the support, the support is centered on the particle
+	first = np.floor(xi-(degree-1)/2).astype(np.int64)
+	nodes = first[:,None]+np.arange(degree+1)
+
+	s = xi[:,None]-nodes
+	N = NiBspline_array(s,degree)
+	dN = dNiBspline_array(s,degree,L)
+
+	np.clip(nodes,0,nnodes-1,out=nodes)
+	return nodes, N, dN
+
 def test_interpolation_functions(x1,x2,xI,L,shape_type):
 	"""
 	Tests the interpolation functions Ni and its gradients dNi
@@ -16,122 +16,691 @@ $$\ddot{u}_i$$: is the acceleration
 # local modules
 import interpolation as interpola # for interpolation tasks
 import integration as integra # for integration tasks
-import update2 # for updating tasks
+import update # for updating tasks
+import numba_kernels as nbk # for compiled tasks
+import shape # for interpolation functions
+import profiling # for timing tasks
+import boundary # for boundary conditions
+
+import numpy as np
+
+# interpolation function types and stress update schemes of the time step
+INTERPOLATION_TYPES = ('linear','cpGIMP')+tuple(shape.BSPLINE_DEGREE)
+
+# interpolation function types reaching more than the two element nodes
+TABLE_INTERPOLATION_TYPES = ('cpGIMP',)+tuple(shape.BSPLINE_DEGREE)
+INTEGRATION_SCHEMES = ('USF','USL','MUSL')
+
+def explicit_solution(msh,msetup,recorder=None,checkpoint=None,start=None,profiler=None,monitor=None):
+	"""
+	Calculates the explicit solution of the motion equation using the MPM
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options, msetup.engine
+		selects the implementation of the time step ('python', 'numpy' or 'numba')
+
+	recorder : solution_recorder
+		optional recorder of particle and nodal fields, called after each time step
+
+	checkpoint : checkpointer
+		optional checkpointer saving the simulation state after each time step interval
+
+	start : dict
+		loop state to resume from ('it', 'loop_counter', 'nlost',
+		'dt_previous' and optionally the 'recorder' and 'monitor' states),
+		as returned by checkpoint.load_checkpoint
+
+	profiler : phase_profiler
+		optional profiler recording the wall time of each phase of each time step
+
+	monitor : conservation_monitor
+		optional monitor of the energy and momentum balance, its values are
+		given to the recorder scalar fields and the simulation stops with a
+		RuntimeError when the energy drift exceeds the monitor tolerance
 
-def explicit_solution(msh,msetup):
 	"""
-    Calculates the explicit solution of the motion equation using the MPM
-    
-    Arguments
-    ---------
 
-    msh: mesh
-        a mesh object
+	# time step implementation
+	if msetup.engine=='python':
+		step = python_step
+	elif msetup.engine=='numpy':
+		step = numpy_step
+	elif msetup.engine=='numba':
+		if nbk.available:
+			step = numba_step
+		else:
+			print("warning: numba is not installed, using the python engine")
+			step = python_step
+	else:
+		raise ValueError("unknown engine '%s'"%msetup.engine)
+
+	# time step options, checked before the first step
+	if msetup.interpolation_type not in INTERPOLATION_TYPES:
+		raise ValueError("unknown interpolation type '%s'"%msetup.interpolation_type)
+	if msetup.integration_scheme not in INTEGRATION_SCHEMES:
+		raise ValueError("unknown integration scheme '%s'"%msetup.integration_scheme)
 
-    msetup : model_setup
-    	a model_setup object containing the model options
+	# interpolation functions reaching more than two nodes are only in the numpy engine
+	if msetup.interpolation_type in TABLE_INTERPOLATION_TYPES and step is not numpy_step:
+		print("warning: %s interpolation is only supported by the numpy engine, using the numpy engine"%msetup.interpolation_type)
+		step = numpy_step
 
-    """  
-    
-    # loop couter
+	# loop couter
 	loop_counter = 1
-	
+
 	# current loop time
 	it = 0
 
+	# number of particles outside the mesh
+	nlost = 0
+
+	# time step of the previous loop
+	dt_previous = msetup.dt
+
+	# resume a previous run
+	if start is not None:
+		loop_counter = start['loop_counter']
+		it = start['it']
+		nlost = start['nlost']
+		dt_previous = start.get('dt_previous',msetup.dt)
+
+	if profiler is None:
+		profiler = profiling.DISABLED
+	phase = profiler.phase
+
+	if recorder is not None:
+		recorder.start(msh,start.get('recorder') if start is not None else None)
+
+	if monitor is not None:
+		monitor.start(msh,start.get('monitor') if start is not None else None)
+
 	# main simulation loop
 	while it<=msetup.time:
-	    
-	    # update particles list in each element
-	    update.particle_list(msh)
-
-	    # update interpolation functions values
-	    update.interpolation_functions_values(msh,msetup.interpolation_type)
-	    
-	    # particle mass to grid nodal mass
-	    interpola.mass_to_nodes(msh)
-
-	    # particle momentum to grid nodal momentum
-	    interpola.momentum_to_nodes(msh)
-	     
-	    # impose essential boundary conditions (in fixed nodes set mv=0)
-	    msh.elements[0].n1.momentum=0  
-	    
-	    # Update Stress First Scheme
-	    if msetup.integration_scheme=='USF':
-
-	        # calculate the grid nodal velocity
-	        update.nodal_velocity(msh)
-	    
-	        # calculate particle strain increment
-	        update.particle_strain_increment(msh,msetup.dt)
-	        
-	        # update particle density
-	        update.particle_density(msh,msetup.dt)
-	    
-	        # update particle stress
-	        update.particle_stress(msh,msetup.dt)
-	        
-	    # particle internal force to nodes
-	    interpola.internal_force_to_nodes(msh)
-	    
-	    # particle external forces to nodes
-	    interpola.external_force_to_nodes(msh)
-
-	    # calculate total force in node
-	    integra.total_force_in_nodes(msh, msetup)    
-	    
-	    # impose essential boundary conditions (in fixed nodes set f=m*a=0)
-	    msh.elements[0].n1.f_tot=0
-
-	    # integrate the grid nodal momentum equation
-	    integra.momentum_in_nodes(msh, msetup.dt/2.0 if loop_counter==1 else msetup.dt)
-	 
-	    # update particle velocity
-	    update.particle_velocity(msh,msetup.dt/2.0 if loop_counter==1 else msetup.dt)
-	    
-	    # update particle position
-	    update.particle_position(msh,msetup.dt)
-
-	    # Modified Update Stress Last Scheme
-	    if(msetup.integration_scheme=='MUSL'):
-	        
-	        # recalculate the grid nodal momentum
-	        update.nodal_momentum(msh)
-	        
-	        # impose essential boundary conditions (in fixed nodes v=0)
-	        msh.elements[0].n1.velocity=0
-	        msh.elements[0].n1.momentum=0
-	    
-	    # Modified Update Stress Last or Update Stress Last Scheme
-	    if(msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL'):
-	        
-	        # calculate the grid nodal velocity
-	        update.nodal_velocity(msh)
-	    
-	        # calculate particle strain increment
-	        update.particle_strain_increment(msh,msetup.dt)
-
-	        # update particle density
-	        update.particle_density(msh,msetup.dt)
-	    
-	        # update particle stress
-	        update.particle_stress(msh,msetup.dt)
-	    
-	    # reset all nodal values
-	    update.reset_nodal_vaues(msh)
-
-	    # store data for plot
-	    msetup.solution_array[0].append(it)
-	    
-	    if msetup.solution_field=='velocity':
-	    	msetup.solution_array[1].append(msh.particles[msetup.solution_particle].velocity)
-	    
-	    elif msetup.solution_field=='position':
-	    	msetup.solution_array[1].append(msh.particles[msetup.solution_particle].position)
-	    
-	    # update loop counter
-	    loop_counter+=1
-
-	    # advance in time
-	    it+=msetup.dt
\ No newline at end of file
+
+		profiler.start_step()
+
+		# time step, from the stability condition in adaptive mode
+		if msetup.adaptive_dt:
+			with phase('critical_time_step'):
+				dt = critical_time_step(msh,msetup)
+		else:
+			dt = msetup.dt
+
+		# time step for the velocity update (half step in the first loop,
+		# average of the previous and current steps afterwards)
+		dt_velocity = dt/2.0 if loop_counter==1 else (dt_previous+dt)/2.0
+
+		# boundary conditions of the time step
+		boundary.mesh_boundary(msh,msetup).update(it,dt)
+
+		# advance the model one time step
+		with phase('step'):
+			lost = step(msh,msetup,dt,dt_velocity,profiler)
+
+		# report particles leaving the mesh
+		if len(lost)>nlost:
+			print("warning: %d particles outside the mesh at time %g"%(len(lost),it))
+		nlost = len(lost)
+
+		# store data for plot
+		msetup.solution_array[0].append(it)
+
+		if msetup.solution_field=='velocity':
+			msetup.solution_array[1].append(msh.store.velocity[msetup.solution_particle])
+
+		elif msetup.solution_field=='position':
+			msetup.solution_array[1].append(msh.store.position[msetup.solution_particle])
+
+		# energy and momentum balance
+		conserved = True
+		if monitor is not None:
+			with phase('monitor'):
+				conserved = monitor.update(msh,it,loop_counter-1,dt,dt_velocity)
+
+		if recorder is not None:
+			with phase('recorder'):
+				recorder.record(msh,it,loop_counter-1,monitor.values if monitor is not None else None)
+
+		# stop before saving a checkpoint of a drifting run
+		if not conserved:
+			if recorder is not None:
+				recorder.finish()
+			raise RuntimeError("energy drift %g exceeds the tolerance %g at time %g"
+				%(monitor.values['energy_drift'],monitor.tolerance,it))
+
+		# update loop counter
+		loop_counter+=1
+
+		# advance in time
+		it+=dt
+		dt_previous=dt
+
+		if checkpoint is not None:
+			with phase('checkpoint'):
+				checkpoint.update(msh,msetup,it,loop_counter,nlost,dt_previous,recorder,monitor)
+
+	if recorder is not None:
+		recorder.finish()
+
+def critical_time_step(msh,msetup):
+	r"""
+	Calculates the stable time step from the Courant-Friedrichs-Lewy condition
+
+	.. math::
+		\Delta t = \alpha \min_p \frac{h_p}{c_p + |v_p|}
+
+	where $$h_p$$ is the length of the element containing the particle,
+	$$c_p$$ the wave speed of the particle material and $$\alpha$$ the
+	safety factor msetup.dt_safety_factor. The result is bounded by
+	msetup.dt_min and msetup.dt_max, and is msetup.dt when no particle
+	has a wave speed.
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options
+
+	Returns
+	-------
+	dt : float
+		time step
+	"""
+	dt = cfl_time_step(msh,msetup)
+	if dt==np.inf:
+		return msetup.dt
+
+	return float(min(max(dt,msetup.dt_min),msetup.dt_max))
+
+def cfl_time_step(msh,msetup):
+	"""
+	Calculates the unbounded stable time step of the particles in the mesh
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options
+
+	Returns
+	-------
+	dt : float
+		safety factor times the smallest particle crossing time, inf when
+		no particle has a wave speed or velocity
+	"""
+	ps = msh.store
+
+	# wave speed of each particle
+	c = np.zeros(ps.n)
+	for imat, mat in enumerate(ps.materials):
+		in_material = ps.material_id==imat
+		c[in_material] = mat.wave_speed(ps.density[in_material])
+
+	# particles inside the mesh
+	inside = ps.element>=0
+	speed = c[inside]+np.abs(ps.velocity[inside])
+	h = msh.element_length[ps.element[inside]]
+
+	moving = speed>0
+	if not moving.any():
+		return np.inf
+
+	return float(msetup.dt_safety_factor*np.min(h[moving]/speed[moving]))
+
+def python_step(msh,msetup,dt,dt_velocity,profiler=profiling.DISABLED):
+	"""
+	Advance the model one time step looping over particles and nodes objects
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options
+
+	dt : float
+		time step
+
+	dt_velocity : float
+		time step of the momentum and velocity update
+
+	profiler : phase_profiler
+		profiler timing the phases of the time step
+
+	Returns
+	-------
+	lost : numpy.ndarray
+		ids of the particles outside the mesh
+	"""
+	phase = profiler.phase
+	bc = boundary.mesh_boundary(msh,msetup)
+
+	# reset all nodal values
+	with phase('reset_nodal_values'):
+		update.reset_nodal_vaues(msh)
+
+	# update particles list in each element
+	with phase('particle_list'):
+		lost = update.particle_list(msh)
+
+	# update interpolation functions values
+	with phase('interpolation_functions_values'):
+		update.interpolation_functions_values(msh,msetup.interpolation_type)
+
+	# particle mass to grid nodal mass
+	with phase('mass_to_nodes'):
+		interpola.mass_to_nodes(msh)
+
+	# particle momentum to grid nodal momentum
+	with phase('momentum_to_nodes'):
+		interpola.momentum_to_nodes(msh)
+
+	# impose essential boundary conditions (in constrained nodes set mv)
+	bc.impose_momentum(msh)
+
+	# Update Stress First Scheme
+	if msetup.integration_scheme=='USF':
+		_python_stress_update(msh,dt,phase)
+
+	# particle internal force to nodes
+	with phase('internal_force_to_nodes'):
+		interpola.internal_force_to_nodes(msh)
+
+	# particle external forces to nodes
+	with phase('external_force_to_nodes'):
+		interpola.external_force_to_nodes(msh)
+
+	# impose natural boundary conditions (tractions)
+	bc.impose_forces(msh)
+
+	# calculate total force in node
+	with phase('total_force_in_nodes'):
+		integra.total_force_in_nodes(msh, msetup)
+
+	# impose essential boundary conditions (in constrained nodes set f=m*a)
+	bc.impose_total_force(msh,dt_velocity)
+
+	# integrate the grid nodal momentum equation
+	with phase('momentum_in_nodes'):
+		integra.momentum_in_nodes(msh,dt_velocity)
+
+	# update particle velocity
+	with phase('particle_velocity'):
+		update.particle_velocity(msh,dt_velocity)
+
+	# update particle position
+	with phase('particle_position'):
+		update.particle_position(msh,dt)
+		bc.wrap_particles(msh)
+
+	# Modified Update Stress Last Scheme
+	if(msetup.integration_scheme=='MUSL'):
+
+		# recalculate the grid nodal momentum
+		with phase('nodal_momentum'):
+			update.nodal_momentum(msh)
+
+		# impose essential boundary conditions (in constrained nodes set v and mv)
+		bc.impose_velocity(msh)
+
+	# Modified Update Stress Last or Update Stress Last Scheme
+	if(msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL'):
+		_python_stress_update(msh,dt,phase)
+
+	return lost
+
+def _python_stress_update(msh,dt,phase):
+	"""
+	Nodal velocity, particle strain increment, density and stress over the mesh objects
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	dt : float
+		time step
+
+	phase : function
+		phase method of the profiler
+	"""
+
+	# calculate the grid nodal velocity
+	with phase('nodal_velocity'):
+		update.nodal_velocity(msh)
+
+	# calculate particle strain increment
+	with phase('particle_strain_increment'):
+		update.particle_strain_increment(msh,dt)
+
+	# update particle density
+	with phase('particle_density'):
+		update.particle_density(msh,dt)
+
+	# update particle stress
+	with phase('particle_stress'):
+		update.particle_stress(msh,dt)
+
+def numpy_step(msh,msetup,dt,dt_velocity,profiler=profiling.DISABLED):
+	"""
+	Advance the model one time step operating on the particle and nodal arrays
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options
+
+	dt : float
+		time step
+
+	dt_velocity : float
+		time step of the momentum and velocity update
+
+	profiler : phase_profiler
+		profiler timing the phases of the time step
+
+	Returns
+	-------
+	lost : numpy.ndarray
+		ids of the particles outside the mesh
+	"""
+	phase = profiler.phase
+	bc = boundary.mesh_boundary(msh,msetup)
+
+	# reset all nodal values
+	with phase('reset_nodal_values'):
+		update.reset_nodal_vaues(msh)
+
+	# update the element of each particle
+	with phase('locate_particles'):
+		lost = update.locate_particles(msh)
+
+	# update interpolation functions values
+	with phase('interpolation_functions_values'):
+		update.interpolation_functions_values(msh,msetup.interpolation_type)
+
+	# Update Stress First Scheme
+	if msetup.integration_scheme=='USF':
+
+		# particle mass and momentum to grid
+		with phase('particles_to_nodes'):
+			interpola.particles_to_nodes(msh,('mass','momentum'),msetup.threads)
+
+		# impose essential boundary conditions (in constrained nodes set mv)
+		bc.impose_momentum(msh)
+
+		_numpy_stress_update(msh,dt,phase)
+
+		# particle internal and external forces to grid
+		with phase('particles_to_nodes'):
+			interpola.particles_to_nodes(msh,('f_int','f_ext'),msetup.threads)
+
+	else:
+
+		# all particle quantities to grid
+		with phase('particles_to_nodes'):
+			interpola.particles_to_nodes(msh,threads=msetup.threads)
+
+		# impose essential boundary conditions (in constrained nodes set mv)
+		bc.impose_momentum(msh)
+
+	# impose natural boundary conditions (tractions)
+	bc.impose_forces(msh)
+
+	# calculate total force in node, impose essential boundary conditions
+	# (in constrained nodes set f=m*a) and integrate the grid nodal momentum equation
+	with phase('nodal_update'):
+		integra.nodal_update(msh,msetup,dt_velocity,bc)
+
+	# update particle velocity and position
+	with phase('nodes_to_particles'):
+		update.nodes_to_particles(msh,dt_velocity,dt)
+		bc.wrap_particles(msh)
+
+	# Modified Update Stress Last Scheme
+	if(msetup.integration_scheme=='MUSL'):
+
+		# recalculate the grid nodal momentum
+		with phase('nodal_momentum'):
+			update.nodal_momentum_array(msh,msetup.threads)
+
+		# impose essential boundary conditions (in constrained nodes set v and mv)
+		bc.impose_velocity(msh)
+
+	# Modified Update Stress Last or Update Stress Last Scheme, the nodal
+	# velocity of the USL scheme is the one of nodal_update
+	if(msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL'):
+		_numpy_stress_update(msh,dt,phase,msetup.integration_scheme=='MUSL')
+
+	return lost
+
+def _numpy_stress_update(msh,dt,phase,velocity=True):
+	"""
+	Nodal velocity, particle strain increment, density and stress over the mesh arrays
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	dt : float
+		time step
+
+	phase : function
+		phase method of the profiler
+
+	velocity : bool
+		calculate the nodal velocity, False when it is up to date
+	"""
+
+	# calculate the grid nodal velocity
+	if velocity:
+		with phase('nodal_velocity'):
+			update.nodal_velocity(msh)
+
+	# calculate particle strain increment
+	with phase('particle_strain_increment'):
+		update.particle_strain_increment_array(msh,dt)
+
+	# update particle density
+	with phase('particle_density'):
+		update.particle_density(msh,dt)
+
+	# update particle stress
+	with phase('particle_stress'):
+		update.particle_stress(msh,dt)
+
+def numba_step(msh,msetup,dt,dt_velocity,profiler=profiling.DISABLED):
+	"""
+	Advance the model one time step with Numba compiled kernels over the mesh arrays
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	msetup : model_setup
+		a model_setup object containing the model options
+
+	dt : float
+		time step
+
+	dt_velocity : float
+		time step of the momentum and velocity update
+
+	profiler : phase_profiler
+		profiler timing the phases of the time step
+
+	Returns
+	-------
+	lost : numpy.ndarray
+		ids of the particles outside the mesh
+	"""
+	ps = msh.store
+	grid = msh.grid
+	conn = msh.connectivity
+	phase = profiler.phase
+	bc = boundary.mesh_boundary(msh,msetup)
+
+	# reset all nodal values
+	with phase('reset_nodal_values'):
+		update.reset_nodal_vaues(msh)
+
+	# update the element of each particle
+	with phase('locate_particles'):
+		nbk.locate_kernel(ps.position,grid.x,msh.element_length[0],msh.uniform,ps.element)
+		msh.active_elements, msh.active_nodes = nbk.active_set_kernel(ps.element,conn,msh.nelem,grid.n)
+
+	# update interpolation functions values
+	if msetup.interpolation_type!='linear':
+		raise ValueError("the numba engine supports the 'linear' interpolation type")
+	with phase('interpolation_functions_values'):
+		nbk.shape_kernel(ps.position,ps.element,conn,grid.x,msh.element_length,ps.N1,ps.N2,ps.dN1,ps.dN2)
+
+	# particles sorted by element for the parallel particle to grid transfer
+	order = None
+	if msetup.threads>1:
+		nbk.set_threads(msetup.threads)
+		with phase('element_order'):
+			order = nbk.element_order_kernel(ps.element,msh.nelem)
+
+	# particle mass and momentum to grid
+	with phase('particles_to_nodes'):
+		_numba_p2g(msh,order,grid.mass,True,False)
+
+	# impose essential boundary conditions (in constrained nodes set mv)
+	bc.impose_momentum(msh)
+
+	# Update Stress First Scheme
+	if msetup.integration_scheme=='USF':
+		_numba_stress_update(msh,dt,phase)
+
+	# particle internal and external forces to grid
+	with phase('particles_to_nodes'):
+		_numba_p2g(msh,order,grid.mass,False,True)
+
+	# impose natural boundary conditions (tractions)
+	bc.impose_forces(msh)
+
+	# calculate total force in node, impose essential boundary conditions
+	# (in constrained nodes set f=m*a) and integrate the grid nodal momentum equation
+	with phase('nodal_update'):
+		nbk.nodal_update_kernel(msh.active_nodes,bc.constrained_nodes,bc.velocity_end,msetup.damping_local_alpha,
+			dt_velocity,grid.mass,grid.momentum,grid.f_int,grid.f_ext,grid.f_damp,grid.f_tot,grid.velocity)
+
+	# update particle velocity and position
+	with phase('nodes_to_particles'):
+		nbk.g2p_kernel(ps.element,conn,ps.N1,ps.N2,grid.mass,grid.f_tot,grid.momentum,
+			ps.velocity,ps.position,dt_velocity,dt)
+		bc.wrap_particles(msh)
+
+	# Modified Update Stress Last Scheme
+	if(msetup.integration_scheme=='MUSL'):
+
+		# recalculate the grid nodal momentum
+		with phase('nodal_momentum'):
+			grid.momentum[:]=0
+			_numba_p2g(msh,order,np.zeros(grid.n),True,False)
+
+		# impose essential boundary conditions (in constrained nodes set v and mv)
+		bc.impose_velocity(msh)
+
+	# Modified Update Stress Last or Update Stress Last Scheme, the nodal
+	# velocity of the USL scheme is the one of nodal_update_kernel
+	if(msetup.integration_scheme=='MUSL' or msetup.integration_scheme=='USL'):
+		_numba_stress_update(msh,dt,phase,msetup.integration_scheme=='MUSL')
+
+	return np.flatnonzero(ps.element<0)
+
+def _numba_p2g(msh,order,gmass,mass_momentum,forces):
+	"""
+	Interpolate particle quantities to the nodal arrays with compiled kernels
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	order : tuple
+		particles sorted by element and element offsets (element_order_kernel)
+		for the parallel transfer, None for the serial transfer
+
+	gmass : numpy.ndarray
+		nodal mass array receiving the mass
+
+	mass_momentum : bool
+		accumulate mass and momentum
+
+	forces : bool
+		accumulate internal and external forces
+	"""
+	ps = msh.store
+	grid = msh.grid
+
+	if order is None:
+		nbk.p2g_kernel(ps.element,msh.connectivity,ps.N1,ps.N2,ps.dN1,ps.dN2,ps.mass,ps.velocity,ps.stress,
+			ps.density,ps.f_ext,gmass,grid.momentum,grid.f_int,grid.f_ext,mass_momentum,forces)
+	else:
+		nbk.p2g_colored_kernel(order[0],order[1],msh.connectivity,ps.N1,ps.N2,ps.dN1,ps.dN2,ps.mass,ps.velocity,
+			ps.stress,ps.density,ps.f_ext,gmass,grid.momentum,grid.f_int,grid.f_ext,mass_momentum,forces)
+
+def _numba_stress_update(msh,dt,phase,velocity=True):
+	"""
+	Nodal velocity, particle strain increment, density and stress with compiled kernels
+
+	Arguments
+	---------
+
+	msh: mesh
+		a mesh object
+
+	dt : float
+		time step
+
+	phase : function
+		phase method of the profiler
+
+	velocity : bool
+		calculate the nodal velocity, False when it is up to date
+	"""
+	ps = msh.store
+	grid = msh.grid
+
+	# calculate the grid nodal velocity
+	if velocity:
+		with phase('nodal_velocity'):
+			nbk.nodal_velocity_kernel(msh.active_nodes,grid.mass,grid.momentum,grid.velocity)
+
+	# calculate particle strain increment and update particle density
+	with phase('particle_strain_increment'):
+		nbk.strain_density_kernel(ps.element,msh.connectivity,ps.dN1,ps.dN2,grid.velocity,dt,ps.dstrain,ps.density)
+
+	# update particle stress, materials without compiled kernel use their array update
+	with phase('particle_stress'):
+		codes, params = nbk.material_codes(ps.materials)
+		nbk.stress_kernel(codes,params,ps.material_id,ps.dstrain,dt,ps.stress)
+		for imat, ids in ps.material_groups():
+			if codes[imat]==nbk.MATERIAL_UNKNOWN:
+				update.material_stress(msh,imat,ids,dt)
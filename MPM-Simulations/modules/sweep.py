@@ -0,0 +1,361 @@
+"""
+
+This module runs parameter sweeps of independent MPM cases in a process pool
+
+Each case is described by a dictionary of parameters, built into a mesh
+and a model_setup and solved with solver.explicit_solution in a worker
+process. The solution of every case is appended to a CSV results file,
+which allows resuming an interrupted sweep. Cases raising an error are
+appended to a CSV failures file and solved again when the sweep resumes.
+
+"""
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+
+import material
+import mesh
+import setup
+import solver
+
+# default parameters of a case
+DEFAULT_PARAMETERS = {
+    'L': 25.0,                   # bar length
+    'nelem': 20,                 # number of elements
+    'ppelem': 2,                 # particles per element
+    'E': 100.0,                  # Young's modulus
+    'density': 1.0,              # density
+    'velocity': 0.0,             # initial particle velocity
+    'interpolation_type': 'linear',
+    'integration_scheme': 'MUSL',
+    'engine': 'python',
+    'time': 1.0,
+    'dt': 0.01,
+    'damping_local_alpha': 0.0,
+    'solution_particle': 0,
+    'solution_field': 'velocity',
+}
+
+# environment variables limiting the threads of numerical libraries
+THREAD_VARIABLES = ('OMP_NUM_THREADS','OPENBLAS_NUM_THREADS','MKL_NUM_THREADS',
+                    'NUMEXPR_NUM_THREADS','NUMBA_NUM_THREADS')
+
+def parameter_grid(**values):
+    """
+    Returns the list of cases formed by all combinations of parameter values
+
+    Arguments
+    ---------
+    values: lists
+        values of each parameter, e.g. nelem=[10,20], E=np.linspace(100,200,5),
+        numpy scalars are converted to Python numbers
+    """
+    names = sorted(values)
+    return [dict(zip(names,map(_python_value,combination)))
+            for combination in itertools.product(*(values[name] for name in names))]
+
+def _python_value(value):
+    """
+    Returns numpy scalars as Python numbers, other values unchanged
+    """
+    return value.item() if isinstance(value,np.generic) else value
+
+def _json_value(value):
+    """
+    Converts numpy scalars in the parameters of case_key
+    """
+    if isinstance(value,np.generic):
+        return value.item()
+    raise TypeError("parameter of type %s is not JSON serializable"%type(value).__name__)
+
+def case_key(params):
+    """
+    Returns a string identifying a case from its parameters
+
+    Arguments
+    ---------
+    params: dict
+        case parameters
+    """
+    return json.dumps(params,sort_keys=True,default=_json_value)
+
+def build_case(params):
+    """
+    Builds the mesh and model setup of a case
+
+    Arguments
+    ---------
+    params: dict
+        case parameters, missing ones take the DEFAULT_PARAMETERS values
+
+    Returns
+    -------
+    msh: mesh
+        a mesh object with particles
+    msetup: model_setup
+        a model_setup object
+    """
+    p = dict(DEFAULT_PARAMETERS)
+    p.update(params)
+
+    msh = mesh.mesh_1D(p['L'],p['nelem'])
+    msh.put_particles_in_all_mesh_elements(p['ppelem'],material.linear_elastic(p['E'],p['density']))
+    msh.store.velocity[:] = p['velocity']
+
+    msetup = setup.model_setup()
+    for name in ('interpolation_type','integration_scheme','engine','time','dt',
+                 'damping_local_alpha','solution_particle','solution_field'):
+        setattr(msetup,name,p[name])
+
+    return msh, msetup
+
+def run_case(params,builder=build_case):
+    """
+    Solves one case
+
+    Arguments
+    ---------
+    params: dict
+        case parameters
+    builder: function
+        function building the mesh and model setup from the parameters
+
+    Returns
+    -------
+    params: dict
+        case parameters
+    solution_array: list
+        solution of the case, [time, field]
+    runtime: float
+        solution time in seconds
+    """
+    msh, msetup = builder(params)
+
+    start = time.perf_counter()
+    solver.explicit_solution(msh,msetup)
+    runtime = time.perf_counter()-start
+
+    return params, msetup.solution_array, runtime
+
+def _pin_threads(threads):
+    """
+    Limits the threads used by numerical libraries in a worker process
+
+    Arguments
+    ---------
+    threads: int
+        threads per worker
+    """
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads)
+
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(threads)
+    except ImportError:
+        pass
+
+    try:
+        import numba
+        numba.set_num_threads(min(threads,numba.config.NUMBA_NUM_THREADS))
+    except ImportError:
+        pass
+
+def completed_cases(results_file):
+    """
+    Returns the keys of the cases stored in a results file
+
+    Arguments
+    ---------
+    results_file: string
+        path of the CSV results file
+    """
+    if not os.path.exists(results_file):
+        return set()
+
+    with open(results_file,newline='') as f:
+        return {row['case'] for row in csv.DictReader(f)}
+
+def failures_path(results_file):
+    """
+    Returns the path of the failures file of a results file
+
+    Arguments
+    ---------
+    results_file: string
+        path of the CSV results file
+    """
+    root, ext = os.path.splitext(results_file)
+    return root+'_failures'+(ext or '.csv')
+
+def run_sweep(cases,results_file,workers=None,threads_per_worker=1,builder=build_case,verbose=True,
+              failures_file=None):
+    """
+    Solves a list of cases in a process pool and stores their solutions in a table
+
+    The results file has one row per stored solution point with the
+    columns case (case key), the case parameters, runtime, time and value.
+    Cases already in the results file are not solved again. A case
+    raising an error does not stop the sweep, it is appended to the
+    failures file with the columns case, the case parameters and error.
+
+    The workers are started with the 'spawn' method, which imports the
+    main module in every worker: scripts calling run_sweep must do it
+    under an ``if __name__=='__main__':`` block.
+
+    Arguments
+    ---------
+    cases: list
+        case parameters dictionaries, e.g. from parameter_grid
+    results_file: string
+        path of the CSV results file
+    workers: int
+        number of worker processes, defaults to the number of CPUs
+    threads_per_worker: int
+        threads allowed to numerical libraries in each worker
+    builder: function
+        function building the mesh and model setup from the parameters,
+        it must be defined at module level to be sent to the workers
+    verbose: bool
+        print the progress and throughput of the sweep
+    failures_file: string
+        path of the CSV failures file, failures_path(results_file) by default
+
+    Returns
+    -------
+    throughput: float
+        solved cases per minute
+    """
+    workers = workers or os.cpu_count()
+    failures_file = failures_file or failures_path(results_file)
+
+    # cases still to solve
+    done = completed_cases(results_file)
+    pending = [params for params in cases if case_key(params) not in done]
+    if verbose:
+        print("%d cases, %d already solved, %d workers"%(len(cases),len(cases)-len(pending),workers))
+    if not pending:
+        return 0.0
+
+    names = sorted(set(itertools.chain.from_iterable(cases)))
+    fieldnames = ['case']+names+['runtime','time','value']
+    new_file = not os.path.exists(results_file) or os.path.getsize(results_file)==0
+
+    # a resumed sweep keeps the columns of the existing table
+    if not new_file:
+        with open(results_file,newline='') as f:
+            header = next(csv.reader(f))
+        if set(fieldnames)-set(header):
+            raise ValueError("cases have parameters not present in the results file %s"%results_file)
+        fieldnames = header
+
+    # the thread limits are inherited by the spawned workers
+    saved = {name: os.environ.get(name) for name in THREAD_VARIABLES}
+    for name in THREAD_VARIABLES:
+        os.environ[name] = str(threads_per_worker)
+
+    start = time.perf_counter()
+    solved = 0
+    failed = 0
+    try:
+        with open(results_file,'a',newline='') as f, \
+             ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_pin_threads,
+                                 initargs=(threads_per_worker,)) as executor:
+
+            writer = csv.DictWriter(f,fieldnames=fieldnames)
+            if new_file:
+                writer.writeheader()
+
+            futures = {executor.submit(run_case,params,builder): params for params in pending}
+            for future in as_completed(futures):
+                try:
+                    params, solution_array, runtime = future.result()
+                except Exception as error:
+                    params = futures[future]
+                    _write_failure(failures_file,names,params,error)
+                    failed += 1
+                    if verbose:
+                        print("case %s failed: %s"%(case_key(params),_error_message(error)))
+                    continue
+
+                # write all rows of the case at once
+                key = case_key(params)
+                rows = [dict(params,case=key,runtime=runtime,time=t,value=v)
+                        for t, v in zip(*solution_array)]
+                writer.writerows(rows)
+                f.flush()
+
+                solved += 1
+                if verbose:
+                    elapsed = time.perf_counter()-start
+                    print("%d/%d cases solved, %.1f cases/min"%(solved,len(pending),60*solved/elapsed))
+
+        if verbose and failed:
+            print("%d cases failed, see %s"%(failed,failures_file))
+
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name,None)
+            else:
+                os.environ[name] = value
+
+    return 60*solved/(time.perf_counter()-start)
+
+def _error_message(error):
+    """
+    Returns the type and message of an exception
+    """
+    return "%s: %s"%(type(error).__name__,error)
+
+def _write_failure(failures_file,names,params,error):
+    """
+    Appends a failed case to the failures file
+
+    Arguments
+    ---------
+    failures_file: string
+        path of the CSV failures file
+    names: list
+        parameter names of the sweep
+    params: dict
+        case parameters
+    error: Exception
+        error raised by the case
+    """
+    new_file = not os.path.exists(failures_file) or os.path.getsize(failures_file)==0
+    with open(failures_file,'a',newline='') as f:
+        writer = csv.DictWriter(f,fieldnames=['case']+names+['error'],extrasaction='ignore')
+        if new_file:
+            writer.writeheader()
+        writer.writerow(dict(params,case=case_key(params),error=_error_message(error)))
+
+def read_results(results_file):
+    """
+    Reads a results file as a table
+
+    Arguments
+    ---------
+    results_file: string
+        path of the CSV results file
+
+    Returns
+    -------
+    table: dict
+        column name to list of values (strings)
+    """
+    with open(results_file,newline='') as f:
+        reader = csv.DictReader(f)
+        table = {name: [] for name in reader.fieldnames}
+        for row in reader:
+            for name in table:
+                table[name].append(row[name])
+    return table
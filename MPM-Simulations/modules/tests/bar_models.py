@@ -0,0 +1,52 @@
+"""
+
+Vibrating bar models shared by the tests
+
+"""
+import numpy as np
+
+import boundary
+import material
+import mesh
+import setup
+
+SCHEMES = ('USF','USL','MUSL')
+
+def prescribed_velocity(t):
+    return 0.01*np.sin(t)
+
+# boundary conditions of the tests, by name
+CONDITIONS = {
+    'fixed': lambda bc: bc.fix(20),
+    'velocity': lambda bc: (bc.fix(0),bc.prescribe_velocity(-1,prescribed_velocity)),
+    'traction': lambda bc: (bc.fix(0),bc.traction(-1,-0.5)),
+    'periodic': lambda bc: bc.periodic(0,-1),
+}
+
+def build(engine='numpy',scheme='MUSL',interpolation_type='linear',conditions=None,time=0.5):
+    """
+    Returns a vibrating bar of 20 elements and its model setup
+    """
+    msh = mesh.mesh_1D(25,20)
+    msh.put_particles_in_all_mesh_elements(2,material.linear_elastic(100,1))
+    msh.store.velocity[:] = 0.1*np.sin(np.pi*msh.store.position/50)
+
+    msetup = setup.model_setup()
+    msetup.engine = engine
+    msetup.integration_scheme = scheme
+    msetup.interpolation_type = interpolation_type
+    msetup.time = time
+    msetup.dt = 0.01
+    msetup.damping_local_alpha = 0.05
+    msetup.solution_field = 'velocity'
+    if conditions is not None:
+        msetup.boundary_conditions = boundary.boundary_conditions()
+        CONDITIONS[conditions](msetup.boundary_conditions)
+    return msh, msetup
+
+def state(msh):
+    """
+    Returns the particle velocities, positions and stresses
+    """
+    ps = msh.store
+    return np.concatenate((ps.velocity,ps.position,ps.stress))
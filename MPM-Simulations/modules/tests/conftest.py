@@ -0,0 +1,9 @@
+"""
+
+Test configuration, the modules are imported by name as in the simulations
+
+"""
+import os
+import sys
+
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
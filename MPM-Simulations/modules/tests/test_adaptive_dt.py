@@ -0,0 +1,62 @@
+"""
+
+Tests of the adaptive time step
+
+"""
+import numpy as np
+import pytest
+
+import material
+import solver
+from bar_models import build
+
+def test_critical_time_step_of_the_wave_speed():
+    msh, msetup = build()
+    msh.store.velocity[:] = 0
+    msetup.dt_safety_factor = 0.5
+
+    # element length 1.25 and wave speed sqrt(100/1)
+    assert solver.critical_time_step(msh,msetup)==pytest.approx(0.5*1.25/10)
+
+    # the particle velocity shortens the crossing time
+    msh.store.velocity[3] = 2.0
+    assert solver.critical_time_step(msh,msetup)==pytest.approx(0.5*1.25/12)
+
+    # bounds of the time step
+    msetup.dt_max = 0.01
+    assert solver.critical_time_step(msh,msetup)==0.01
+    msetup.dt_max = np.inf
+    msetup.dt_min = 0.1
+    assert solver.critical_time_step(msh,msetup)==0.1
+
+def test_fixed_time_step_without_wave_speed():
+    msh, msetup = build()
+    msh.store.velocity[:] = 0
+    msh.store.materials[0] = material.newtonian_fluid(0.1,1)
+    assert solver.critical_time_step(msh,msetup)==msetup.dt
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_adaptive_run_is_stable_and_follows_the_condition(engine):
+    msh, msetup = build(engine,time=5.0)
+    msetup.dt = 1.0
+    msetup.adaptive_dt = True
+    msetup.dt_safety_factor = 0.9
+    solver.explicit_solution(msh,msetup)
+
+    dt = np.diff(msetup.solution_array[0])
+    assert (dt<=0.9*1.25/10).all() and (dt>0.9*1.25/10.2).all()
+    assert np.abs(msh.store.velocity).max()<=0.1
+
+def test_adaptive_run_with_the_time_step_of_the_condition_equals_fixed_run():
+    msh, msetup = build(time=0.2)
+    msh.store.velocity[:] = 0
+    msh.store.f_ext[:] = 0
+    msetup.adaptive_dt = True
+    solver.explicit_solution(msh,msetup)
+
+    msh_fixed, msetup_fixed = build(time=0.2)
+    msh_fixed.store.velocity[:] = 0
+    msetup_fixed.dt = 0.5*1.25/10
+    solver.explicit_solution(msh_fixed,msetup_fixed)
+
+    assert msetup.solution_array==msetup_fixed.solution_array
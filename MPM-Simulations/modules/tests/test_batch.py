@@ -0,0 +1,95 @@
+"""
+
+Tests of the batched solution against individual runs of the cases
+
+"""
+import numpy as np
+import pytest
+
+import batch
+import material
+import solver
+from bar_models import CONDITIONS, SCHEMES, build
+
+def run_cases(cases,scheme='MUSL'):
+    """
+    Runs the cases (conditions, time step factor, time, adaptive) one
+    by one and in a batch, returns the individual runs and the batch state
+    """
+    def case_setup(conditions,factor,time,adaptive):
+        msh, msetup = build(scheme=scheme,conditions=conditions,time=time)
+        msetup.dt *= factor
+        msetup.adaptive_dt = adaptive
+        return msh, msetup
+
+    individual = []
+    for case in cases:
+        msh, msetup = case_setup(*case)
+        solver.explicit_solution(msh,msetup)
+        individual.append((msh,msetup))
+
+    msh = build()[0]
+    msetups = [case_setup(*case)[1] for case in cases]
+    bs = batch.explicit_solution_batch(msh,msetups,[msh.store.materials[0]]*len(cases))
+    return individual, msetups, bs
+
+def assert_same(individual,msetups,bs):
+    assert bs.ncase==len(individual)
+    for k, (msh_k, msetup_k) in enumerate(individual):
+        assert msetups[k].solution_array==msetup_k.solution_array
+        assert np.array_equal(bs.position[k],msh_k.store.position)
+        assert np.array_equal(bs.velocity[k],msh_k.store.velocity)
+        assert np.array_equal(bs.stress[k],msh_k.store.stress)
+
+@pytest.mark.parametrize('scheme',SCHEMES)
+def test_batch_equals_individual_runs(scheme):
+    names = [None]+sorted(CONDITIONS)
+    cases = [(conditions,1+k%2,0.5,False) for k, conditions in enumerate(names)]
+    assert_same(*run_cases(cases,scheme))
+
+def test_finished_cases_leave_the_batch():
+    cases = [(None,1,0.5,False),('fixed',1,0.1,False),('traction',2,0.3,False),(None,1,-1,False)]
+    individual, msetups, bs = run_cases(cases)
+    assert_same(individual,msetups,bs)
+    steps = [len(msetup.solution_array[0]) for msetup in msetups]
+    assert steps[0]>steps[2]>steps[1]>steps[3]==0
+
+def test_adaptive_time_step():
+    cases = [(None,1,0.5,True),('velocity',1,0.5,False),('fixed',1,0.3,True)]
+    individual, msetups, bs = run_cases(cases)
+    assert_same(individual,msetups,bs)
+    dt = np.diff(msetups[0].solution_array[0])
+    assert (dt>msetups[1].dt).all() and len(np.unique(dt))>1
+
+def test_fluid_and_elastic_cases():
+    msh = build()[0]
+    materials = [material.linear_elastic(100,1),material.newtonian_fluid(0.5,2),material.linear_elastic(50,3)]
+    msetups = [build(time=0.2)[1] for imat in materials]
+    bs = batch.explicit_solution_batch(msh,msetups,materials)
+
+    for imat, msetup, k in zip(materials,msetups,range(3)):
+        msh_k, msetup_k = build(time=0.2)
+        msh_k.store.materials[0] = imat
+        msh_k.store.mass[:] *= imat.density
+        msh_k.store.density[:] = imat.density
+        solver.explicit_solution(msh_k,msetup_k)
+        np.testing.assert_allclose(bs.velocity[k],msh_k.store.velocity,rtol=1e-12,atol=1e-15)
+
+@pytest.mark.parametrize('option, value',(('engine','numba'),('threads',2)))
+def test_unsupported_options_raise(option,value):
+    msh, msetup = build()
+    setattr(msetup,option,value)
+    with pytest.raises(ValueError):
+        batch.explicit_solution_batch(msh,[build()[1],msetup],[msh.store.materials[0]]*2)
+
+def test_cpgimp_cases():
+    msh = build()[0]
+    msetups = [build(interpolation_type='cpGIMP',conditions=conditions)[1] for conditions in (None,'traction')]
+    bs = batch.explicit_solution_batch(msh,msetups,[msh.store.materials[0]]*2)
+
+    assert bs.support.shape[2]==4
+    for k, conditions in enumerate((None,'traction')):
+        msh_k, msetup_k = build(interpolation_type='cpGIMP',conditions=conditions)
+        solver.explicit_solution(msh_k,msetup_k)
+        np.testing.assert_allclose(bs.velocity[k],msh_k.store.velocity,rtol=0,atol=1e-15)
+        np.testing.assert_allclose(bs.stress[k],msh_k.store.stress,rtol=0,atol=1e-13)
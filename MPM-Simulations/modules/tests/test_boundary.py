@@ -0,0 +1,82 @@
+"""
+
+Tests of the boundary conditions
+
+"""
+import numpy as np
+import pytest
+
+import boundary
+import solver
+from bar_models import build, prescribed_velocity
+
+def test_compiled_node_sets():
+    msh = build()[0]
+    conditions = boundary.boundary_conditions()
+    conditions.fix([0,3])
+    conditions.prescribe_velocity([3,-1],np.array([0.5,0.25]))
+    conditions.traction(-1,1.0)
+    conditions.traction([-1,5],prescribed_velocity)
+    bc = conditions.compile(msh)
+    bc.update(0.5,0.1)
+
+    # the last velocity condition of a node is used, tractions are added
+    velocity = dict(zip(bc.constrained_nodes.tolist(),bc.velocity_end.tolist()))
+    assert velocity=={0: 0.0,3: 0.5,20: 0.25}
+    force = np.zeros(msh.grid.n)
+    np.add.at(force,bc.traction_nodes,bc.traction_force)
+    assert force[20]==pytest.approx(1.0+prescribed_velocity(0.5)) and force[5]==pytest.approx(prescribed_velocity(0.5))
+
+def test_periodic_sets_must_pair():
+    with pytest.raises(ValueError):
+        boundary.boundary_conditions().periodic([0,1],[20])
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_fixed_node(engine):
+    msh, msetup = build(engine,conditions='fixed')
+    solver.explicit_solution(msh,msetup)
+    assert msh.grid.velocity[20]==0 and msh.grid.momentum[20]==0
+    assert msh.grid.velocity[0]!=0
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_prescribed_velocity(engine):
+    msh, msetup = build(engine,conditions='velocity')
+    solver.explicit_solution(msh,msetup)
+    t_end = msetup.solution_array[0][-1]+msetup.dt
+    assert msh.grid.velocity[0]==0
+    assert msh.grid.velocity[-1]==prescribed_velocity(t_end)
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_traction_impulse(engine):
+    # a traction pulling the free end changes the momentum of the bar by
+    # its impulse (half a time step in the first loop)
+    msh, msetup = build(engine)
+    msh.store.velocity[:] = 0
+    msetup.damping_local_alpha = 0
+    msetup.boundary_conditions = boundary.boundary_conditions()
+    msetup.boundary_conditions.traction(-1,0.5)
+    msetup.time = 0.1
+    solver.explicit_solution(msh,msetup)
+    steps = len(msetup.solution_array[0])
+    momentum = np.dot(msh.store.mass,msh.store.velocity)
+    assert momentum==pytest.approx(0.5*(steps-0.5)*msetup.dt,rel=1e-10)
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_periodic_bar(engine):
+    # particles leaving a periodic bar enter it from the other end
+    msh, msetup = build(engine,conditions='periodic')
+    msh.store.velocity[:] = 5.0
+    msetup.damping_local_alpha = 0
+    solver.explicit_solution(msh,msetup)
+    position = msh.store.position
+    assert ((position>=0) & (position<25)).all()
+    assert np.allclose(msh.store.velocity,5.0)
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_changed_conditions_are_compiled_again(engine):
+    msh, msetup = build(engine,conditions='fixed',time=0.1)
+    solver.explicit_solution(msh,msetup)
+    msetup.boundary_conditions.fix(0)
+    msetup.solution_array = [[],[]]
+    solver.explicit_solution(msh,msetup)
+    assert msh.grid.velocity[0]==0 and msh.grid.velocity[20]==0
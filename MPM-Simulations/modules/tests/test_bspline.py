@@ -0,0 +1,60 @@
+"""
+
+Tests of the B-spline interpolation functions
+
+"""
+import numpy as np
+import pytest
+
+import shape
+import solver
+from bar_models import build, state
+
+@pytest.mark.parametrize('degree',(2,3))
+def test_bspline_table_partition_of_unity(degree):
+    L, nnodes = 0.5, 21
+    xp = np.linspace(0,10,997,endpoint=False)
+    nodes, N, dN = shape.bspline_table(xp,0.0,L,nnodes,degree)
+
+    assert nodes.shape==N.shape==dN.shape==(len(xp),degree+1)
+    assert nodes.min()>=0 and nodes.max()<nnodes
+    assert (N>=0).all()
+    np.testing.assert_allclose(N.sum(axis=1),1,rtol=0,atol=1e-14)
+    np.testing.assert_allclose(dN.sum(axis=1),0,rtol=0,atol=1e-12)
+
+    # linear fields are reproduced away from the grid ends
+    interior = (xp>degree*L) & (xp<10-degree*L)
+    xn = L*nodes[interior]
+    np.testing.assert_allclose((N[interior]*xn).sum(axis=1),xp[interior],rtol=0,atol=1e-12)
+    np.testing.assert_allclose((dN[interior]*xn).sum(axis=1),1,rtol=0,atol=1e-12)
+
+@pytest.mark.parametrize('degree',(2,3))
+def test_bspline_gradient_is_the_derivative(degree):
+    s = np.linspace(-2.5,2.5,1001)
+    h = 1e-6
+    numeric = (shape.NiBspline_array(s+h,degree)-shape.NiBspline_array(s-h,degree))/(2*h)
+    np.testing.assert_allclose(shape.dNiBspline_array(s,degree,1.0),numeric,rtol=0,atol=1e-6)
+
+@pytest.mark.parametrize('interpolation_type',('quadratic_bspline','cubic_bspline'))
+def test_bspline_bar_runs_with_the_numpy_engine(interpolation_type,capsys):
+    msh, msetup = build('numpy',interpolation_type=interpolation_type,time=2.0)
+    mass = msh.store.mass.sum()
+    solver.explicit_solution(msh,msetup)
+
+    # the particles reach the nodes of the neighbouring elements
+    assert msh.store.support.shape[1]==shape.BSPLINE_DEGREE[interpolation_type]+1
+    assert msh.grid.mass.sum()==pytest.approx(mass)
+    assert np.abs(msh.store.velocity).max()<0.1
+
+    # the other engines fall back to the numpy engine
+    msh_python, msetup_python = build('python',interpolation_type=interpolation_type,time=2.0)
+    solver.explicit_solution(msh_python,msetup_python)
+    assert 'using the numpy engine' in capsys.readouterr().out
+    assert np.array_equal(state(msh_python),state(msh))
+
+def test_bspline_requires_a_uniform_mesh():
+    msh, msetup = build('numpy',interpolation_type='quadratic_bspline')
+    msh.grid.x[5] += 0.3
+    msh.update_geometry()
+    with pytest.raises(ValueError):
+        solver.explicit_solution(msh,msetup)
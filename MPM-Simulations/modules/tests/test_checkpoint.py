@@ -0,0 +1,124 @@
+"""
+
+Tests of the checkpoints and of the resumed runs
+
+"""
+import numpy as np
+import pytest
+
+import boundary
+import checkpoint
+import material
+import mesh
+import monitor
+import recorder
+import solver
+from bar_models import build, prescribed_velocity, state
+
+@pytest.mark.parametrize('file_format',('npy','hdf5'))
+def test_checkpoint_resume_is_bit_for_bit(tmp_path,file_format):
+    if file_format=='hdf5':
+        pytest.importorskip('h5py')
+
+    def new_recorder(name):
+        path = tmp_path/name if file_format=='npy' else tmp_path/(name+'.h5')
+        return recorder.solution_recorder(('velocity',),('momentum',),capacity=3,path=str(path),
+                                          file_format=file_format,scalar_fields=monitor.FIELDS)
+
+    # uninterrupted run
+    msh, msetup = build(conditions='velocity')
+    reference = new_recorder('reference')
+    reference_monitor = monitor.conservation_monitor()
+    solver.explicit_solution(msh,msetup,recorder=reference,monitor=reference_monitor)
+
+    # run saving checkpoints, resumed from the last one into the same directory
+    path = str(tmp_path/'checkpoint.npz')
+    msh_run, msetup_run = build(conditions='velocity')
+    solver.explicit_solution(msh_run,msetup_run,recorder=new_recorder('run'),
+                             monitor=monitor.conservation_monitor(),
+                             checkpoint=checkpoint.checkpointer(path,every=7))
+    resumed = new_recorder('run')
+    resumed_monitor = monitor.conservation_monitor()
+    msh_resumed, msetup_resumed = checkpoint.resume(path,recorder=resumed,monitor=resumed_monitor)
+
+    assert np.array_equal(state(msh_resumed),state(msh))
+    assert np.array_equal(msh_resumed.grid.momentum,msh.grid.momentum)
+    assert msetup_resumed.solution_array==msetup.solution_array
+    assert resumed.nrecords==reference.nrecords
+    for name in ['time','particle_velocity','node_momentum']+list(monitor.FIELDS):
+        assert np.array_equal(resumed.history(name),reference.history(name))
+    for name in monitor.FIELDS:
+        assert np.array_equal(resumed_monitor.history(name),reference_monitor.history(name))
+
+def test_checkpoint_is_read_without_pickle(tmp_path):
+    msh, msetup = build()
+    plastic = material.elastoplastic(100,0.5,10,1)
+    for ip in range(0,msh.store.n,2):
+        msh.store.set_material(ip,plastic)
+    msetup.engine = 'numba'
+    msetup.adaptive_dt = True
+    msetup.time = 0.2
+    solver.explicit_solution(msh,msetup)
+    path = str(tmp_path/'checkpoint.npz')
+    checkpoint.save_checkpoint(path,msh,msetup,0.3,25)
+
+    with np.load(path,allow_pickle=False) as data:
+        assert all(data[name].dtype!=object for name in data.files)
+
+    msh_loaded, msetup_loaded, loop = checkpoint.load_checkpoint(path)
+    mat = msh_loaded.store.materials[1]
+    assert type(mat) is material.elastoplastic
+    assert (mat.E,mat.sigma_y,mat.H,mat.density)==(100,0.5,10,1)
+    assert np.array_equal(msh_loaded.store.material_id,msh.store.material_id)
+    assert msh.store.state[1]
+    for name, value in msh.store.state[1].items():
+        assert np.array_equal(msh_loaded.store.state[1][name],value)
+    assert np.array_equal(msh_loaded.active_elements,msh.active_elements)
+    assert np.array_equal(msh_loaded.active_nodes,msh.active_nodes)
+    for name in ('engine','adaptive_dt','interpolation_type','integration_scheme','dt','time','dt_max'):
+        assert getattr(msetup_loaded,name)==getattr(msetup,name)
+    assert msetup_loaded.solution_array==msetup.solution_array
+    assert (loop['it'],loop['loop_counter'])==(0.3,25)
+
+def test_boundary_conditions_are_restored(tmp_path):
+    msh, msetup = build(conditions='velocity')
+    msetup.boundary_conditions.traction([-2,-3],np.array([0.1,0.2]))
+    msetup.boundary_conditions.periodic(0,-1)
+    path = str(tmp_path/'checkpoint.npz')
+    checkpoint.save_checkpoint(path,msh,msetup,0,1)
+
+    conditions = checkpoint.load_checkpoint(path)[1].boundary_conditions
+    saved = msetup.boundary_conditions
+    assert conditions.constraints[1][1] is prescribed_velocity
+    for loaded, original in zip(conditions.constraints+conditions.tractions,saved.constraints+saved.tractions):
+        assert np.array_equal(loaded[0],original[0])
+        assert np.array_equal(loaded[1],original[1]) or loaded[1] is original[1]
+    assert np.array_equal(conditions.periodic_pairs,saved.periodic_pairs)
+
+def test_functions_not_at_module_level_are_given_on_load(tmp_path):
+    msh, msetup = build()
+    msetup.boundary_conditions.traction(-1,lambda t: 0.1*t)
+    path = str(tmp_path/'checkpoint.npz')
+    checkpoint.save_checkpoint(path,msh,msetup,0,1)
+
+    with pytest.raises(ValueError):
+        checkpoint.load_checkpoint(path)
+
+    conditions = boundary.boundary_conditions()
+    conditions.fix(0)
+    assert checkpoint.load_checkpoint(path,conditions)[1].boundary_conditions is conditions
+
+def test_checkpoint_without_particles(tmp_path):
+    msh, msetup = build()
+    msh.store.remove(np.arange(msh.store.n))
+    path = str(tmp_path/'checkpoint.npz')
+    checkpoint.save_checkpoint(path,msh,msetup,0,1)
+
+    msh_loaded = checkpoint.load_checkpoint(path)[0]
+    assert msh_loaded.store.n==0
+    assert len(msh_loaded.store.materials)==1
+
+    # a mesh without materials
+    checkpoint.save_checkpoint(path,mesh.mesh_1D(25,20),msetup,0,1)
+    msh_loaded = checkpoint.load_checkpoint(path)[0]
+    assert msh_loaded.store.n==0 and msh_loaded.store.materials==[]
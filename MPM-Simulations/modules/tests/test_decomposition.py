@@ -0,0 +1,57 @@
+"""
+
+Tests of the domain decomposition against the single process numpy engine
+
+"""
+import numpy as np
+import pytest
+
+import boundary
+import decomposition
+import solver
+from bar_models import build, state
+
+@pytest.mark.parametrize('nprocs',(2,3))
+@pytest.mark.parametrize('conditions',(None,'fixed','velocity','traction'))
+def test_decomposed_run_equals_serial_run(conditions,nprocs):
+    msh, msetup = build('numpy',conditions=conditions)
+    solver.explicit_solution(msh,msetup)
+
+    msh_sd, msetup_sd = build('numpy',conditions=conditions)
+    report = decomposition.explicit_solution_decomposed(msh_sd,msetup_sd,nprocs)
+
+    assert report['nprocs']==nprocs and report['steps']==len(msetup.solution_array[0])
+    np.testing.assert_allclose(state(msh_sd),state(msh),rtol=0,atol=1e-12)
+    np.testing.assert_allclose(msh_sd.grid.momentum,msh.grid.momentum,rtol=0,atol=1e-12)
+    np.testing.assert_allclose(msetup_sd.solution_array,msetup.solution_array,rtol=0,atol=1e-12)
+
+def test_particles_crossing_subdomains():
+    def translating():
+        msh, msetup = build('numpy')
+        msh.store.velocity[:] = 5.0
+        msetup.boundary_conditions = boundary.boundary_conditions()
+        return msh, msetup
+
+    msh, msetup = translating()
+    solver.explicit_solution(msh,msetup)
+    msh_sd, msetup_sd = translating()
+    report = decomposition.explicit_solution_decomposed(msh_sd,msetup_sd,3)
+
+    # the particles move more than two elements
+    assert np.median(msh.store.position-build()[0].store.position)>2.5
+    np.testing.assert_allclose(state(msh_sd),state(msh),rtol=0,atol=1e-12)
+    assert np.array_equal(msh_sd.store.element,msh.store.element)
+
+def test_partition_balances_particles():
+    msh = build()[0]
+    msh.store.remove(np.arange(10))
+    msh.update_active_set()
+    bounds = decomposition.partition_elements(msh,4)
+    assert bounds[0]==0 and bounds[-1]==msh.nelem
+    counts = np.add.reduceat(np.bincount(msh.store.element,minlength=msh.nelem)+1,bounds[:-1])
+    assert counts.max()-counts.min()<=3
+
+def test_periodic_conditions_are_rejected():
+    msh, msetup = build('numpy',conditions='periodic')
+    with pytest.raises(ValueError):
+        decomposition.explicit_solution_decomposed(msh,msetup,2)
@@ -0,0 +1,42 @@
+"""
+
+Tests of the python, numpy and numba time step engines
+
+"""
+import numpy as np
+import pytest
+
+import solver
+from bar_models import SCHEMES, build, state
+
+@pytest.mark.parametrize('scheme',SCHEMES)
+def test_engines_agree(scheme):
+    results = {}
+    for engine in ('python','numpy','numba'):
+        msh, msetup = build(engine,scheme)
+        solver.explicit_solution(msh,msetup)
+        results[engine] = state(msh)
+
+    np.testing.assert_allclose(results['numpy'],results['python'],rtol=0,atol=1e-12)
+    np.testing.assert_allclose(results['numba'],results['python'],rtol=0,atol=1e-12)
+
+@pytest.mark.parametrize('engine',('python','numba'))
+def test_cpgimp_falls_back_to_the_numpy_engine(engine,capsys):
+    msh, msetup = build('numpy',interpolation_type='cpGIMP')
+    solver.explicit_solution(msh,msetup)
+
+    msh_engine, msetup_engine = build(engine,interpolation_type='cpGIMP')
+    solver.explicit_solution(msh_engine,msetup_engine)
+    assert 'using the numpy engine' in capsys.readouterr().out
+    assert np.array_equal(state(msh_engine),state(msh))
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_unknown_options_raise_before_the_first_step(engine):
+    for option, value in (('engine','fortran'),('interpolation_type','quadratic'),('integration_scheme','USX')):
+        msh, msetup = build(engine)
+        setattr(msetup,option,value)
+        position = msh.store.position.copy()
+        with pytest.raises(ValueError):
+            solver.explicit_solution(msh,msetup)
+        assert np.array_equal(msh.store.position,position)
+        assert msetup.solution_array==[[],[]]
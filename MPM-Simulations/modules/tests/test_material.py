@@ -0,0 +1,83 @@
+"""
+
+Tests of the elasto-plastic and viscoelastic stress updates
+
+"""
+import numpy as np
+import pytest
+
+import material
+import solver
+from bar_models import build, state
+
+def strain_path(mat,dstrain,dt=0.1):
+    """
+    Returns the stress of one particle after each strain increment
+    """
+    stress = np.zeros(1)
+    values = mat.new_state(1)
+    history = []
+    for de in dstrain:
+        stress = mat.update_stress_array(stress,np.array([de]),np.ones(1),dt,values)
+        history.append(stress[0])
+    return np.array(history), values
+
+def test_elastoplastic_return_mapping():
+    E, sigma_y, H = 100.0, 1.0, 25.0
+    mat = material.elastoplastic(E,sigma_y,H,1)
+
+    # loading to a strain of 0.05 and unloading by 0.02 in steps of 0.001
+    dstrain = np.concatenate((np.full(50,0.001),np.full(20,-0.001)))
+    stress, values = strain_path(mat,dstrain)
+    strain = np.cumsum(dstrain)
+
+    # elastic branch, hardening branch and elastic unloading
+    tangent = E*H/(E+H)
+    expected = np.where(strain[:50]<=sigma_y/E,E*strain[:50],sigma_y+tangent*(strain[:50]-sigma_y/E))
+    np.testing.assert_allclose(stress[:50],expected,rtol=0,atol=1e-12)
+    np.testing.assert_allclose(stress[50:],stress[49]-E*(strain[49]-strain[50:]),rtol=0,atol=1e-12)
+
+    # the stress is the elastic stress of the elastic strain
+    plastic = values['plastic_strain'][0]
+    assert stress[-1]==pytest.approx(E*(strain[-1]-plastic))
+    assert values['alpha'][0]==pytest.approx(plastic)
+
+    # reverse yielding starts at the hardened yield stress
+    reverse, values_reverse = strain_path(mat,np.concatenate((dstrain,np.full(60,-0.001))))
+    assert reverse.min()<-(sigma_y+H*values['alpha'][0])+1e-9
+    assert values_reverse['alpha'][0]>values['alpha'][0]
+
+@pytest.mark.parametrize('dt',(0.01,0.1,1.0))
+def test_maxwell_constant_strain_rate_is_exact(dt):
+    E, eta, E_inf, rate = 50.0, 10.0, 20.0, 0.01
+    mat = material.maxwell_viscoelastic(E,eta,1,E_inf)
+    steps = int(round(2.0/dt))
+    stress, values = strain_path(mat,np.full(steps,rate*dt),dt)
+
+    t = dt*np.arange(1,steps+1)
+    tau = eta/E
+    expected = E_inf*rate*t+eta*rate*(1-np.exp(-t/tau))
+    np.testing.assert_allclose(stress,expected,rtol=1e-10)
+
+def test_maxwell_relaxation():
+    E, eta = 50.0, 10.0
+    mat = material.maxwell_viscoelastic(E,eta,1)
+    stress, values = strain_path(mat,np.concatenate(([0.01],np.zeros(10))),0.1)
+
+    tau = eta/E
+    expected = stress[0]*np.exp(-0.1*np.arange(11)/tau)
+    np.testing.assert_allclose(stress,expected,rtol=1e-12)
+
+@pytest.mark.parametrize('mat',(material.elastoplastic(100,0.05,10,1),material.maxwell_viscoelastic(80,5,1,20)),
+                         ids=('elastoplastic','maxwell'))
+def test_engines_agree_with_state_materials(mat):
+    results = {}
+    for engine in ('python','numpy','numba'):
+        msh, msetup = build(engine)
+        for ip in range(msh.store.n):
+            msh.store.set_material(ip,mat)
+        solver.explicit_solution(msh,msetup)
+        results[engine] = np.concatenate([state(msh)]+list(msh.store.state[1].values()))
+
+    np.testing.assert_allclose(results['numpy'],results['python'],rtol=0,atol=1e-12)
+    np.testing.assert_allclose(results['numba'],results['python'],rtol=0,atol=1e-12)
@@ -0,0 +1,62 @@
+"""
+
+Tests of the energy and momentum conservation monitor
+
+"""
+import numpy as np
+import pytest
+
+import monitor
+import recorder
+import solver
+from bar_models import build
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+@pytest.mark.parametrize('conditions',(None,'fixed','velocity','traction'))
+def test_balance_of_a_stable_run(engine,conditions):
+    msh, msetup = build(engine,conditions=conditions,time=5.0)
+    momentum = np.dot(msh.store.mass,msh.store.velocity)
+    kinetic = 0.5*np.dot(msh.store.mass,msh.store.velocity**2)
+    mon = monitor.conservation_monitor(tolerance=0.02)
+    solver.explicit_solution(msh,msetup,monitor=mon)
+
+    # the momentum changes by the impulse of the external, reaction and damping forces
+    values = mon.values
+    assert values['momentum']-momentum==pytest.approx(values['impulse'],abs=1e-12)
+    assert np.abs(mon.history('energy_drift')).max()<0.01
+    assert values['damping_work']<0
+    balance = values['kinetic_energy']+values['strain_energy']-values['external_work']-values['damping_work']
+    assert balance==pytest.approx(kinetic,rel=0.01)
+
+def test_evaluation_interval():
+    msh, msetup = build(time=1.0)
+    mon = monitor.conservation_monitor(every=5)
+    solver.explicit_solution(msh,msetup,monitor=mon)
+    steps = len(msetup.solution_array[0])
+    assert mon.nevaluations==len(range(0,steps,5))
+    np.testing.assert_array_equal(mon.history('time'),msetup.solution_array[0][::5])
+
+def test_unstable_run_drifts_and_stops(tmp_path):
+    # a time step above the critical one (0.125)
+    msh, msetup = build(time=10.0)
+    msetup.dt = 0.2
+    msetup.damping_local_alpha = 0
+    mon = monitor.conservation_monitor()
+    solver.explicit_solution(msh,msetup,monitor=mon)
+    drift = np.abs(mon.history('energy_drift'))
+    assert drift.max()>0.05
+
+    # the same run stops when the drift exceeds the tolerance
+    msh, msetup = build(time=10.0)
+    msetup.dt = 0.2
+    msetup.damping_local_alpha = 0
+    mon = monitor.conservation_monitor(tolerance=0.05)
+    rec = recorder.solution_recorder(('velocity',),(),path=str(tmp_path/'run'),scalar_fields=monitor.FIELDS)
+    with pytest.raises(RuntimeError,match='energy drift'):
+        solver.explicit_solution(msh,msetup,monitor=mon,recorder=rec)
+
+    stop = np.argmax(drift>0.05)
+    assert len(msetup.solution_array[0])==stop+1
+    assert abs(mon.values['energy_drift'])>0.05
+    assert rec.nrecords==stop+1
+    np.testing.assert_array_equal(rec.history('energy_drift'),mon.history('energy_drift'))
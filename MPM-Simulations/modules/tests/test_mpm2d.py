@@ -0,0 +1,100 @@
+"""
+
+Tests of the two dimensional solver
+
+"""
+import numpy as np
+import pytest
+
+import boundary
+import material
+import mpm2d
+import setup
+import solver
+from bar_models import SCHEMES, build
+
+def build_2D(Lx=25,Ly=2.5,nx=20,ny=2,scheme='MUSL',interpolation_type='linear',time=0.5):
+    """
+    Returns a 2D mesh filled with particles and its model setup
+    """
+    msh = mpm2d.mesh_2D(Lx,Ly,nx,ny)
+    msh.put_particles_in_all_mesh_elements(2,material.linear_elastic(100,1))
+
+    msetup = setup.model_setup()
+    msetup.integration_scheme = scheme
+    msetup.interpolation_type = interpolation_type
+    msetup.time = time
+    msetup.dt = 0.01
+    msetup.solution_field = 'velocity'
+    return msh, msetup
+
+@pytest.mark.parametrize('interpolation_type',('linear','cpGIMP'))
+def test_interpolation_tables_partition_of_unity(interpolation_type):
+    msh = build_2D(nx=5,ny=4)[0]
+    ps = msh.store
+    ps.position[:] += np.random.default_rng(1).uniform(-0.2,0.2,(ps.n,2))*ps.size
+    mpm2d.locate_particles(msh)
+    mpm2d.interpolation_functions_values(msh,interpolation_type)
+    assert ps.support.shape[1]==(4 if interpolation_type=='linear' else 9)
+
+    # particles with their whole domain in the mesh
+    lp = ps.size/2
+    inside = ((ps.position-lp>=0) & (ps.position+lp<=(25,2.5))).all(axis=1)
+    assert inside.sum()>ps.n/2
+
+    N, dNdx, dNdy = ps.N[inside], ps.dNdx[inside], ps.dNdy[inside]
+    np.testing.assert_allclose(N.sum(axis=1),1,rtol=0,atol=1e-14)
+    np.testing.assert_allclose(dNdx.sum(axis=1),0,rtol=0,atol=1e-12)
+    np.testing.assert_allclose(dNdy.sum(axis=1),0,rtol=0,atol=1e-12)
+    x = msh.x[ps.support[inside]]
+    np.testing.assert_allclose(np.einsum('pk,pk->p',N,x[...,0]),ps.position[inside,0],rtol=0,atol=1e-12)
+    np.testing.assert_allclose(np.einsum('pk,pk->p',dNdy,x[...,1]),1,rtol=0,atol=1e-12)
+
+@pytest.mark.parametrize('scheme',SCHEMES)
+def test_rigid_translation(scheme):
+    msh, msetup = build_2D(scheme=scheme,time=0.2)
+    position = msh.store.position.copy()
+    msh.store.velocity[:] = (0.3,-0.2)
+    mpm2d.explicit_solution_2D(msh,msetup)
+
+    t = len(msetup.solution_array[0])*msetup.dt
+    np.testing.assert_allclose(msh.store.velocity,np.tile((0.3,-0.2),(msh.store.n,1)),rtol=0,atol=1e-12)
+    np.testing.assert_allclose(msh.store.position,position+t*np.array((0.3,-0.2)),rtol=0,atol=1e-12)
+    np.testing.assert_allclose(msh.store.stress,0,rtol=0,atol=1e-10)
+
+@pytest.mark.parametrize('scheme',SCHEMES)
+def test_bar_with_rollers_equals_1D_bar(scheme):
+    msh, msetup = build_2D(scheme=scheme)
+    msh.store.velocity[:,0] = 0.1*np.sin(np.pi*msh.store.position[:,0]/50)
+    msetup.damping_local_alpha = 0.05
+    msh.fix_nodes(np.arange(msh.nnodes),(1,))
+    msh.fix_nodes(msh.boundary_nodes('left'),(0,))
+    mpm2d.explicit_solution_2D(msh,msetup)
+
+    msh_1D, msetup_1D = build('numpy',scheme)
+    solver.explicit_solution(msh_1D,msetup_1D)
+
+    # the particles of the four rows move as the 1D particles
+    order = np.argsort(msh.store.position[:,0],kind='stable')
+    vx = msh.store.velocity[order,0].reshape(-1,4)
+    for row in range(4):
+        np.testing.assert_allclose(vx[:,row],msh_1D.store.velocity,rtol=0,atol=1e-12)
+    assert (msh.velocity[msh.boundary_nodes('left'),0]==0).all()
+    assert (msh.velocity[:,1]==0).all()
+
+def test_1D_boundary_conditions_are_rejected():
+    msh, msetup = build_2D()
+    msetup.boundary_conditions = boundary.boundary_conditions()
+    msetup.boundary_conditions.traction(3,1.0)
+    with pytest.raises(ValueError):
+        mpm2d.explicit_solution_2D(msh,msetup)
+
+    msetup.boundary_conditions = boundary.boundary_conditions()
+    msetup.boundary_conditions.fix(5)
+    with pytest.raises(ValueError):
+        mpm2d.explicit_solution_2D(msh,msetup)
+
+    # no conditions
+    msetup.boundary_conditions = boundary.boundary_conditions()
+    msetup.time = 0.05
+    mpm2d.explicit_solution_2D(msh,msetup)
@@ -0,0 +1,71 @@
+"""
+
+Tests of the phase profiler
+
+"""
+import json
+import time
+
+import numpy as np
+import pytest
+
+import profiling
+import solver
+from bar_models import build
+
+def test_phase_times_and_calls():
+    profiler = profiling.phase_profiler()
+    for step in range(3):
+        profiler.start_step()
+        with profiler.phase('step'):
+            for k in range(step+1):
+                with profiler.phase('sleep'):
+                    time.sleep(0.002)
+
+    calls = profiler.step_calls()
+    times = profiler.step_times()
+    assert profiler.names==['step','sleep'] and profiler.nsteps==3
+    assert calls['sleep'].tolist()==[1,2,3] and calls['step'].tolist()==[1,1,1]
+    assert (times['sleep']>=0.002*np.arange(1,4)).all()
+    assert (times['step']>=times['sleep']).all()
+
+    rows = {row['name']: row for row in profiler.summary()}
+    assert rows['sleep']['calls']==6
+    assert rows['sleep']['time']==pytest.approx(times['sleep'].sum())
+    assert 0<rows['sleep']['fraction']<=1 and rows['step']['fraction']==1
+
+def test_disabled_profiler_records_nothing():
+    profiler = profiling.phase_profiler(enabled=False)
+    profiler.start_step()
+    with profiler.phase('step'):
+        pass
+    assert profiler.nsteps==0 and profiler.names==[] and profiler.summary()==[]
+
+@pytest.mark.parametrize('engine',('python','numpy','numba'))
+def test_solver_phases(engine,tmp_path):
+    msh, msetup = build(engine,time=0.1)
+    profiler = profiling.phase_profiler(trace=True)
+    solver.explicit_solution(msh,msetup,profiler=profiler)
+
+    steps = len(msetup.solution_array[0])
+    calls = profiler.step_calls()
+    assert profiler.nsteps==steps
+    assert (calls['step']==1).all()
+    assert 'interpolation_functions_values' in calls and 'particle_stress' in calls
+
+    # the phases of a step take part of the step time
+    times = profiler.step_times()
+    inner = sum(values for name, values in times.items() if name!='step')
+    assert (inner<=times['step']).all()
+
+    # one trace event per phase call
+    path = str(tmp_path/'trace.json')
+    profiler.chrome_trace(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert len(events)==sum(int(values.sum()) for values in calls.values())
+    assert {event['args']['step'] for event in events}==set(range(steps))
+
+def test_chrome_trace_requires_trace(tmp_path):
+    with pytest.raises(ValueError):
+        profiling.phase_profiler().chrome_trace(str(tmp_path/'trace.json'))
@@ -0,0 +1,41 @@
+"""
+
+Tests of the parameter sweeps
+
+"""
+import numpy as np
+
+import sweep
+
+def negative_modulus_builder(params):
+    """
+    Builds the cases of sweep.build_case, rejecting negative moduli
+    """
+    if params['E']<0:
+        raise ValueError("negative Young's modulus")
+    return sweep.build_case(params)
+
+def test_parameter_grid_and_case_keys():
+    cases = sweep.parameter_grid(E=np.array([100.0,200.0]),nelem=[10])
+    assert cases==[{'E': 100.0,'nelem': 10},{'E': 200.0,'nelem': 10}]
+    assert all(type(params['E']) is float for params in cases)
+    assert sweep.case_key({'nelem': 10,'E': np.float64(100)})==sweep.case_key(cases[0])
+
+def test_failed_cases_are_recorded_and_retried(tmp_path):
+    results_file = str(tmp_path/'results.csv')
+    cases = sweep.parameter_grid(E=[100.0,-1.0,200.0],time=[0.05])
+
+    sweep.run_sweep(cases,results_file,workers=2,builder=negative_modulus_builder,verbose=False)
+
+    solved = sweep.completed_cases(results_file)
+    assert solved=={sweep.case_key(cases[0]),sweep.case_key(cases[2])}
+    failures = sweep.read_results(sweep.failures_path(results_file))
+    assert failures['case']==[sweep.case_key(cases[1])]
+    assert failures['E']==['-1.0']
+    assert failures['error']==["ValueError: negative Young's modulus"]
+
+    # a resumed sweep solves only the failed case
+    sweep.run_sweep(cases,results_file,workers=1,verbose=False)
+    assert sweep.completed_cases(results_file)=={sweep.case_key(params) for params in cases}
+    table = sweep.read_results(results_file)
+    assert len(table['case'])==3*len(set(table['time']))
@@ -0,0 +1,58 @@
+"""
+
+Tests of the multithreaded particle to grid transfer
+
+"""
+import numpy as np
+import pytest
+
+import interpolation
+import material
+import mesh
+import solver
+import update
+from bar_models import SCHEMES, build
+
+def large_bar():
+    """
+    Returns a bar with enough particles to split them in three chunks
+    """
+    msh = mesh.mesh_1D(25,1000)
+    msh.put_particles_in_all_mesh_elements(32,material.linear_elastic(100,1))
+    rng = np.random.default_rng(2)
+    msh.store.velocity[:] = rng.uniform(-0.1,0.1,msh.store.n)
+    msh.store.stress[:] = rng.uniform(-1,1,msh.store.n)
+    msh.store.f_ext[:] = rng.uniform(-1,1,msh.store.n)
+    return msh
+
+@pytest.mark.parametrize('interpolation_type',('linear','cubic_bspline'))
+def test_threaded_transfer_equals_serial_transfer(interpolation_type):
+    msh = large_bar()
+    assert msh.store.n>=3*interpolation.MIN_CHUNK
+    update.locate_particles(msh)
+    update.interpolation_functions_values(msh,interpolation_type)
+
+    nodal = {}
+    for threads in (1,3):
+        update.reset_nodal_vaues(msh)
+        msh.grid.f_ext[:] = 0
+        interpolation.particles_to_nodes(msh,threads=threads)
+        nodal[threads] = np.concatenate([getattr(msh.grid,name).copy() for name in interpolation.P2G_QUANTITIES])
+
+    np.testing.assert_allclose(nodal[3],nodal[1],rtol=1e-12,atol=1e-12)
+    interpolation.close_pools()
+    assert interpolation._pools=={}
+
+@pytest.mark.parametrize('engine',('numpy','numba'))
+@pytest.mark.parametrize('scheme',SCHEMES)
+def test_threaded_run_equals_serial_run(engine,scheme):
+    results = {}
+    for threads in (1,4):
+        msh = large_bar()
+        msetup = build(engine,scheme,time=0.05)[1]
+        msetup.dt = 0.001
+        msetup.threads = threads
+        solver.explicit_solution(msh,msetup)
+        results[threads] = np.concatenate((msh.store.velocity,msh.store.position,msh.store.stress))
+
+    np.testing.assert_allclose(results[4],results[1],rtol=1e-10,atol=1e-12)
@@ -0,0 +1,47 @@
+"""
+
+Tests of the convergence of the solver to the analytical solutions
+
+"""
+import numpy as np
+import pytest
+
+import mesh
+import shape
+import verification
+
+def test_cpgimp_table_reaches_the_neighbour_nodes():
+    msh = mesh.mesh_1D(10,20)
+    L = msh.element_length
+    xp = np.linspace(0,10,997,endpoint=False)
+    element = np.minimum((xp/L[0]).astype(np.int64),msh.nelem-1)
+    lp = np.full_like(xp,L[0]/4)
+    nodes, N, dN = shape.cpGIMP_table(xp,lp,element,msh.grid.x,L)
+
+    assert nodes.shape==N.shape==dN.shape==(len(xp),4)
+    assert nodes.min()>=0 and nodes.max()<msh.grid.n
+    np.testing.assert_allclose(N.sum(axis=1),1,rtol=0,atol=1e-14)
+    np.testing.assert_allclose(dN.sum(axis=1),0,rtol=0,atol=1e-12)
+
+    # particle domains crossing the element edges reach the neighbour nodes
+    near_edge = np.abs(xp-msh.grid.x[element+1])<lp
+    assert (N[near_edge,3]>0).all()
+    assert (N[~near_edge,3]==0).all()
+
+    # linear fields are reproduced away from the grid ends
+    interior = (xp>L[0]) & (xp<10-L[0])
+    xn = msh.grid.x[nodes[interior]]
+    np.testing.assert_allclose((N[interior]*xn).sum(axis=1),xp[interior],rtol=0,atol=1e-12)
+    np.testing.assert_allclose((dN[interior]*xn).sum(axis=1),1,rtol=0,atol=1e-12)
+
+@pytest.mark.parametrize('interpolation_type',('linear','cpGIMP'))
+def test_vibrating_bar_converges(interpolation_type):
+    results = verification.verification_suite({'problem': ('vibrating_bar',),
+                                               'interpolation_type': (interpolation_type,)},
+                                              nelem=(16,32,64),verbose=False)
+    orders = verification.convergence_orders(results)
+
+    assert len(orders)==len(verification.DEFAULT_MATRIX['integration_scheme'])
+    assert verification.check_orders(orders)==[]
+    for entry in orders:
+        assert min(entry['velocity_order'])>1.8
@@ -3,6 +3,8 @@
 This module defines functions for updating tasks
 
 """
+import numpy as np
+
 import interpolation as interp
 import shape as shape
 
@@ -21,6 +23,8 @@ def particle_velocity(msh,dt):
    
         # current element
         ie=ip.element    
+        if ie is None:
+            continue
         
         f1=ie.n1.f_tot # total force node 1
         m1=ie.n1.mass  # mass node 1
@@ -45,6 +49,8 @@ def particle_position(msh,dt):
    
         # current element
         ie=ip.element    
+        if ie is None:
+            continue
          
         p1=ie.n1.momentum # momentum node 1
         m1=ie.n1.mass     # mass node 1
@@ -56,16 +62,18 @@ def particle_position(msh,dt):
         
 def nodal_velocity(msh):
     """
-    Calculate nodal velocity
+    Calculate nodal velocity in the active nodes
 
     Arguments
     ---------
     msh: mesh
         a mesh object
     """
-    for inode in msh.nodes:
-        if(inode.mass!=0):
-            inode.velocity=inode.momentum/inode.mass
+    grid = msh.grid
+    nodes = msh.active_nodes
+    mass = grid.mass[nodes]
+    has_mass = mass!=0
+    grid.velocity[nodes[has_mass]] = grid.momentum[nodes[has_mass]]/mass[has_mass]
             
 def nodal_momentum(msh):
     """
@@ -76,8 +84,7 @@ def nodal_momentum(msh):
     msh: mesh
         a mesh object
     """
-    for inode in msh.nodes:
-        inode.momentum=0
+    msh.grid.momentum[msh.active_nodes] = 0
     
     for ie in msh.elements:
         for ip in ie.particles:
@@ -85,6 +92,48 @@ def nodal_momentum(msh):
             ie.n1.momentum+=ip.mass*ip.velocity*ip.N1
             ie.n2.momentum+=ip.mass*ip.velocity*ip.N2
               
+def nodes_to_particles(msh,dt_velocity,dt_position):
+    """
+    Update particle velocity and position from the nodal arrays
+
+    Nodal accelerations are computed once per node and gathered with the
+    nodal velocities (updated by integration.nodal_update) by the
+    interpolation tables of the particles.
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    dt_velocity: float
+        time step of the velocity update
+    dt_position: float
+        time step of the position update
+    """
+    ps = msh.store
+    grid = msh.grid
+
+    # nodal acceleration, zero in nodes without mass
+    acceleration = np.divide(grid.f_tot,grid.mass,out=np.zeros(grid.n),where=grid.mass!=0)
+
+    # gather from the support nodes of each particle (particles outside
+    # the mesh have zero interpolation functions and are not moved)
+    ps.velocity += np.einsum('ij,ij->i',acceleration[ps.support],ps.N)*dt_velocity
+    ps.position += np.einsum('ij,ij->i',grid.velocity[ps.support],ps.N)*dt_position
+
+def nodal_momentum_array(msh,threads=1):
+    """
+    Calculate nodal momentum from the particle arrays
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    threads: int
+        number of threads of the particle to grid transfer
+    """
+    msh.grid.momentum[:] = 0
+    interp.particles_to_nodes(msh,('momentum',),threads)
+
 def particle_strain_increment(msh,dt):
     """
     Calculate particle strain increment
@@ -100,6 +149,9 @@ def particle_strain_increment(msh,dt):
    
         # current element
         ie=ip.element    
+        if ie is None:
+            ip.dstrain=0
+            continue
         
         # nodal velocities
         v1=ie.n1.velocity # velocity node 1
@@ -108,6 +160,23 @@ def particle_strain_increment(msh,dt):
         # particle strain increment
         ip.dstrain=(ip.dN1*v1+ip.dN2*v2)*dt
         
+def particle_strain_increment_array(msh,dt):
+    """
+    Calculate particle strain increment from the nodal velocity array
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    dt: float
+        time step
+    """
+    ps = msh.store
+    v = msh.grid.velocity
+
+    # particle strain increment from the support nodes of each particle
+    ps.dstrain[:] = np.einsum('ij,ij->i',ps.dN,v[ps.support])*dt
+
 def particle_density(msh,dt):
     """
     Update particle density
@@ -120,14 +189,16 @@ def particle_density(msh,dt):
         time step
 
     """
-    for ip in msh.particles:
-   
-        ip.density = ip.density/(1+ip.dstrain)
+    ps = msh.store
+    ps.density[:] = ps.density/(1+ps.dstrain)
         
 def particle_stress(msh,dt):
     """
     Update particle stress
 
+    The particles are grouped by material and each material updates its
+    particles in one call.
+
     Arguments
     ---------
     msh: mesh
@@ -135,101 +206,206 @@ def particle_stress(msh,dt):
     dt: float
         time step
     """
-    for ip in msh.particles:
+    for imat, ids in msh.store.material_groups():
+        material_stress(msh,imat,ids,dt)
+
+def material_stress(msh,imat,ids,dt):
+    """
+    Update the stress of the particles of one material
+
+    Materials without update_stress_array are updated particle by particle.
+
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
+    imat: int
+        material index in the particle store
+    ids: numpy.ndarray or slice
+        indices of all the particles of the material
+    dt: float
+        time step
+    """
+    ps = msh.store
+    mat = ps.materials[imat]
 
-        ip.material.update_stress(ip,dt)
+    if hasattr(mat,'update_stress_array'):
+        ps.stress[ids] = mat.update_stress_array(ps.stress[ids],ps.dstrain[ids],ps.density[ids],dt,ps.state[imat])
+    else:
+        for ip in np.arange(ps.n)[ids]:
+            mat.update_stress(msh.particles[ip],dt)
         
 def interpolation_functions_values(msh,integration_scheme):    
     """
     Update the values of the nodal interpolation functions and its gradients
 
+    The functions are evaluated for all particles at once over the particle
+    store arrays, and stored as fixed width tables in ps.support (node
+    indices), ps.N and ps.dN, one row per particle. Linear functions also
+    fill N1, N2, dN1 and dN2, cpGIMP and B-spline functions reach more
+    than two nodes and only fill the tables.
+
     Arguments
     ---------
     msh: mesh
         a mesh object
     integration_scheme: string
-        a string with the interpolation shceme, can be 'linear' or 'cpGIMP'
+        a string with the interpolation shceme, can be 'linear', 'cpGIMP',
+        'quadratic_bspline' or 'cubic_bspline'
     """
-    for ip in msh.particles:
-        
-        # current element
-        ie=ip.element
-        
-        if integration_scheme=="linear":
-        
-            # interpolation functions
-            ip.N1=shape.NiLinear(ip.position,ie.n1.x,ie.L)
-            ip.N2=shape.NiLinear(ip.position,ie.n2.x,ie.L)
-        
-            # interpolation functions gradients
-            ip.dN1=shape.dNiLinear(ip.position,ie.n1.x,ie.L)
-            ip.dN2=shape.dNiLinear(ip.position,ie.n2.x,ie.L)
-        
-        elif integration_scheme=="cpGIMP":
+    ps = msh.store
+    grid = msh.grid
 
-            # interpolation functions
-            ip.N1=shape.NicpGIMP(ie.L,ip.size/2,ip.position,ie.n1.x)
-            ip.N2=shape.NicpGIMP(ie.L,ip.size/2,ip.position,ie.n2.x)
-        
-            # interpolation functions gradients
-            ip.dN1=shape.dNicpGIMP(ie.L,ip.size/2,ip.position,ie.n1.x)
-            ip.dN2=shape.dNicpGIMP(ie.L,ip.size/2,ip.position,ie.n2.x)
+    # element data of each particle (particles outside the mesh use
+    # element 0 and get their values set to zero below)
+    inside = ps.element>=0
+    ie = np.where(inside,ps.element,0)
+
+    if integration_scheme=="cpGIMP" or integration_scheme in shape.BSPLINE_DEGREE:
+
+        if integration_scheme=="cpGIMP":
+            ps.support, ps.N, ps.dN = shape.cpGIMP_table(ps.position,ps.size/2,ie,grid.x,msh.element_length)
+
+        elif not msh.uniform:
+            raise ValueError("B-spline interpolation requires a uniform mesh")
 
         else:
-            print("error in integration scheme keyword")
+            ps.support, ps.N, ps.dN = shape.bspline_table(ps.position,grid.x[0],msh.element_length[0],grid.n,
+                                                          shape.BSPLINE_DEGREE[integration_scheme])
+
+        # particles outside the mesh do not interact with the nodes
+        ps.support[~inside] = 0
+        ps.N[~inside] = 0
+        ps.dN[~inside] = 0
+        for values in (ps.N1,ps.N2,ps.dN1,ps.dN2):
+            values[:] = 0
+
+        # the support reaches nodes beyond the particle elements
+        active = np.zeros(grid.n,dtype=bool)
+        active[msh.active_nodes] = True
+        active[ps.support[inside]] = True
+        msh.active_nodes = np.flatnonzero(active)
+        return
+
+    xn1 = grid.x[msh.connectivity[ie,0]]
+    xn2 = grid.x[msh.connectivity[ie,1]]
+    L = msh.element_length[ie]
+
+    if integration_scheme=="linear":
+
+        # interpolation functions
+        ps.N1[:] = shape.NiLinear_array(ps.position,xn1,L)
+        ps.N2[:] = shape.NiLinear_array(ps.position,xn2,L)
+
+        # interpolation functions gradients
+        ps.dN1[:] = shape.dNiLinear_array(ps.position,xn1,L)
+        ps.dN2[:] = shape.dNiLinear_array(ps.position,xn2,L)
+
+    else:
+        raise ValueError("unknown interpolation type '%s'"%integration_scheme)
+
+    # particles outside the mesh do not interact with the nodes
+    for values in (ps.N1,ps.N2,ps.dN1,ps.dN2):
+        values[~inside] = 0
+
+    # two node tables
+    ps.support = msh.connectivity[ie]
+    ps.N = np.column_stack((ps.N1,ps.N2))
+    ps.dN = np.column_stack((ps.dN1,ps.dN2))
 
 def  reset_nodal_vaues(msh):
     """
-    Reset all nodal values for the next step calculation
+    Reset the nodal values of the active nodes for the next step calculation
 
     Arguments
     ---------
     msh: mesh
         a mesh object
     """
-    for inode in msh.nodes:
-        inode.velocity = 0
-        inode.mass     = 0
-        inode.momentum = 0
-        inode.f_int = 0
-        inode.f_ext = 0
-        inode.f_tot = 0
+    grid = msh.grid
+    nodes = msh.active_nodes
+    grid.velocity[nodes] = 0
+    grid.mass[nodes]     = 0
+    grid.momentum[nodes] = 0
+    grid.f_int[nodes] = 0
+    grid.f_ext[nodes] = 0
+    grid.f_tot[nodes] = 0
 
-def particle_list(msh):
+def locate_particles(msh):
     """
-    Update particle list in each mesh element.
+    Update the element index of every particle in the particle store.
+
+    In uniform meshes the element index is computed directly from the
+    particle position, otherwise it is found by bisection over the nodal
+    coordinates. Particles outside the mesh get the element index -1.
 
     Arguments
     ---------
     msh: mesh
         a mesh object
+
+    Returns
+    -------
+    lost: numpy.ndarray
+        ids of the particles outside the mesh
     """
+    ps = msh.store
+    xp = ps.position
+    xn = msh.grid.x
 
-    # clear particle list in elements
-    for ie in msh.elements:
-        ie.particles = []
+    # particles outside the mesh (or with invalid position)
+    outside = ~((xp>=xn[0]) & (xp<xn[-1]))
+    if outside.any():
+        xp = np.where(outside,xn[0],xp)
 
-    # for each particle in model
-    for ip in msh.particles:
+    if msh.uniform:
+
+        # cell index from position
+        ie = np.floor((xp-xn[0])/msh.element_length[0]).astype(np.int64)
+        np.clip(ie,0,msh.nelem-1,out=ie)
+
+        # correct round-off so that xn1 <= xp < xn2 holds exactly
+        ie -= xp<xn[ie]
+        ie += xp>=xn[ie+1]
+
+    else:
+
+        # bisection search over the nodal coordinates
+        ie = np.searchsorted(xn,xp,side='right')-1
+
+    ie[outside] = -1
 
-        # get particle position
-        xp = ip.position
+    ps.element[:] = ie
+    msh.update_active_set()
+    return np.flatnonzero(outside)
 
-        # for each element in mesh
-        for ie in msh.elements:
+def particle_list(msh):
+    """
+    Update particle list in each mesh element.
 
-            # get the nodal position
-            xn1 = ie.n1.x
-            xn2 = ie.n2.x
+    Arguments
+    ---------
+    msh: mesh
+        a mesh object
 
-            # verify the particle is inside the element
-            if xp>=xn1 and xp<xn2:
+    Returns
+    -------
+    lost: numpy.ndarray
+        ids of the particles outside the mesh, they are not assigned to any element
+    """
+    lost = locate_particles(msh)
 
-                # update element in particle
-                ip.element = ie
+    # clear particle list in elements
+    for ie in msh.elements:
+        ie.particles = []
 
-                # add the particle to the element list
-                ie.particles.append(ip)
+    # group the particles by element keeping the particle order
+    element = msh.store.element
+    order = np.argsort(element,kind='stable')
+    counts = np.bincount(element[element>=0],minlength=msh.nelem)
+    start = len(lost)
+    for ie, count in zip(msh.elements,counts):
+        ie.particles = [msh.particles[i] for i in order[start:start+count]]
+        start += count
 
-                # break element loop for testing other particle
-                break
\ No newline at end of file
+    return lost
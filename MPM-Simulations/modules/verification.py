@@ -0,0 +1,471 @@
+"""
+
+This module verifies the MPM solver against analytical solutions of 1D bar problems
+
+Each problem is solved with solver.explicit_solution at several mesh
+resolutions, for each integration scheme and interpolation type. The
+particle velocities and stresses at the final time are compared with the
+analytical solution at the initial particle positions (the displacements
+are small), and the observed convergence order is computed from the
+errors of consecutive resolutions. check_orders compares the least
+squares orders with the minimum orders expected for each problem and
+interpolation type (EXPECTED_ORDERS). The results are saved as JSON
+files, as the benchmark results, and compared between versions with
+compare_errors, e.g.
+
+    python verification.py --output new.json --compare baseline.json
+
+which exits with status 1 when an order is below its minimum or an error
+increased.
+
+"""
+import argparse
+import functools
+import itertools
+import sys
+import time
+
+import numpy as np
+
+import benchmark
+import boundary
+import material
+import mesh
+import setup
+import solver
+
+# configuration parameters of the verification runs
+DEFAULT_MATRIX = {
+    'problem': ('vibrating_bar','axial_wave'),
+    'interpolation_type': ('linear','cpGIMP'),
+    'integration_scheme': ('USF','USL','MUSL'),
+}
+
+# mesh resolutions of each configuration
+DEFAULT_NELEM = (16,32,64,128)
+
+# minimum least squares convergence orders (velocity, stress) of each
+# problem and interpolation type, for all integration schemes, over at
+# least three resolutions from 16 elements (the axial wave is not in the
+# asymptotic range on the coarser meshes)
+EXPECTED_ORDERS = {
+    ('vibrating_bar','linear'): (1.8,0.9),
+    ('vibrating_bar','cpGIMP'): (1.8,0.9),
+    ('axial_wave','linear'): (0.8,0.8),
+    ('axial_wave','cpGIMP'): (0.8,0.8),
+}
+
+class vibrating_bar:
+    r"""
+    Represent a bar fixed at x=0 and free at x=L vibrating in its first mode
+
+    .. math::
+        v(x,t) = v_0 \sin(\beta x) \cos(\omega t), \quad
+        \sigma(x,t) = \rho c v_0 \cos(\beta x) \sin(\omega t)
+
+    with $$\beta = \pi/2L$$, $$c = \sqrt{E/\rho}$$ and $$\omega = \beta c$$.
+
+    Attributes
+    ----------
+    L, E, density : float
+        bar length, Young's modulus and density
+
+    amplitude : float
+        velocity amplitude v_0, small enough that the large displacement
+        error of the MPM solution (relative velocity errors of 2e-5 to
+        3e-5 for v_0=1e-3) stays below the discretization error
+
+    time : float
+        simulation time
+    """
+
+    def __init__(self,L=25.0,E=100.0,density=1.0,amplitude=1e-5):
+
+        self.L = L
+        self.E = E
+        self.density = density
+        self.amplitude = amplitude
+        self.c = np.sqrt(E/density)
+        self.beta = np.pi/(2*L)
+        self.omega = self.beta*self.c
+
+        # a third of the vibration period
+        self.time = 2*np.pi/self.omega/3
+
+    def initialize(self,msh,msetup):
+        """
+        Sets the initial velocity and the boundary conditions
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object filled with particles
+        msetup: model_setup
+            a model_setup object
+        """
+        ps = msh.store
+        ps.velocity[:] = self.velocity(ps.position,0.0)
+        msetup.boundary_conditions.fix(0)
+
+    def velocity(self,x,t):
+        """
+        Returns the analytical velocity at positions x and time t
+        """
+        return self.amplitude*np.sin(self.beta*x)*np.cos(self.omega*t)
+
+    def stress(self,x,t):
+        """
+        Returns the analytical stress at positions x and time t
+        """
+        return self.density*self.c*self.amplitude*np.cos(self.beta*x)*np.sin(self.omega*t)
+
+def _pulse(t,amplitude,duration):
+    """
+    Returns the velocity of a smooth pulse, amplitude*sin^2(pi*t/duration) during duration
+    """
+    t = np.asarray(t,dtype=float)
+    inside = (t>0) & (t<duration)
+    return np.where(inside,amplitude*np.sin(np.pi*np.clip(t,0,duration)/duration)**2,0.0)
+
+class axial_wave:
+    r"""
+    Represent a velocity pulse entering a bar at rest through its end x=0
+
+    .. math::
+        v(x,t) = f(t-x/c), \quad \sigma(x,t) = -\rho c f(t-x/c)
+
+    where $$f$$ is the prescribed velocity of the end, a smooth pulse
+    $$v_0 \sin^2(\pi t/T)$$ of duration $$T$$. The simulation stops
+    before the pulse reaches the free end x=L.
+
+    Attributes
+    ----------
+    L, E, density : float
+        bar length, Young's modulus and density
+
+    amplitude : float
+        pulse velocity amplitude v_0
+
+    duration : float
+        pulse duration T
+
+    time : float
+        simulation time
+    """
+
+    def __init__(self,L=25.0,E=100.0,density=1.0,amplitude=1e-3):
+
+        self.L = L
+        self.E = E
+        self.density = density
+        self.amplitude = amplitude
+        self.c = np.sqrt(E/density)
+
+        # the pulse is a quarter of the bar long and its front
+        # travels 70% of the bar
+        self.duration = 0.25*L/self.c
+        self.time = 0.7*L/self.c
+
+    def initialize(self,msh,msetup):
+        """
+        Sets the bar at rest and the prescribed velocity of its end
+
+        Arguments
+        ---------
+        msh: mesh
+            a mesh object filled with particles
+        msetup: model_setup
+            a model_setup object
+        """
+        msh.store.velocity[:] = 0
+        msetup.boundary_conditions.prescribe_velocity(0,functools.partial(_pulse,amplitude=self.amplitude,
+                                                                           duration=self.duration))
+
+    def velocity(self,x,t):
+        """
+        Returns the analytical velocity at positions x and time t
+        """
+        return _pulse(t-x/self.c,self.amplitude,self.duration)
+
+    def stress(self,x,t):
+        """
+        Returns the analytical stress at positions x and time t
+        """
+        return -self.density*self.c*self.velocity(x,t)
+
+# verification problems by name
+PROBLEMS = {'vibrating_bar': vibrating_bar,'axial_wave': axial_wave}
+
+def verification_case(problem,nelem,interpolation_type='linear',integration_scheme='MUSL',
+                      engine='numpy',ppelem=2,courant=0.5):
+    """
+    Solves a verification problem and returns its errors
+
+    The time step is the courant fraction of the element crossing time of
+    the elastic waves, so the time and space resolutions are refined
+    together.
+
+    Arguments
+    ---------
+    problem: string
+        name of the problem in PROBLEMS
+    nelem: int
+        number of elements
+    interpolation_type: string
+        'linear' or 'cpGIMP'
+    integration_scheme: string
+        'USF', 'USL' or 'MUSL'
+    engine: string
+        'python', 'numpy' or 'numba'
+    ppelem: int
+        particles per element
+    courant: float
+        time step over the element crossing time
+
+    Returns
+    -------
+    row: dict
+        problem, interpolation_type, integration_scheme, engine, nelem,
+        h (element length), dt, steps, velocity_error and stress_error
+        (volume weighted root mean square errors over the amplitude of
+        the analytical solution) and time (seconds of the solution)
+    """
+    bar = PROBLEMS[problem]()
+
+    msh = mesh.mesh_1D(bar.L,nelem)
+    msh.put_particles_in_all_mesh_elements(ppelem,material.linear_elastic(bar.E,bar.density))
+    x0 = msh.store.position.copy()
+
+    msetup = setup.model_setup()
+    msetup.interpolation_type = interpolation_type
+    msetup.integration_scheme = integration_scheme
+    msetup.engine = engine
+    msetup.dt = courant*(bar.L/nelem)/bar.c
+    msetup.time = bar.time
+    msetup.boundary_conditions = boundary.boundary_conditions()
+    bar.initialize(msh,msetup)
+
+    start = time.perf_counter()
+    solver.explicit_solution(msh,msetup)
+    seconds = time.perf_counter()-start
+
+    # time of the final stresses, the velocities are staggered half a step
+    # behind them (leapfrog), or ahead in the USF scheme which updates the
+    # stresses before the velocities
+    steps = len(msetup.solution_array[0])
+    t_stress = steps*msetup.dt
+    t_velocity = t_stress+msetup.dt/2 if integration_scheme=='USF' else t_stress-msetup.dt/2
+
+    ps = msh.store
+    volume = ps.mass/ps.density
+    scale = bar.amplitude
+
+    def error(values,exact,scale):
+        return float(np.sqrt(np.dot(volume,(values-exact)**2)/volume.sum())/scale)
+
+    return {'problem': problem,
+            'interpolation_type': interpolation_type,
+            'integration_scheme': integration_scheme,
+            'engine': engine,
+            'nelem': nelem,
+            'h': bar.L/nelem,
+            'dt': msetup.dt,
+            'steps': steps,
+            'velocity_error': error(ps.velocity,bar.velocity(x0,t_velocity),scale),
+            'stress_error': error(ps.stress,bar.stress(x0,t_stress),bar.density*bar.c*scale),
+            'time': seconds}
+
+def convergence_orders(results):
+    """
+    Returns the observed convergence orders of verification results
+
+    Arguments
+    ---------
+    results: list
+        rows of verification_case
+
+    Returns
+    -------
+    orders: list
+        one dictionary per configuration with the keys of DEFAULT_MATRIX,
+        engine, nelem (resolutions), velocity_order and stress_order
+        (order between consecutive resolutions), velocity_fit and
+        stress_fit (least squares slope of log error over log h) and time
+        (total seconds)
+    """
+    groups = {}
+    for row in results:
+        key = tuple(row[name] for name in DEFAULT_MATRIX)+(row['engine'],)
+        groups.setdefault(key,[]).append(row)
+
+    orders = []
+    for key, rows in groups.items():
+        rows = sorted(rows,key=lambda row: row['nelem'])
+        h = np.log([row['h'] for row in rows])
+        entry = dict(zip(list(DEFAULT_MATRIX)+['engine'],key),nelem=[row['nelem'] for row in rows],
+                     time=sum(row['time'] for row in rows))
+        for name in ('velocity','stress'):
+            e = np.log([row[name+'_error'] for row in rows])
+            entry[name+'_order'] = list(np.diff(e)/np.diff(h))
+            entry[name+'_fit'] = float(np.polyfit(h,e,1)[0]) if len(rows)>1 else np.nan
+        orders.append(entry)
+
+    return orders
+
+def check_orders(orders):
+    """
+    Compares the convergence orders with the expected minimum orders
+
+    Arguments
+    ---------
+    orders: list
+        entries of convergence_orders
+
+    Returns
+    -------
+    failures: list
+        one dictionary per order below its minimum, with the configuration
+        parameters, engine, field ('velocity' or 'stress'), order and expected
+    """
+    failures = []
+    for entry in orders:
+        key = (entry['problem'],entry['interpolation_type'])
+        if key not in EXPECTED_ORDERS or len(entry['nelem'])<2:
+            continue
+
+        for name, expected in zip(('velocity','stress'),EXPECTED_ORDERS[key]):
+            order = entry[name+'_fit']
+            if order<expected:
+                failures.append(dict(((name_,entry[name_]) for name_ in list(DEFAULT_MATRIX)+['engine']),
+                                     field=name,order=order,expected=expected))
+
+    return failures
+
+def verification_suite(matrix=None,nelem=DEFAULT_NELEM,engine='numpy',path=None,verbose=True):
+    """
+    Solves the verification problems over a matrix of configurations and resolutions
+
+    Arguments
+    ---------
+    matrix: dict
+        values of each configuration parameter (keys of DEFAULT_MATRIX),
+        missing parameters take the DEFAULT_MATRIX values
+    nelem: tuple
+        numbers of elements of the resolutions
+    engine: string
+        'python', 'numpy' or 'numba'
+    path: string
+        JSON file to save the results, see benchmark.save_results
+    verbose: bool
+        print the errors and convergence orders
+
+    Returns
+    -------
+    results: list
+        rows of verification_case
+    """
+    values = dict(DEFAULT_MATRIX)
+    values.update(matrix or {})
+    names = list(DEFAULT_MATRIX)
+
+    results = []
+    for combination in itertools.product(*(values[name] for name in names)):
+        config = dict(zip(names,combination))
+        for n in nelem:
+            results.append(verification_case(nelem=n,engine=engine,**config))
+
+    if verbose:
+        print("%-14s %-7s %-4s %8s %12s %12s %10s"%('problem','interp','sch','nelem',
+                                                  'v error','stress error','time (s)'))
+        for row in results:
+            print("%-14s %-7s %-4s %8d %12.4e %12.4e %10.3e"%(row['problem'],row['interpolation_type'],
+                  row['integration_scheme'],row['nelem'],row['velocity_error'],row['stress_error'],row['time']))
+        print()
+        print("%-14s %-7s %-4s %10s %10s %10s"%('problem','interp','sch','v order','s order','time (s)'))
+        for entry in convergence_orders(results):
+            print("%-14s %-7s %-4s %10.2f %10.2f %10.3e"%(entry['problem'],entry['interpolation_type'],
+                  entry['integration_scheme'],entry['velocity_fit'],entry['stress_fit'],entry['time']))
+        print()
+        for item in check_orders(convergence_orders(results)):
+            print("%-14s %-7s %-4s %-8s order %6.2f, expected %4.2f: FAILED"%(item['problem'],
+                  item['interpolation_type'],item['integration_scheme'],item['field'],
+                  item['order'],item['expected']))
+
+    if path is not None:
+        benchmark.save_results(results,path)
+
+    return results
+
+def _case_key(row):
+    """
+    Returns the configuration and resolution of a results row as a tuple
+    """
+    return tuple(row[name] for name in DEFAULT_MATRIX)+(row['engine'],row['nelem'])
+
+def compare_errors(baseline,current,tolerance=0.01,verbose=True):
+    """
+    Compares the errors of two verification results
+
+    Arguments
+    ---------
+    baseline: list or string
+        reference results, or the JSON file holding them
+    current: list or string
+        new results, or the JSON file holding them
+    tolerance: float
+        relative error increase above which a case is a regression
+    verbose: bool
+        print the regressions
+
+    Returns
+    -------
+    regressions: list
+        one dictionary per larger error with the configuration parameters,
+        engine, nelem, error ('velocity_error' or 'stress_error'),
+        baseline, current and ratio
+    """
+    if isinstance(baseline,str):
+        baseline = benchmark.load_results(baseline)
+    if isinstance(current,str):
+        current = benchmark.load_results(current)
+
+    reference = {_case_key(row): row for row in baseline}
+    names = list(DEFAULT_MATRIX)+['engine','nelem']
+
+    regressions = []
+    for row in current:
+        old = reference.get(_case_key(row))
+        if old is None:
+            continue
+
+        for name in ('velocity_error','stress_error'):
+            before = old[name]
+            after = row[name]
+            if not after<=(1+tolerance)*before:
+                regressions.append(dict(zip(names,_case_key(row)),error=name,
+                                        baseline=before,current=after,ratio=after/before if before>0 else np.inf))
+
+    if verbose:
+        for item in regressions:
+            print("%-14s %-7s %-4s %6d %-14s %12.4e -> %12.4e (x%.3f)"%(item['problem'],
+                  item['interpolation_type'],item['integration_scheme'],item['nelem'],item['error'],
+                  item['baseline'],item['current'],item['ratio']))
+        print("%d regressions"%len(regressions))
+
+    return regressions
+
+if __name__=='__main__':
+
+    parser = argparse.ArgumentParser(description="verifies the MPM solver against analytical solutions")
+    parser.add_argument('--output',default='verification.json',help="JSON file to save the results")
+    parser.add_argument('--compare',help="JSON file of reference results")
+    parser.add_argument('--engine',default='numpy',help="solver engine")
+    parser.add_argument('--nelem',type=int,nargs='+',default=DEFAULT_NELEM,help="numbers of elements")
+    parser.add_argument('--tolerance',type=float,default=0.01,help="relative error increase reported as regression")
+    args = parser.parse_args()
+
+    results = verification_suite(nelem=args.nelem,engine=args.engine,path=args.output)
+    failed = check_orders(convergence_orders(results))
+    if args.compare:
+        failed += compare_errors(args.compare,results,args.tolerance)
+    sys.exit(1 if failed else 0)